@@ -1,27 +1,100 @@
 """
 FastAPI inference service: health check and prediction endpoints.
-Includes request/response logging and basic metrics (M5).
-Exposes /metrics in Prometheus text format for Grafana monitoring.
-On cloud (e.g. Render): set MODEL_URL so the app downloads model.pt at startup if missing.
+Includes structured JSON request logging and metrics (M5).
+Exposes /metrics in Prometheus text format for Grafana monitoring, including latency
+histograms per endpoint/status and per request stage.
+On cloud (e.g. Render): set MODEL_URL (and MODEL_SHA256) so the app fetches model.pt at startup if missing.
+For several worker processes sharing one copy of the weights, run api/serve.py instead of uvicorn.
+Uploads are size-limited while they stream in and checked from the image header before decoding
+(api/uploads.py, src.data.decode).
 """
-import io
-import os
 import time
+
+_IMPORT_T0 = time.perf_counter()  # import cost of this module, for the startup profile
+
+import asyncio
+import hmac
+import json
+import os
+import re
+import shutil
+import tempfile
 from pathlib import Path
 from datetime import datetime
-from urllib.request import urlretrieve
+from typing import BinaryIO, Dict, List, Optional
 
-from contextlib import asynccontextmanager
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse
+from contextlib import asynccontextmanager, contextmanager
+from fastapi import Depends, FastAPI, File, Header, Request, UploadFile, HTTPException
+from fastapi.responses import JSONResponse, HTMLResponse, PlainTextResponse, StreamingResponse
 import numpy as np
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from api.uploads import SPOOL_MAX_SIZE, UploadLimitMiddleware, UploadStats
+from src.config import CLASS_NAMES, IMG_SIZE
+from src.monitoring import (
+    LATENCY_BUCKETS_MS,
+    Histogram,
+    MetricsSnapshotWriter,
+    StartupProfile,
+    get_structured_logger,
+    merge_metrics,
+    read_worker_metrics,
+)
+
+# Import and initialisation timings; printed as a table when STARTUP_PROFILE=1
+STARTUP = StartupProfile()
+STARTUP.record("import:api.main", (time.perf_counter() - _IMPORT_T0) * 1000)
+# Heavy modules first used by the model and request path; imported (and timed) in lifespan, not per request
+_STARTUP_IMPORTS = ("PIL.Image", "torch", "src.data", "src.inference")
 
 # Lazy load model to avoid import-time path issues
-_model = None
+_model = None  # default checkpoint's weights (api/serve.py loads them before forking workers)
+_registry = None  # resident model versions, each with its own inference pipeline
+_jobs = None  # asynchronous prediction job queue (/jobs), started in lifespan
+_background_tasks = set()  # shadow predictions in flight (referenced so they are not garbage collected)
+_model_file = None  # MODEL_PATH once checked/fetched, so startup hashes the file only once
+_ready = False  # set once the model is loaded and warmed up; cleared when shutdown starts
 _REQUEST_COUNT = 0
 _PREDICT_COUNT = 0
-_LATENCIES = []  # simple in-app latency tracking (last N)
 _STARTUP_TIME = datetime.now()
+_snapshot_writer = None
+
+# Set by api/serve.py in each forked worker; /metrics then aggregates across workers
+METRICS_DIR_ENV = "METRICS_MULTIPROC_DIR"
+WORKER_ID_ENV = "SERVING_WORKER_ID"
+# Number of workers api/serve.py forked (unset or 1: this process serves alone)
+WORKERS_ENV = "SERVING_WORKERS"
+# How per-worker gauges combine (default: sum)
+_GAUGE_AGG = {
+    "app_info": "max",
+    "app_uptime_seconds": "max",
+    "model_loaded": "min",
+    "startup_phase_duration_ms": "max",
+    "prediction_jobs": "max",  # every worker reads the same job database
+}
+
+# Request latency by route template and status; per-stage breakdown of the same requests
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_ms", "Request latency in milliseconds",
+    LATENCY_BUCKETS_MS, labelnames=("endpoint", "status", "model_version"),
+)
+STAGE_LATENCY = Histogram(
+    "request_stage_duration_ms",
+    "Per-stage request latency in milliseconds (upload_read, decode, resize, tensor_build, "
+    "queue_wait, forward, serialization)",
+    LATENCY_BUCKETS_MS, labelnames=("endpoint", "stage", "status", "model_version"),
+)
+# Successful prediction latency by test-time augmentation mode: each mode's cost per endpoint,
+# for choosing the mode that fits an endpoint's latency SLO
+TTA_LATENCY = Histogram(
+    "tta_request_duration_ms", "Successful prediction request latency in milliseconds by TTA mode",
+    LATENCY_BUCKETS_MS, labelnames=("endpoint", "mode"),
+)
+# Upload bodies in flight and uploads refused before decoding
+UPLOADS = UploadStats()
+# Records go through a bounded queue to a background thread, so logging never blocks the event loop
+_logger = get_structured_logger("cats_vs_dogs.api")
 
 # Default path; overridden when MODEL_URL is used
 MODEL_DIR = Path(__file__).resolve().parent.parent / "models"
@@ -29,16 +102,37 @@ DEFAULT_MODEL_PATH = MODEL_DIR / "model.pt"
 
 
 def _ensure_model_file() -> Path:
-    """Return path to model.pt, downloading from MODEL_URL if missing and URL is set."""
+    """
+    Return path to model.pt, fetching it from MODEL_URL if missing and URL is set.
+    With MODEL_SHA256 set, an existing file must match it (a mismatching one is re-fetched when
+    MODEL_URL is set) and downloads are verified. Downloads stream through the resumable,
+    content-addressed cache in ARTIFACT_CACHE_DIR with ARTIFACT_FETCH_TIMEOUT_S per read.
+    """
+    from src.artifacts import ChecksumMismatchError, fetch_artifact, sha256_file
+
+    global _model_file
     path = Path(os.environ.get("MODEL_PATH", str(DEFAULT_MODEL_PATH)))
-    if path.exists():
+    if path == _model_file and path.exists():
         return path
+    expected = _env("MODEL_SHA256", str).strip().lower()
     model_url = os.environ.get("MODEL_URL")
+    if path.exists():
+        if not expected or sha256_file(path) == expected:
+            _model_file = path
+            return path
+        if not model_url:
+            raise ChecksumMismatchError(f"{path} does not match MODEL_SHA256 {expected}")
+        print(f"[STARTUP] {path} does not match MODEL_SHA256; fetching again", flush=True)
     if model_url:
-        path.parent.mkdir(parents=True, exist_ok=True)
         try:
-            urlretrieve(model_url, path)
-            return path
+            _model_file = fetch_artifact(
+                model_url,
+                sha256=expected or None,
+                dest=path,
+                cache_dir=_env("ARTIFACT_CACHE_DIR", Path),
+                timeout=_env("ARTIFACT_FETCH_TIMEOUT_S", float),
+            )
+            return _model_file
         except Exception as e:
             raise RuntimeError(f"Failed to download model from MODEL_URL: {e}") from e
     raise FileNotFoundError(
@@ -47,24 +141,116 @@ def _ensure_model_file() -> Path:
     )
 
 
-def get_model():
+def _env(name, cast):
+    """Environment variable name cast to type, defaulting to the constant of the same name in src.config."""
+    from src import config
+    return cast(os.environ.get(name, getattr(config, name)))
+
+
+def _warmup_batch_sizes():
+    """WARMUP_BATCH_SIZES as ints; the env var is a comma-separated list (e.g. "1,16,32")."""
+    from src.config import WARMUP_BATCH_SIZES
+    raw = os.environ.get("WARMUP_BATCH_SIZES")
+    sizes = [int(v) for v in raw.split(",") if v.strip()] if raw else WARMUP_BATCH_SIZES
+    return tuple(sorted({s for s in sizes if s > 0})) or (1,)
+
+
+def preload_model():
+    """Load the default checkpoint's weights without starting threads (safe to call before fork)."""
     global _model
     if _model is None:
         from src.inference import load_model
-        model_path = _ensure_model_file()
-        _model = load_model(model_path)
+        # MODEL_BACKEND: auto (by file name), eager, torchscript or onnx; see scripts/export_model.py
+        _model = load_model(_ensure_model_file(), backend=os.environ.get("MODEL_BACKEND", "auto"))
     return _model
 
 
+def _build_pipeline(model, fingerprint: str):
+    """
+    InferencePipeline (decode pool + micro-batcher + prediction cache) for one model version.
+    BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, DECODE_WORKERS, INFERENCE_NUM_THREADS,
+    MAX_PENDING_REQUESTS, INFERENCE_CHUNK_SIZE, PREDICTION_CACHE_SIZE and
+    PREDICTION_CACHE_TTL_S env vars override the defaults in src.config.
+    """
+    from src.inference import InferencePipeline, PredictionCache
+
+    cache = PredictionCache(
+        max_entries=_env("PREDICTION_CACHE_SIZE", int),
+        ttl_seconds=_env("PREDICTION_CACHE_TTL_S", float),
+    )
+    cache.set_model_fingerprint(fingerprint)
+    return InferencePipeline(
+        model,
+        decode_workers=_env("DECODE_WORKERS", int),
+        num_threads=_env("INFERENCE_NUM_THREADS", int),
+        max_pending=_env("MAX_PENDING_REQUESTS", int),
+        max_batch_size=_env("BATCH_MAX_SIZE", int),
+        max_wait_ms=_env("BATCH_MAX_WAIT_MS", float),
+        chunk_size=_env("INFERENCE_CHUNK_SIZE", int),
+        cache=cache,
+    )
+
+
+def get_registry():
+    """
+    Return the ModelRegistry, loading the default checkpoint (MODEL_PATH / MODEL_URL) as its
+    active version on first use. MODEL_VERSION names it (default: checkpoint SHA-256 prefix);
+    MAX_MODEL_VERSIONS bounds how many versions stay resident.
+    """
+    global _registry
+    if _registry is None:
+        from src.inference import ModelRegistry
+        registry = ModelRegistry(
+            _build_pipeline,
+            max_versions=_env("MAX_MODEL_VERSIONS", int),
+            backend=os.environ.get("MODEL_BACKEND", "auto"),
+            warmup_batch_sizes=_warmup_batch_sizes(),
+        )
+        registry.load(os.environ.get("MODEL_VERSION"), _ensure_model_file(), model=preload_model())
+        _registry = registry
+    return _registry
+
+
+def get_model():
+    """Model of the active version."""
+    return get_registry().active.model
+
+
+def get_pipeline():
+    """InferencePipeline of the active version."""
+    return get_registry().active.pipeline
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """On startup: ensure model file exists (download from MODEL_URL if set) and preload model."""
+    """
+    On startup: ensure model file exists (download from MODEL_URL if set), import the heavy
+    modules, load the model and warm it up; /ready reports 200 only after that.
+    """
+    global _ready
     try:
-        path = _ensure_model_file()
+        with STARTUP.phase("model_file"):
+            path = _ensure_model_file()
         print(f"[STARTUP] Model file ready: {path}", flush=True)
-        # Preload model so first /predict does not block and we fail fast if load fails
-        get_model()
-        print("[STARTUP] Model loaded successfully.", flush=True)
+        STARTUP.import_modules(_STARTUP_IMPORTS)
+        # Preload and warm up the model so first /predict does not block and we fail fast if load fails
+        with STARTUP.phase("model_load"):
+            preload_model()
+        t0 = time.perf_counter()
+        version = get_registry().active
+        elapsed = (time.perf_counter() - t0) * 1000
+        STARTUP.record("warmup", version.warmup_ms)
+        STARTUP.record("pipeline_init", max(elapsed - version.warmup_ms, 0.0))
+        print(f"[STARTUP] Model loaded successfully (version {version.name}).", flush=True)
+        _start_jobs()
+        _start_metrics_snapshots()
+        _logger.info("startup", extra={"fields": {
+            "total_ms": round(STARTUP.total_ms, 1),
+            "phases_ms": {k: round(v, 1) for k, v in STARTUP.phases.items()},
+        }})
+        if os.environ.get("STARTUP_PROFILE", "").lower() in ("1", "true", "yes"):
+            print("[STARTUP] Profile:\n" + STARTUP.report(), flush=True)
+        _ready = True
     except Exception as e:
         print(f"[STARTUP] Model not available: {e}", flush=True)
         raise RuntimeError(
@@ -72,7 +258,49 @@ async def lifespan(app: FastAPI):
             "or build the Docker image with models/model.pt included."
         ) from e
     yield
-    # shutdown: nothing to do
+    # shutdown: report not-ready first so the load balancer stops routing, then drain queued
+    # predictions and stop the decode/batching workers
+    _ready = False
+    global _registry, _snapshot_writer, _jobs
+    if _jobs is not None:
+        await _jobs.stop()  # unfinished jobs go back to the queue for the next process to resume
+        _jobs = None
+    if _registry is not None:
+        _registry.stop()
+        _registry = None
+    if _snapshot_writer is not None:
+        _snapshot_writer.stop()
+        _snapshot_writer = None
+
+
+def _start_jobs():
+    """
+    Start the asynchronous job workers on this event loop. JOB_DB_PATH, JOB_WORKERS, JOB_CHUNK_SIZE,
+    JOB_LEASE_S and JOB_RETENTION_S env vars override the defaults in src.config.
+    """
+    global _jobs
+    from src.inference import JobQueue, JobStore
+
+    if _jobs is None:
+        _jobs = JobQueue(
+            JobStore(_env("JOB_DB_PATH", Path)),
+            _process_job,
+            workers=_env("JOB_WORKERS", int),
+            chunk_size=_env("JOB_CHUNK_SIZE", int),
+            lease_s=_env("JOB_LEASE_S", float),
+            retention_s=_env("JOB_RETENTION_S", float),
+        ).start()
+
+
+def _start_metrics_snapshots():
+    """Under api/serve.py, publish this worker's metrics so any worker can answer /metrics for all."""
+    global _snapshot_writer
+    metrics_dir = os.environ.get(METRICS_DIR_ENV)
+    if metrics_dir and _snapshot_writer is None:
+        interval = float(os.environ.get("METRICS_SNAPSHOT_INTERVAL_S", "1.0"))
+        _snapshot_writer = MetricsSnapshotWriter(
+            metrics_dir, os.environ.get(WORKER_ID_ENV, str(os.getpid())), _local_metrics, interval
+        ).start()
 
 
 app = FastAPI(
@@ -85,23 +313,161 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Room for the multipart boundary and part headers around a /predict image
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+def _body_limit(path: str) -> Optional[int]:
+    """Max request body bytes for the upload endpoints (MAX_UPLOAD_BYTES / MAX_REQUEST_BYTES), else None."""
+    if path == "/predict":
+        return _env("MAX_UPLOAD_BYTES", int) + _MULTIPART_OVERHEAD
+    if path in ("/predict/batch", "/jobs"):
+        return _env("MAX_REQUEST_BYTES", int)
+    return None
+
+
+# Added before log_requests, so it runs inside it and oversized uploads are logged and timed as 413s
+app.add_middleware(UploadLimitMiddleware, limit_for=_body_limit, stats=UPLOADS)
+
 
 @app.middleware("http")
-async def log_requests(request, call_next):
-    """Log request method/path and track latency (no sensitive data)."""
-    global _REQUEST_COUNT, _LATENCIES
+async def log_requests(request: Request, call_next):
+    """Log request method/path and record latency histograms (no sensitive data)."""
+    global _REQUEST_COUNT
+    request.state.timings = {}  # handlers and the inference pipeline fill in stage durations (ms)
     start = time.perf_counter()
     response = await call_next(request)
     latency_ms = (time.perf_counter() - start) * 1000
     _REQUEST_COUNT += 1
-    _LATENCIES.append(latency_ms)
-    if len(_LATENCIES) > 1000:
-        _LATENCIES.pop(0)
+    # Label by route template, not raw path, to keep label cardinality bounded
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", None) or getattr(request.state, "upload_endpoint", "unmatched")
+    status = str(response.status_code)
+    version = getattr(request.state, "model_version", "")
+    tta = getattr(request.state, "tta", "")
+    REQUEST_LATENCY.observe(latency_ms, endpoint=endpoint, status=status, model_version=version)
+    if tta and response.status_code == 200:
+        TTA_LATENCY.observe(latency_ms, endpoint=endpoint, mode=tta)
+    for stage, ms in request.state.timings.items():
+        STAGE_LATENCY.observe(ms, endpoint=endpoint, stage=stage, status=status, model_version=version)
     # Log without body/headers to avoid sensitive data
-    print(f"[LOG] {request.method} {request.url.path} status={response.status_code} latency_ms={latency_ms:.2f} request_count={_REQUEST_COUNT}")
+    _logger.info("request", extra={"fields": {
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "latency_ms": round(latency_ms, 2),
+        "model_version": version or None,
+        "tta": tta or None,
+        "request_count": _REQUEST_COUNT,
+    }})
+    return response
+
+
+def _timed_json(request: Request, build) -> JSONResponse:
+    """Build and encode the response body, recording it as the "serialization" stage."""
+    t0 = time.perf_counter()
+    version = getattr(request.state, "model_version", None)
+    response = JSONResponse(build(), headers={"X-Model-Version": version} if version else None)
+    request.state.timings["serialization"] = (time.perf_counter() - t0) * 1000
     return response
 
 
+def _add_upload_time(request: Request, t0: float) -> None:
+    timings = request.state.timings
+    timings["upload_read"] = timings.get("upload_read", 0.0) + (time.perf_counter() - t0) * 1000
+
+
+def _check_upload_size(upload: UploadFile) -> None:
+    """413 if one uploaded file is over MAX_UPLOAD_BYTES."""
+    max_bytes = _env("MAX_UPLOAD_BYTES", int)
+    if upload.size is not None and upload.size > max_bytes:
+        UPLOADS.reject("file_too_large")
+        raise HTTPException(413, f"{upload.filename} is {upload.size} bytes (limit {max_bytes})")
+
+
+async def _open_upload(request: Request, upload: UploadFile) -> BinaryIO:
+    """
+    The upload's spooled file, to be decoded in place, once its size and image header pass the
+    limits: 413 over MAX_UPLOAD_BYTES or the pixel / decode-size limits, 400 if the header is not
+    an accepted image. No pixel data is decoded here; the time is the "upload_read" stage.
+    """
+    from src.data import ImageTooLargeError, probe_image
+
+    t0 = time.perf_counter()
+    _check_upload_size(upload)
+    try:
+        await run_in_threadpool(probe_image, upload.file, IMG_SIZE)
+    except ImageTooLargeError as e:
+        UPLOADS.reject("too_many_pixels")
+        raise HTTPException(413, f"Image too large: {e}")
+    except (ValueError, OSError) as e:
+        UPLOADS.reject("not_an_image")
+        raise HTTPException(400, f"Invalid image: {e}")
+    _add_upload_time(request, t0)
+    return upload.file
+
+
+async def _read_uploads(request: Request, files, archive, max_files: int):
+    """
+    (names, payloads) from repeated `files` fields and/or one zip/tar `archive`; 400/413 on bad input.
+    Files come back as their spooled upload (read in place, never copied into memory whole) and archive
+    members as spooled temporary files (close them with _close_payloads).
+    Each file and member is capped at MAX_UPLOAD_BYTES and all of them together at MAX_REQUEST_BYTES
+    uncompressed, checked before extraction; the image checks happen per item when it is decoded.
+    """
+    from src.inference import ArchiveTooLargeError, read_image_archive
+
+    t0 = time.perf_counter()
+    names, payloads = [], []
+    total_bytes = 0
+    for f in files or []:
+        _check_upload_size(f)
+        names.append(f.filename)
+        payloads.append(f.file)
+        total_bytes += f.size or 0
+    if len(payloads) > max_files:
+        raise HTTPException(413, f"Too many images: {len(payloads)} > {max_files}")
+    if archive is not None:
+        try:
+            entries = await run_in_threadpool(
+                read_image_archive,
+                archive.file,
+                max_files=max_files - len(payloads),
+                max_member_bytes=_env("MAX_UPLOAD_BYTES", int),
+                max_total_bytes=max(0, _env("MAX_REQUEST_BYTES", int) - total_bytes),
+                spool_max_size=SPOOL_MAX_SIZE,
+            )
+        except ArchiveTooLargeError as e:
+            UPLOADS.reject("archive_too_large")
+            raise HTTPException(413, f"Archive too large: {e}")
+        except ValueError as e:
+            raise HTTPException(400, f"Invalid archive: {e}")
+        for name, data in entries:
+            names.append(name)
+            payloads.append(data)
+    _add_upload_time(request, t0)
+    if not payloads:
+        raise HTTPException(400, "Expected at least one image in 'files' or 'archive'")
+    return names, payloads
+
+
+def _close_payloads(payloads) -> None:
+    """Close the spooled files from _read_uploads (closing an upload's file early is harmless)."""
+    for p in payloads:
+        if not isinstance(p, bytes):
+            p.close()
+
+
+def _prediction_entry(out) -> dict:
+    """One image's result in /predict/batch and job results: label and probabilities, or an error."""
+    if isinstance(out, Exception):
+        return {"error": f"Invalid image: {out}"}
+    return {
+        "label": CLASS_NAMES[int(np.argmax(out))],
+        "probabilities": {CLASS_NAMES[i]: round(out[i], 4) for i in range(len(CLASS_NAMES))},
+    }
+
+
 @app.get("/", response_class=HTMLResponse)
 def root():
     """Landing page with links to API docs."""
@@ -115,6 +481,7 @@ def root():
     <li><a href="/docs">Swagger UI (/docs)</a></li>
     <li><a href="/openapi.json">OpenAPI schema (JSON)</a></li>
     <li><a href="/health">Health check</a></li>
+    <li><a href="/ready">Readiness</a></li>
     <li><a href="/metrics">Metrics (Prometheus)</a></li>
     </ul>
     </body>
@@ -128,14 +495,52 @@ def health():
     return {"status": "ok", "service": "cats-vs-dogs"}
 
 
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once the model is loaded and warmed up, 503 before that and during
+    shutdown. /health stays a liveness check that does not depend on the model.
+    """
+    version = _registry.active if _registry is not None else None
+    if not _ready or version is None:
+        return JSONResponse({"status": "not ready"}, status_code=503)
+    return {"status": "ready", "model_version": version.name, "startup_ms": round(STARTUP.total_ms, 1)}
+
+
 @app.get("/metrics")
 def metrics():
     """
     Prometheus-style metrics endpoint for scraping by Prometheus/Grafana.
     Returns text/plain with metric names compatible with the monitoring dashboard.
+    Under api/serve.py the values cover all workers (other workers' snapshots lag by up to
+    METRICS_SNAPSHOT_INTERVAL_S).
     """
-    global _REQUEST_COUNT, _PREDICT_COUNT, _LATENCIES, _model, _STARTUP_TIME
-    avg_latency = sum(_LATENCIES) / len(_LATENCIES) if _LATENCIES else 0
+    metrics_text = _local_metrics()
+    metrics_dir = os.environ.get(METRICS_DIR_ENV)
+    if metrics_dir:
+        others = read_worker_metrics(metrics_dir, exclude=os.environ.get(WORKER_ID_ENV))
+        metrics_text = merge_metrics([metrics_text] + others, gauge_agg=_GAUGE_AGG)
+        metrics_text = _recompute_avg_latency(metrics_text)
+    return PlainTextResponse(content=metrics_text, media_type="text/plain")
+
+
+def _recompute_avg_latency(metrics_text: str) -> str:
+    """Replace the summed per-worker averages with sum/count of the merged request histogram."""
+    total = count = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith("http_request_duration_ms_sum"):
+            total += float(line.rsplit(" ", 1)[1])
+        elif line.startswith("http_request_duration_ms_count"):
+            count += float(line.rsplit(" ", 1)[1])
+    avg = total / count if count else 0
+    return re.sub(r"(?m)^prediction_latency_avg_ms .*$", f"prediction_latency_avg_ms {avg:.2f}", metrics_text)
+
+
+def _local_metrics() -> str:
+    """This process's metrics in Prometheus text format."""
+    global _REQUEST_COUNT, _PREDICT_COUNT, _STARTUP_TIME
+    count = REQUEST_LATENCY.count
+    avg_latency = REQUEST_LATENCY.sum / count if count else 0
     uptime = (datetime.now() - _STARTUP_TIME).total_seconds()
     metrics_text = f"""# HELP app_info Application information
 # TYPE app_info gauge
@@ -147,7 +552,7 @@ app_uptime_seconds {uptime}
 
 # HELP model_loaded Whether the model is loaded (1=yes, 0=no)
 # TYPE model_loaded gauge
-model_loaded {1 if _model is not None else 0}
+model_loaded {1 if _registry is not None and _registry.active is not None else 0}
 
 # HELP predictions_total Total number of /predict requests
 # TYPE predictions_total counter
@@ -160,39 +565,316 @@ request_count_total {_REQUEST_COUNT}
 # HELP prediction_latency_avg_ms Average request latency in milliseconds
 # TYPE prediction_latency_avg_ms gauge
 prediction_latency_avg_ms {avg_latency:.2f}
-"""
-    return PlainTextResponse(content=metrics_text, media_type="text/plain")
+
+{REQUEST_LATENCY.render()}
+{STAGE_LATENCY.render()}
+{TTA_LATENCY.render()}
+{UPLOADS.render_metrics()}"""
+    metrics_text += "\n" + STARTUP.render_metrics()
+    if _registry is not None:
+        metrics_text += "\n" + _registry.render_metrics()
+    if _jobs is not None:
+        metrics_text += "\n" + _jobs.render_metrics()
+    return metrics_text
+
+
+def _tta_options(request: Request, tta: Optional[str], aggregation: Optional[str]) -> dict:
+    """
+    Test-time augmentation for this request: the query parameters, else TTA_MODE / TTA_AGGREGATION
+    (env or src.config). Unknown values are a 400. Tags the request for latency metrics.
+    """
+    from src.inference import TTA_AGGREGATIONS, TTA_MODES
+
+    tta = tta or _env("TTA_MODE", str)
+    aggregation = aggregation or _env("TTA_AGGREGATION", str)
+    if tta not in TTA_MODES:
+        raise HTTPException(400, f"Unknown tta mode {tta!r}; expected one of {list(TTA_MODES)}")
+    if aggregation not in TTA_AGGREGATIONS:
+        raise HTTPException(400, f"Unknown tta_aggregation {aggregation!r}; expected one of {list(TTA_AGGREGATIONS)}")
+    request.state.tta = tta
+    return {"tta": tta, "aggregation": aggregation} if tta != "none" else {}
 
 
 @app.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(
+    request: Request,
+    file: UploadFile = File(...),
+    x_model_version: Optional[str] = Header(None),
+    tta: Optional[str] = None,
+    tta_aggregation: Optional[str] = None,
+):
     """
-    Accept an image file; return class label and probabilities.
+    Accept an image file; return class label, probabilities and the model version that served it.
+    An X-Model-Version header pins the version; otherwise the registry's traffic split decides.
+    ?tta=flip|five_crop|ten_crop|multiscale scores several views of the image in one forward pass
+    and combines them with ?tta_aggregation=mean|geometric|max (defaults: TTA_MODE, TTA_AGGREGATION).
+    Bodies over MAX_UPLOAD_BYTES and images whose header exceeds the pixel limits are a 413.
     """
     global _PREDICT_COUNT
     _PREDICT_COUNT += 1
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(400, "Expected an image file")
-    contents = await file.read()
+    options = _tta_options(request, tta, tta_aggregation)
+    contents = await _open_upload(request, file)
+
+    from src.data import ImageTooLargeError  # already imported by lifespan: sys.modules lookups
+    from src.inference import QueueFullError
+    # Decode runs in a thread pool and the forward pass in the batching worker, so the
+    # event loop stays free for /health and /metrics; saturation surfaces as 429.
     try:
-        from PIL import Image
-        img = Image.open(io.BytesIO(contents)).convert("RGB")
-    except Exception as e:
+        with _use_version(request, x_model_version) as version:
+            probs = await version.pipeline.predict(contents, timings=request.state.timings, **options)
+    except QueueFullError as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        # The probe assumed a single view; larger TTA views can still exceed the decode limit
+        if isinstance(e.__cause__, ImageTooLargeError):
+            UPLOADS.reject("too_many_pixels")
+            raise HTTPException(413, f"Image too large: {e}")
         raise HTTPException(400, f"Invalid image: {e}")
+    await _mirror_to_shadow(version, file, probs, options)
+    return _timed_json(request, lambda: {
+        "label": CLASS_NAMES[int(np.argmax(probs))],
+        "probabilities": {CLASS_NAMES[i]: round(probs[i], 4) for i in range(len(CLASS_NAMES))},
+        "model_version": version.name,
+        "tta": request.state.tta,
+    })
 
-    from src.inference import predict_proba
-    from src.config import IMG_SIZE, CLASS_NAMES
-    img = img.resize(IMG_SIZE)
-    arr = np.array(img, dtype=np.float32) / 255.0
-    arr = np.transpose(arr, (2, 0, 1))[np.newaxis, ...]
 
-    model = get_model()
-    probs = predict_proba(model, arr)
-    label = CLASS_NAMES[int(np.argmax(probs))]
-    return {
-        "label": label,
-        "probabilities": {CLASS_NAMES[i]: round(probs[i], 4) for i in range(len(CLASS_NAMES))},
-    }
+@contextmanager
+def _use_version(request: Request, requested: Optional[str]):
+    """
+    Route the request to a model version and tag it for metrics and logs (404 for unknown versions).
+    The version counts the request as in flight until the block exits, so a swap meanwhile
+    does not stop its pipeline.
+    """
+    registry = get_registry()
+    try:
+        version = registry.acquire(requested)
+    except KeyError as e:
+        raise HTTPException(404, str(e.args[0]))
+    request.state.model_version = version.name
+    try:
+        yield version
+    finally:
+        registry.release(version)
+
+
+async def _mirror_to_shadow(version, upload: UploadFile, probs, options: dict) -> None:
+    """Send a copy of a served request to the shadow version, if any, without delaying the response."""
+    registry = get_registry()
+    shadow = registry.shadow
+    if shadow is None or shadow is version:
+        return
+    # The upload's file is closed with the request and the shadow prediction runs after it, so the
+    # shadow gets its own spooled copy: like the upload, at most SPOOL_MAX_SIZE of it in memory
+    copy = await run_in_threadpool(_spooled_copy, upload.file)
+    task = asyncio.get_running_loop().create_task(registry.shadow_predict(copy, probs, **options))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(lambda _: copy.close())
+
+
+def _spooled_copy(source: BinaryIO) -> BinaryIO:
+    copy = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    source.seek(0)
+    shutil.copyfileobj(source, copy)
+    copy.seek(0)
+    return copy
+
+
+@app.post("/predict/batch")
+async def predict_batch(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    x_model_version: Optional[str] = Header(None),
+    tta: Optional[str] = None,
+    tta_aggregation: Optional[str] = None,
+):
+    """
+    Accept many images (repeated `files` fields and/or one zip/tar `archive`); return one result per image.
+    Images that fail to decode or exceed the pixel limits get an "error" entry instead of failing the
+    whole batch; a body over MAX_REQUEST_BYTES or a file over MAX_UPLOAD_BYTES is a 413.
+    tta / tta_aggregation as for /predict; every view of every image goes into the same batch.
+    """
+    global _PREDICT_COUNT
+    _PREDICT_COUNT += 1
+    from src.inference import QueueFullError
+
+    options = _tta_options(request, tta, tta_aggregation)
+    max_files = _env("MAX_BATCH_FILES", int)
+    names, payloads = await _read_uploads(request, files, archive, max_files)
+
+    try:
+        with _use_version(request, x_model_version) as version:
+            outcomes = await version.pipeline.predict_many(payloads, timings=request.state.timings, **options)
+    except QueueFullError as e:
+        raise HTTPException(429, str(e), headers={"Retry-After": "1"})
+    finally:
+        _close_payloads(payloads)
+
+    def build():
+        results = [{"filename": name, **_prediction_entry(out)} for name, out in zip(names, outcomes)]
+        n_errors = sum("error" in r for r in results)
+        return {
+            "count": len(results), "errors": n_errors, "model_version": version.name,
+            "tta": request.state.tta, "results": results,
+        }
+
+    return _timed_json(request, build)
+
+
+# --- Asynchronous prediction jobs ----------------------------------------------------
+# POST /jobs stores the uploads and returns a job id at once; background workers score them
+# through the same pipelines as /predict. Clients poll GET /jobs/{id} or stream the results.
+
+
+async def _process_job(payloads: List[bytes], options: dict) -> List[dict]:
+    """Score one chunk of a job's images with the version and TTA options it was submitted with."""
+    predict_options = {"tta": options["tta"], "aggregation": options["aggregation"]} if options["tta"] != "none" else {}
+    with get_registry().use(options.get("model_version")) as version:
+        outcomes = await version.pipeline.predict_many(payloads, **predict_options)
+    return [{**_prediction_entry(out), "model_version": version.name} for out in outcomes]
+
+
+def _job_response(job: dict, status_code: int = 200) -> JSONResponse:
+    body = {**job, "results_url": f"/jobs/{job['job_id']}/results"}
+    return JSONResponse(body, status_code=status_code, headers={"Location": f"/jobs/{job['job_id']}"})
+
+
+@app.post("/jobs")
+async def submit_job(
+    request: Request,
+    files: Optional[List[UploadFile]] = File(None),
+    archive: Optional[UploadFile] = File(None),
+    x_model_version: Optional[str] = Header(None),
+    tta: Optional[str] = None,
+    tta_aggregation: Optional[str] = None,
+):
+    """
+    Queue many images (as for /predict/batch, up to MAX_JOB_FILES) and return the job at once:
+    202 for a new job, 200 if the same images with the same options were already submitted
+    (a retry never runs the work twice; a failed job is resumed). Poll GET /jobs/{id} or
+    stream GET /jobs/{id}/results.
+    """
+    options = _tta_options(request, tta, tta_aggregation)
+    if x_model_version is not None:
+        with _use_version(request, x_model_version):
+            pass  # 404 now rather than a failed job later
+    max_files = _env("MAX_JOB_FILES", int)
+    names, payloads = await _read_uploads(request, files, archive, max_files)
+    job_options = {"tta": request.state.tta, "aggregation": options.get("aggregation"), "model_version": x_model_version}
+    try:
+        job, created = await _jobs.submit(list(zip(names, payloads)), job_options)
+    finally:
+        _close_payloads(payloads)
+    return _job_response(job, 202 if created else 200)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status and progress: queued, running, done or failed, with done / errors / total counts."""
+    job = await _jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown job {job_id}")
+    return _job_response(job)
+
+
+@app.get("/jobs/{job_id}/results")
+async def stream_job_results(job_id: str, follow: bool = True):
+    """
+    Results as NDJSON, one line per image in submission order. With follow (default) the
+    response stays open and lines arrive as chunks finish until the job completes;
+    follow=false returns only the results recorded so far.
+    """
+    if await _jobs.get(job_id) is None:
+        raise HTTPException(404, f"Unknown job {job_id}")
+
+    async def lines():
+        async for result in _jobs.stream(job_id, follow=follow):
+            yield json.dumps(result) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# --- Model registry administration ---------------------------------------------------
+# Reading the registry is public; changing it requires X-Admin-Token to equal MODEL_ADMIN_TOKEN
+# (the endpoints are disabled when MODEL_ADMIN_TOKEN is unset). The registry lives in each process,
+# so changes are refused with 409 under several api/serve.py workers: one request would only reach
+# the worker that accepted it, leaving the others on different versions and traffic weights.
+
+
+def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    expected = os.environ.get("MODEL_ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(403, "Model administration is disabled (MODEL_ADMIN_TOKEN not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(403, "Invalid admin token")
+
+
+def _require_single_worker():
+    workers = int(os.environ.get(WORKERS_ENV, "1"))
+    if workers > 1:
+        raise HTTPException(
+            409,
+            f"Model registry changes are not supported with {workers} workers (each holds its own registry); "
+            "restart the server with the new MODEL_PATH / MODEL_VERSION instead",
+        )
+
+
+class LoadModelRequest(BaseModel):
+    path: str
+    activate: bool = False
+
+
+class RoutingRequest(BaseModel):
+    traffic: Dict[str, float] = {}
+    shadow: Optional[str] = None
+
+
+@app.get("/models")
+def list_models():
+    """Resident model versions, the active one, traffic weights, shadow, and loads in progress."""
+    return get_registry().describe()
+
+
+@app.post("/models/{version}/load", status_code=202, dependencies=[Depends(_require_admin), Depends(_require_single_worker)])
+def load_model_version(version: str, body: LoadModelRequest):
+    """
+    Load a checkpoint as version in the background (load, warm up, start its pipeline);
+    with activate it becomes the default once ready. Current versions keep serving meanwhile.
+    Poll GET /models for completion or load_errors.
+    """
+    path = Path(body.path)
+    if not path.is_file():
+        raise HTTPException(404, f"Model file not found: {path}")
+    get_registry().load_async(version, path, activate=body.activate)
+    return {"status": "loading", "version": version}
+
+
+@app.post("/models/{version}/activate", dependencies=[Depends(_require_admin), Depends(_require_single_worker)])
+def activate_model_version(version: str):
+    """Atomically make a resident version the default."""
+    try:
+        get_registry().activate(version)
+    except KeyError as e:
+        raise HTTPException(404, str(e.args[0]))
+    return get_registry().describe()
+
+
+@app.put("/models/routing", dependencies=[Depends(_require_admin), Depends(_require_single_worker)])
+def set_model_routing(body: RoutingRequest):
+    """Set the A/B traffic split ({} = all to the active version) and the shadow version (null = none)."""
+    registry = get_registry()
+    try:
+        registry.set_traffic(body.traffic)
+        registry.set_shadow(body.shadow)
+    except KeyError as e:
+        raise HTTPException(404, str(e.args[0]))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return registry.describe()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,149 @@
+"""
+Multi-process server: load the model once, then fork uvicorn workers that share it.
+
+The parent loads the weights before forking, so every worker maps the same physical
+pages copy-on-write (inference never writes them) instead of holding its own copy.
+The workers accept on one listening socket inherited from the parent. Torch intra-op
+threads are split so workers x INFERENCE_NUM_THREADS matches the CPU quota (cgroup
+limit or affinity mask), and /metrics aggregates counters and histograms across
+workers through per-worker snapshots in METRICS_MULTIPROC_DIR.
+
+POSIX only (os.fork). Usage:
+    PYTHONPATH=. python -m api.serve --workers 4 --port 8000
+    WEB_CONCURRENCY=4 PYTHONPATH=. python -m api.serve
+"""
+import argparse
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import traceback
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.monitoring import cpu_quota
+
+
+def _listen(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(worker_id: int, sock: socket.socket, log_level: str) -> None:
+    """Serve the app on the inherited socket until SIGTERM/SIGINT (uvicorn installs the handlers)."""
+    import uvicorn
+
+    import api.main as main
+
+    os.environ[main.WORKER_ID_ENV] = str(worker_id)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    server = uvicorn.Server(uvicorn.Config(main.app, log_level=log_level, lifespan="on"))
+    server.run(sockets=[sock])
+
+
+def _preload_model() -> None:
+    """Load the weights in the parent so forked workers share them (ONNX sessions are created per worker)."""
+    import api.main as main
+    from src.inference.export import ONNX_SUFFIX
+
+    path = main._ensure_model_file()
+    backend = os.environ.get("MODEL_BACKEND", "auto")
+    if backend == "onnx" or (backend == "auto" and path.name.endswith(ONNX_SUFFIX)):
+        # onnxruntime starts its thread pools when the session is created; those do not survive fork
+        return
+    # Only load weights here: pipelines, warm-up and any forward pass start threads, so they run per worker
+    main.preload_model()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with pre-forked workers sharing one model load")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("WEB_CONCURRENCY", "1")))
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    workers = max(1, args.workers)
+    if workers > 1 and not hasattr(os, "fork"):
+        sys.exit("Multiple workers need os.fork (POSIX); run uvicorn api.main:app on this platform")
+
+    quota = cpu_quota()
+    # An explicit INFERENCE_NUM_THREADS wins; otherwise split the CPU quota between workers
+    if "INFERENCE_NUM_THREADS" not in os.environ:
+        os.environ["INFERENCE_NUM_THREADS"] = str(max(1, quota // workers))
+    if workers > 1 and quota < workers:
+        print(f"[SERVE] {workers} workers exceed the CPU quota ({quota}); workers will contend", flush=True)
+
+    os.environ["SERVING_WORKERS"] = str(workers)  # api.main refuses per-process registry changes when > 1
+    created_dir = None
+    if workers > 1:
+        metrics_dir = os.environ.get("METRICS_MULTIPROC_DIR")
+        if not metrics_dir:
+            metrics_dir = created_dir = tempfile.mkdtemp(prefix="cats-vs-dogs-metrics-")
+        os.environ["METRICS_MULTIPROC_DIR"] = metrics_dir
+        for stale in Path(metrics_dir).glob("worker-*.prom"):
+            stale.unlink()  # counters restart with the server
+
+    _preload_model()
+    sock = _listen(args.host, args.port)
+    print(
+        f"[SERVE] http://{args.host}:{args.port} workers={workers} "
+        f"threads/worker={os.environ['INFERENCE_NUM_THREADS']} cpu_quota={quota}",
+        flush=True,
+    )
+    if workers == 1:
+        _run_worker(0, sock, args.log_level)
+        return
+
+    children = {}  # pid -> worker id
+    stopping = False
+
+    def spawn(worker_id: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(worker_id, sock, args.log_level)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = worker_id
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for i in range(workers):
+        spawn(i)
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker_id = children.pop(pid, None)
+        if worker_id is not None and not stopping:
+            print(f"[SERVE] worker {worker_id} (pid {pid}) exited with status {status}; restarting", flush=True)
+            spawn(worker_id)
+    sock.close()
+    if created_dir:
+        shutil.rmtree(created_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Request body limits for the upload endpoints, enforced while the body streams in.
+
+UploadLimitMiddleware is plain ASGI, so it runs before FastAPI parses the multipart form:
+a Content-Length over the endpoint's limit is answered 413 without reading the body, and a
+chunked (or understated) body is cut off at the first chunk that crosses the limit. The
+multipart parser spools each file to disk past 1 MiB, so a request holds at most that much
+of any one file in memory. UploadStats reports the bytes in flight and every rejection.
+"""
+import json
+from collections import Counter
+from typing import Callable, Optional
+
+# Bytes of each uploaded file the multipart parser keeps in memory before spooling it to disk;
+# archive members extracted for a request are spooled the same way
+SPOOL_MAX_SIZE = 1024 * 1024
+# Reasons an upload is refused; labels of upload_rejected_total
+REJECT_REASONS = ("body_too_large", "file_too_large", "archive_too_large", "too_many_pixels", "not_an_image")
+
+
+class BodyTooLargeError(Exception):
+    """Raised from receive() once a request body exceeds its limit."""
+
+
+class UploadStats:
+    """Upload bodies in flight and rejected uploads, rendered as Prometheus metrics."""
+
+    def __init__(self):
+        self.inflight_requests = 0
+        self.inflight_bytes = 0
+        self.rejected = Counter()
+
+    def reject(self, reason: str) -> None:
+        self.rejected[reason] += 1
+
+    def render_metrics(self) -> str:
+        lines = [
+            "# HELP upload_inflight_requests Upload requests being received or handled",
+            "# TYPE upload_inflight_requests gauge",
+            f"upload_inflight_requests {self.inflight_requests}",
+            "",
+            "# HELP upload_inflight_bytes Request body bytes held by upload requests still in progress "
+            "(in memory up to 1 MiB per file, spooled to disk beyond)",
+            "# TYPE upload_inflight_bytes gauge",
+            f"upload_inflight_bytes {self.inflight_bytes}",
+            "",
+            "# HELP upload_rejected_total Uploads refused before decoding by reason",
+            "# TYPE upload_rejected_total counter",
+        ]
+        lines += [f'upload_rejected_total{{reason="{r}"}} {self.rejected[r]}' for r in REJECT_REASONS]
+        return "\n".join(lines) + "\n"
+
+
+async def _send_413(send, limit: int) -> None:
+    body = json.dumps({"detail": f"Request body exceeds {limit} bytes"}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 413,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _content_length(scope) -> Optional[int]:
+    for name, value in scope.get("headers", ()):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class UploadLimitMiddleware:
+    """
+    Cap request bodies per path: limit_for(path) returns the max body bytes, or None for
+    paths without a limit (not counted in stats).
+    """
+
+    def __init__(self, app, limit_for: Callable[[str], Optional[int]], stats: UploadStats):
+        self.app = app
+        self.limit_for = limit_for
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limit_for(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        # Label for requests refused before routing (limited paths are exact route paths)
+        scope.setdefault("state", {})["upload_endpoint"] = scope["path"]
+        declared = _content_length(scope)
+        if declared is not None and declared > limit:
+            self.stats.reject("body_too_large")
+            await _send_413(send, limit)
+            return
+        received = 0
+        exceeded = started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                n = len(message.get("body", b""))
+                received += n
+                self.stats.inflight_bytes += n
+                if received > limit:
+                    exceeded = True
+                    raise BodyTooLargeError(f"Request body exceeds {limit} bytes")
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            if exceeded and not started:
+                return  # the app's reply to the aborted body (e.g. a form parse 400) is replaced below
+            started = True
+            await send(message)
+
+        self.stats.inflight_requests += 1
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except BodyTooLargeError:
+            pass
+        finally:
+            self.stats.inflight_requests -= 1
+            self.stats.inflight_bytes -= received
+        if exceeded and not started:
+            self.stats.reject("body_too_large")
+            await _send_413(send, limit)
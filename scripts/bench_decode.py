@@ -0,0 +1,131 @@
+"""
+Micro-benchmark: full-resolution decode + resize (previous path) vs JPEG draft-mode fast path.
+Reports mean/p95 decode time per image and peak RSS growth, each path measured in its own process.
+
+Usage:
+    PYTHONPATH=. python scripts/bench_decode.py                    # synthetic 4032x3024 JPEGs
+    PYTHONPATH=. python scripts/bench_decode.py --images-dir data/raw/PetImages/Cat --limit 200
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+from PIL import Image
+
+from src.config import IMG_SIZE
+from src.data import decode_image
+from src.monitoring import peak_rss_mb
+
+
+def legacy_decode(path: Path, out: np.ndarray) -> np.ndarray:
+    """The pre-fast-path pipeline: decode at native resolution, then resize and convert."""
+    img = Image.open(path).convert("RGB")
+    img = img.resize(IMG_SIZE, Image.Resampling.BILINEAR)
+    arr = np.array(img, dtype=np.float32) / 255.0
+    out[...] = np.transpose(arr, (2, 0, 1))
+    return out
+
+
+def fast_decode(path: Path, out: np.ndarray) -> np.ndarray:
+    return decode_image(path, IMG_SIZE, out=out)
+
+
+MODES = {"legacy": legacy_decode, "fast": fast_decode}
+
+
+def run_mode(mode: str, paths: list, repeat: int) -> dict:
+    fn = MODES[mode]
+    out = np.empty((3, IMG_SIZE[1], IMG_SIZE[0]), dtype=np.float32)
+    rss_before = peak_rss_mb()
+    fn(paths[0], out)  # warm up codecs (its peak memory still counts)
+    times = []
+    for _ in range(repeat):
+        for p in paths:
+            t0 = time.perf_counter()
+            fn(p, out)
+            times.append((time.perf_counter() - t0) * 1000)
+    t = np.array(times)
+    return {
+        "mode": mode,
+        "images": len(times),
+        "mean_ms": float(t.mean()),
+        "p50_ms": float(np.percentile(t, 50)),
+        "p95_ms": float(np.percentile(t, 95)),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_rss_growth_mb": peak_rss_mb() - rss_before,
+    }
+
+
+def make_synthetic_images(out_dir: Path, n: int, size: tuple) -> list:
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        # Smooth gradient plus noise compresses like a photo rather than pure noise
+        h, w = size[1], size[0]
+        base = np.linspace(0, 255, w, dtype=np.float32)[np.newaxis, :, np.newaxis]
+        img = np.clip(base + rng.normal(0, 20, (h, 1, 3)), 0, 255).astype(np.uint8)
+        img = np.broadcast_to(img, (h, w, 3))
+        p = out_dir / f"synthetic_{i}.jpg"
+        Image.fromarray(np.ascontiguousarray(img)).save(p, quality=90)
+        paths.append(p)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images-dir", type=Path, default=None, help="Directory of JPEGs (default: synthetic)")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--synthetic-size", type=int, nargs=2, default=(4032, 3024), metavar=("W", "H"))
+    parser.add_argument("--json", type=Path, default=None, help="Write results as JSON")
+    parser.add_argument("--mode", choices=sorted(MODES), default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--paths-file", type=Path, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # Child process: measure a single path so peak RSS is not shared between modes
+        paths = [Path(p) for p in args.paths_file.read_text().splitlines()]
+        print(json.dumps(run_mode(args.mode, paths, args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.images_dir:
+            paths = sorted(p for p in args.images_dir.iterdir() if p.suffix.lower() in (".jpg", ".jpeg"))
+            paths = paths[: args.limit]
+        else:
+            print(f"Generating {args.limit} synthetic {args.synthetic_size[0]}x{args.synthetic_size[1]} JPEGs...")
+            paths = make_synthetic_images(Path(tmp), args.limit, tuple(args.synthetic_size))
+        if not paths:
+            raise SystemExit("No JPEG images found")
+        paths_file = Path(tmp) / "paths.txt"
+        paths_file.write_text("\n".join(str(p) for p in paths))
+
+        results = []
+        for mode in ("legacy", "fast"):
+            proc = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--paths-file", str(paths_file), "--repeat", str(args.repeat)],
+                capture_output=True, text=True, check=True,
+            )
+            results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"{'mode':<8} {'images':>6} {'mean_ms':>9} {'p95_ms':>9} {'peak_rss_mb':>12} {'rss_growth_mb':>14}")
+    for r in results:
+        print(
+            f"{r['mode']:<8} {r['images']:>6} {r['mean_ms']:>9.2f} {r['p95_ms']:>9.2f} "
+            f"{r['peak_rss_mb']:>12.1f} {r['peak_rss_growth_mb']:>14.1f}"
+        )
+    speedup = results[0]["mean_ms"] / results[1]["mean_ms"] if results[1]["mean_ms"] else float("nan")
+    print(f"Fast path speedup: {speedup:.1f}x")
+    if args.json:
+        args.json.write_text(json.dumps({"results": results, "speedup": speedup}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
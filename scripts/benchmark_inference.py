@@ -0,0 +1,232 @@
+"""
+Inference benchmark: latency percentiles, throughput and peak RSS across a parameter sweep.
+
+Targets:
+    direct  decode + forward through src.inference (no HTTP), callers on a thread pool
+    api     the FastAPI app in-process via httpx.ASGITransport (/predict, or /predict/batch when batch > 1)
+
+Sweeps every combination of --concurrency, --batch-sizes, --image-sizes, --threads and --tta
+(test-time augmentation modes, to price each mode's latency against an endpoint's SLO) and writes
+machine-readable JSON. Pass --compare to diff against a previous run (e.g. from another commit).
+peak_rss_mb is the process high-water mark after each configuration (configs run in sweep order).
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_inference.py --target direct api --out bench.json
+    PYTHONPATH=. python scripts/benchmark_inference.py --out new.json --compare bench.json
+    PYTHONPATH=. python scripts/benchmark_inference.py --target direct --tta none flip five_crop ten_crop multiscale
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import torch
+from PIL import Image
+
+from src.config import IMG_SIZE
+from src.inference import TTA_MODES, aggregate_views, decode_views, load_model, predict_proba_batch
+from src.model import get_model
+from src.monitoring import peak_rss_mb
+
+
+def make_jpeg(width: int, height: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    img = np.clip(base + rng.normal(0, 25, (height, 1, 3)), 0, 255).astype(np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(np.ascontiguousarray(np.broadcast_to(img, (height, width, 3)))).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def summarize(latencies_ms, images, wall_s) -> dict:
+    lat = np.array(latencies_ms)
+    return {
+        "requests": len(lat),
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p95_ms": float(np.percentile(lat, 95)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "mean_ms": float(lat.mean()),
+        "images_per_sec": images / wall_s if wall_s > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def bench_direct(
+    model, payload: bytes, batch_size: int, concurrency: int, requests: int, warmup: int, tta: str = "none"
+) -> dict:
+    """Each request decodes batch_size uploads (all their TTA views) and runs one forward pass."""
+    def one_request():
+        t0 = time.perf_counter()
+        views = [decode_views(payload, tta) for _ in range(batch_size)]
+        aggregate_views(predict_proba_batch(model, np.concatenate(views)), len(views[0]))
+        return (time.perf_counter() - t0) * 1000
+
+    for _ in range(warmup):
+        one_request()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        t0 = time.perf_counter()
+        latencies = list(pool.map(lambda _: one_request(), range(requests)))
+        wall = time.perf_counter() - t0
+    return summarize(latencies, requests * batch_size, wall)
+
+
+async def _bench_api_async(
+    payload: bytes, batch_size: int, concurrency: int, requests: int, warmup: int, tta: str = "none"
+) -> dict:
+    import httpx
+
+    import api.main as main
+
+    main._registry = None  # fresh pipeline and cache (disabled via env) so repeated payloads are not served from it
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            if batch_size == 1:
+                async def call():
+                    return await client.post(
+                        "/predict", params={"tta": tta}, files={"file": ("img.jpg", payload, "image/jpeg")}
+                    )
+            else:
+                files = [("files", (f"{i}.jpg", payload, "image/jpeg")) for i in range(batch_size)]
+
+                async def call():
+                    return await client.post("/predict/batch", params={"tta": tta}, files=files)
+
+            for _ in range(warmup):
+                (await call()).raise_for_status()
+            sem = asyncio.Semaphore(concurrency)
+            latencies, errors = [], 0
+
+            async def timed():
+                nonlocal errors
+                async with sem:
+                    t0 = time.perf_counter()
+                    r = await call()
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    errors += r.status_code != 200
+
+            t0 = time.perf_counter()
+            await asyncio.gather(*(timed() for _ in range(requests)))
+            wall = time.perf_counter() - t0
+    result = summarize(latencies, requests * batch_size, wall)
+    result["errors"] = errors
+    return result
+
+
+def bench_api(model_path: Path, payload: bytes, batch_size, concurrency, requests, warmup, threads, tta="none") -> dict:
+    os.environ["MODEL_PATH"] = str(model_path)
+    os.environ["INFERENCE_NUM_THREADS"] = str(threads)
+    os.environ["PREDICTION_CACHE_SIZE"] = "0"
+    return asyncio.run(_bench_api_async(payload, batch_size, concurrency, requests, warmup, tta))
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent.parent).stdout.strip()
+    except OSError:
+        return ""
+
+
+def config_key(r: dict) -> tuple:
+    return (r["target"], r["concurrency"], r["batch_size"], tuple(r["image_size"]), r["threads"], r.get("tta", "none"))
+
+
+def compare(results: list, baseline_path: Path, tolerance: float) -> int:
+    """Print per-config deltas vs a previous run; return the number of regressions beyond tolerance."""
+    with open(baseline_path) as f:
+        baseline = {config_key(r): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\nComparison vs {baseline_path} (tolerance {tolerance:.0%}):")
+    for r in results:
+        b = baseline.get(config_key(r))
+        if b is None:
+            continue
+        d_p99 = r["p99_ms"] / b["p99_ms"] - 1 if b["p99_ms"] else 0.0
+        d_tput = r["images_per_sec"] / b["images_per_sec"] - 1 if b["images_per_sec"] else 0.0
+        flag = d_p99 > tolerance or d_tput < -tolerance
+        regressions += flag
+        print(f"  {config_key(r)}  p99 {d_p99:+.1%}  images/s {d_tput:+.1%}{'  REGRESSION' if flag else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", nargs="+", choices=["direct", "api"], default=["direct", "api"])
+    parser.add_argument("--model-path", type=Path, default=None, help="Checkpoint (default: random-init SimpleCNN)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--image-sizes", nargs="+", default=["640x480", "4032x3024"], help="Upload sizes WxH")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="torch intra-op threads")
+    parser.add_argument("--tta", nargs="+", choices=TTA_MODES, default=["none"], help="Test-time augmentation modes")
+    parser.add_argument("--requests", type=int, default=30, help="Measured requests per configuration")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--out", type=Path, default=Path("benchmark_results.json"))
+    parser.add_argument("--compare", type=Path, default=None, help="Previous results JSON to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model_path = args.model_path
+        if model_path is None:
+            model_path = Path(tmp) / "model.pt"
+            torch.manual_seed(0)
+            torch.save(get_model(num_classes=2).state_dict(), model_path)
+        model = load_model(model_path)
+        sizes = [tuple(int(v) for v in s.lower().split("x")) for s in args.image_sizes]
+        payloads = {size: make_jpeg(*size) for size in sizes}
+
+        results = []
+        for target, threads, batch_size, size, concurrency, tta in itertools.product(
+            args.target, sorted(set(args.threads)), args.batch_sizes, sizes, args.concurrency, args.tta
+        ):
+            torch.set_num_threads(threads)
+            if target == "direct":
+                r = bench_direct(model, payloads[size], batch_size, concurrency, args.requests, args.warmup, tta)
+            else:
+                r = bench_api(model_path, payloads[size], batch_size, concurrency, args.requests, args.warmup, threads, tta)
+            r.update({"target": target, "threads": threads, "batch_size": batch_size,
+                      "image_size": list(size), "concurrency": concurrency, "tta": tta})
+            results.append(r)
+            print(
+                f"{target:<6} threads={threads:<2} batch={batch_size:<3} image={size[0]}x{size[1]:<5} "
+                f"conc={concurrency:<3} tta={tta:<10} p50={r['p50_ms']:8.1f}ms p95={r['p95_ms']:8.1f}ms "
+                f"p99={r['p99_ms']:8.1f}ms {r['images_per_sec']:8.1f} img/s rss={r['peak_rss_mb']:.0f}MB",
+                flush=True,
+            )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+            "model_input": list(IMG_SIZE),
+            "requests_per_config": args.requests,
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.compare is not None and compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
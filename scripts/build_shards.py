@@ -0,0 +1,32 @@
+"""
+Build the preprocessed dataset cache: decode every image in splits.json once, resize to
+224x224 and store uint8 pixels in memory-mapped shards (see src/data/shards.py).
+Training with --shards-dir then does no JPEG decoding.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+
+from src.config import DATA_PROCESSED, IMG_SIZE
+from src.data import write_shards
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--splits", type=Path, default=DATA_PROCESSED / "splits.json")
+    parser.add_argument("--out-dir", type=Path, default=DATA_PROCESSED / "shards")
+    parser.add_argument("--shard-size", type=int, default=1024, help="Images per shard file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Decode threads")
+    args = parser.parse_args()
+
+    with open(args.splits) as f:
+        splits = json.load(f)
+    index = write_shards(splits, args.out_dir, IMG_SIZE, shard_size=args.shard_size, workers=args.workers)
+    for split, entry in index["splits"].items():
+        print(f"{split}: {entry['count']} images in {len(entry['shards'])} shards ({entry['failed']} failed to decode)")
+    print(f"Shards written to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
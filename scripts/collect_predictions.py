@@ -1,6 +1,7 @@
 """
 M5: Collect a small batch of predictions and true labels for post-deployment performance tracking.
 Usage: Call API or run model locally on test set, save (path, true_label, pred_label, probs) to JSON.
+Aggregate metrics (per-class precision / recall, ROC AUC, calibration) go to OUT.metrics.json.
 """
 import argparse
 import json
@@ -10,7 +11,10 @@ from pathlib import Path
 # Allow running from project root
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+import torch
+
 from src.config import DATA_PROCESSED, CLASS_NAMES
+from src.evaluation import MetricsAccumulator
 from src.inference import load_model, predict
 
 
@@ -32,6 +36,7 @@ def main():
 
     model = load_model(args.model_path)
     results = []
+    metrics = MetricsAccumulator(len(CLASS_NAMES))
     for item in test_items:
         path, true_label_idx = item["path"], item["label"]
         true_label = CLASS_NAMES[true_label_idx]
@@ -43,10 +48,19 @@ def main():
             "probabilities": out["probabilities"],
             "correct": out["label"] == true_label,
         })
+        probs = torch.tensor([[out["probabilities"][name] for name in CLASS_NAMES]], dtype=torch.float64)
+        metrics.update(torch.tensor([true_label_idx]), probs=probs)
     with open(args.out, "w") as f:
         json.dump(results, f, indent=2)
-    acc = sum(r["correct"] for r in results) / len(results) if results else 0
-    print(f"Collected {len(results)} predictions -> {args.out} (accuracy on batch: {acc:.2%})")
+    metrics_path = args.out.with_name(args.out.stem + ".metrics.json")
+    report = metrics.compute(CLASS_NAMES)
+    with open(metrics_path, "w") as f:
+        json.dump(report, f, indent=2)
+    auc = f", ROC AUC {report['roc_auc']:.3f}" if report["roc_auc"] is not None else ""
+    print(
+        f"Collected {len(results)} predictions -> {args.out} (accuracy on batch: {metrics.accuracy:.2%}{auc}, "
+        f"ECE {report['ece']:.3f}; metrics -> {metrics_path})"
+    )
 
 
 if __name__ == "__main__":
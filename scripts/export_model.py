@@ -0,0 +1,127 @@
+"""
+Export optimized inference variants of a trained model.pt and check their accuracy against float32.
+
+Writes next to the checkpoint (or --out-dir):
+    model.ts.pt               BatchNorm-folded, frozen TorchScript (float32)
+    model.int8-dynamic.ts.pt  dynamic int8 quantization (Linear layers) as TorchScript
+    model.int8-static.ts.pt   static int8 quantization calibrated on training images, as TorchScript
+    model.onnx                BatchNorm-folded ONNX graph (only with --onnx; needs the onnx package)
+    export_report.json        accuracy / agreement / latency of each variant vs float32 on the test split
+                              (the ONNX graph is included when onnxruntime is installed)
+
+Serve a variant with MODEL_PATH=models/model.int8-static.ts.pt (the API picks the backend by file name).
+
+Usage:
+    PYTHONPATH=. python scripts/export_model.py --model-path models/model.pt --max-accuracy-drop 0.01
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np
+import torch
+
+from src.config import DATA_PROCESSED, IMG_SIZE
+from src.data import decode_image
+from src.inference import load_model
+from src.inference.export import (
+    compare_to_reference,
+    example_input,
+    export_onnx,
+    quantize_dynamic_int8,
+    quantize_static_int8,
+    to_torchscript,
+)
+
+
+def iter_batches(items, batch_size):
+    """Decode split items into (x, y) batches through the shared preprocessing path, one batch at a time."""
+    for start in range(0, len(items), batch_size):
+        chunk = items[start : start + batch_size]
+        x = np.empty((len(chunk), 3, IMG_SIZE[1], IMG_SIZE[0]), dtype=np.float32)
+        for i, item in enumerate(chunk):
+            decode_image(item["path"], IMG_SIZE, out=x[i])
+        yield torch.from_numpy(x), torch.tensor([item["label"] for item in chunk], dtype=torch.long)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", type=Path, default=Path("models/model.pt"))
+    parser.add_argument("--out-dir", type=Path, default=None, help="Default: directory of --model-path")
+    parser.add_argument("--splits", type=Path, default=DATA_PROCESSED / "splits.json")
+    parser.add_argument("--calibration-samples", type=int, default=256, help="Train images for static int8 calibration")
+    parser.add_argument("--max-eval-samples", type=int, default=None, help="Cap test images used for the accuracy check")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--onnx", action="store_true", help="Also export model.onnx (requires onnx)")
+    parser.add_argument("--max-accuracy-drop", type=float, default=None,
+                        help="Exit non-zero if any variant loses more than this accuracy vs float32")
+    args = parser.parse_args()
+
+    out_dir = args.out_dir or args.model_path.parent
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model = load_model(args.model_path)
+
+    splits = {}
+    if args.splits.exists():
+        with open(args.splits) as f:
+            splits = json.load(f)
+    else:
+        print(f"No splits at {args.splits}: calibrating on random inputs and skipping the accuracy check", flush=True)
+    calib_items = (splits.get("train") or [])[: args.calibration_samples]
+    calib = [x for x, _ in iter_batches(calib_items, args.batch_size)] if calib_items else [example_input(8) for _ in range(4)]
+
+    variants = {
+        "torchscript": to_torchscript(model),
+        "int8-dynamic": quantize_dynamic_int8(model),
+        "int8-static": quantize_static_int8(model, calib),
+    }
+    files = {
+        "torchscript": out_dir / "model.ts.pt",
+        "int8-dynamic": out_dir / "model.int8-dynamic.ts.pt",
+        "int8-static": out_dir / "model.int8-static.ts.pt",
+    }
+    for name, module in variants.items():
+        torch.jit.save(module, str(files[name]))
+        print(f"Wrote {files[name]}", flush=True)
+    onnx_path = None
+    if args.onnx:
+        try:
+            onnx_path = export_onnx(model, out_dir / "model.onnx")
+            print(f"Wrote {onnx_path}", flush=True)
+        except (ImportError, ModuleNotFoundError) as e:
+            print(f"Skipping ONNX export: {e}", flush=True)
+
+    test_items = splits.get("test") or splits.get("val") or []
+    if args.max_eval_samples is not None:
+        test_items = test_items[: args.max_eval_samples]
+    if not test_items:
+        return
+    # Reload the saved files so the check covers exactly what will be served
+    served = {name: load_model(files[name], backend="torchscript") for name in variants}
+    if onnx_path is not None:
+        try:
+            served["onnx"] = load_model(onnx_path, backend="onnx")
+        except ImportError as e:
+            print(f"Not checking the ONNX export: {e}", flush=True)
+    # Test images are decoded a batch at a time, never all held in memory
+    report = compare_to_reference(model, served, iter_batches(test_items, args.batch_size))
+    report_path = out_dir / "export_report.json"
+    with open(report_path, "w") as f:
+        json.dump({"samples": len(test_items), "batch_size": args.batch_size, "variants": report}, f, indent=2)
+
+    print(f"{'variant':<14} {'accuracy':>9} {'delta':>8} {'agree':>7} {'max|dP|':>8} {'ms/batch':>9}")
+    for name, r in report.items():
+        print(f"{name:<14} {r['accuracy']:>9.4f} {r['accuracy_delta']:>+8.4f} {r['agreement']:>7.3f} "
+              f"{r['max_prob_delta']:>8.4f} {r['ms_per_batch']:>9.2f}")
+    print(f"Report written to {report_path}")
+    if args.max_accuracy_drop is not None:
+        worst = min(r["accuracy_delta"] for r in report.values())
+        if -worst > args.max_accuracy_drop:
+            sys.exit(f"Accuracy drop {-worst:.4f} exceeds --max-accuracy-drop {args.max_accuracy_drop}")
+
+
+if __name__ == "__main__":
+    main()
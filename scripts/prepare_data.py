@@ -1,13 +1,24 @@
 """
 Prepare dataset: expect raw data in data/raw (e.g. Kaggle cats/dogs structure).
 Writes processed splits to data/processed for DVC tracking.
+
+Files are recorded in an incremental index (data/processed/index.sqlite): a re-run only
+hashes new or modified images, and splits come from content hashes, so adding images
+never moves existing ones to another split.
+
+A validation stage then decodes new content in a process pool and looks for exact and
+near-duplicates; corrupt and duplicate files are written to data/processed/quarantine.json
+and left out of the splits.
 """
 import argparse
 import json
+import time
 from pathlib import Path
 
-from src.config import DATA_RAW, DATA_PROCESSED, TRAIN_RATIO, VAL_RATIO, TEST_RATIO
-from src.data import get_train_val_test_splits
+from src.config import DATA_RAW, DATA_PROCESSED, NEAR_DUPLICATE_MAX_DISTANCE, TRAIN_RATIO, VAL_RATIO, TEST_RATIO
+from src.data import DatasetIndex, validate_index
+from src.data.index import INDEX_FILENAME
+from src.data.validate import QUARANTINE_FILENAME
 
 
 def main():
@@ -18,31 +29,62 @@ def main():
     parser.add_argument("--val-ratio", type=float, default=VAL_RATIO)
     parser.add_argument("--test-ratio", type=float, default=TEST_RATIO)
     parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--index", type=Path, default=None, help=f"Index database (default: OUT_DIR/{INDEX_FILENAME})")
+    parser.add_argument("--workers", type=int, default=None, help="Threads for directory scans and hashing")
+    parser.add_argument("--rebuild-index", action="store_true", help="Discard the index and rehash every file")
+    parser.add_argument("--skip-validation", action="store_true", help="Do not check decodability or duplicates")
+    parser.add_argument(
+        "--near-dup-distance",
+        type=int,
+        default=NEAR_DUPLICATE_MAX_DISTANCE,
+        help="Max dHash bit distance for near-duplicates (-1 disables)",
+    )
     args = parser.parse_args()
 
     data_dir = args.data_dir
     out_dir = args.out_dir
     out_dir.mkdir(parents=True, exist_ok=True)
+    index_path = args.index or out_dir / INDEX_FILENAME
+    if args.rebuild_index:
+        index_path.unlink(missing_ok=True)
 
-    train, val, test = get_train_val_test_splits(
-        data_dir,
-        train_ratio=args.train_ratio,
-        val_ratio=args.val_ratio,
-        test_ratio=args.test_ratio,
-        seed=args.seed,
-    )
+    t0 = time.perf_counter()
+    with DatasetIndex(index_path, data_dir) as index:
+        stats = index.update(workers=args.workers)
+        print(
+            f"Indexed {len(index)} images in {time.perf_counter() - t0:.1f}s "
+            f"(added {stats['added']}, changed {stats['changed']}, removed {stats['removed']}, "
+            f"unchanged {stats['unchanged']})"
+        )
+        quarantined = []
+        if not args.skip_validation:
+            t0 = time.perf_counter()
+            report = validate_index(index, workers=args.workers, max_distance=args.near_dup_distance)
+            quarantined = report.pop("quarantine")
+            with open(out_dir / QUARANTINE_FILENAME, "w") as f:
+                json.dump({"summary": report, "files": quarantined}, f, indent=1)
+            print(
+                f"Validated {report['checked']} new images in {time.perf_counter() - t0:.1f}s: "
+                f"{report['corrupt']} corrupt, {report['exact_duplicates']} exact and "
+                f"{report['near_duplicates']} near duplicates quarantined to {out_dir / QUARANTINE_FILENAME}"
+            )
+        train, val, test = index.splits(
+            train_ratio=args.train_ratio,
+            val_ratio=args.val_ratio,
+            test_ratio=args.test_ratio,
+            seed=args.seed,
+            exclude=[entry["path"] for entry in quarantined],
+        )
 
-    # Save split metadata (paths and labels) so training can load from disk
+    # Save split metadata (paths and labels) so training can load from disk; compact, not pretty-printed
     splits = {
         "train": [{"path": p, "label": l} for p, l in train],
         "val": [{"path": p, "label": l} for p, l in val],
         "test": [{"path": p, "label": l} for p, l in test],
     }
     with open(out_dir / "splits.json", "w") as f:
-        json.dump(splits, f, indent=2)
+        json.dump(splits, f, separators=(",", ":"))
 
-    # Optionally save small numpy arrays for DVC (e.g. first 100 of each for testing)
-    # For full data, DVC tracks the raw/processed folders
     print(f"Train: {len(train)}, Val: {len(val)}, Test: {len(test)}")
     print(f"Splits written to {out_dir / 'splits.json'}")
 
@@ -0,0 +1,69 @@
+"""
+Offline batch scoring of whole splits or directories (nightly re-scoring).
+
+Decodes in a process pool, runs SCORING_BATCH_SIZE-image forward passes and streams one
+row per image to JSONL or Parquet; accuracy and the confusion matrix (for labelled inputs)
+are kept as running counts. Interrupted runs continue with --resume. --tta scores several
+views of each image (flips, crops, scales) and aggregates them.
+
+Usage:
+    PYTHONPATH=. python scripts/score_batch.py --splits data/processed/splits.json --split test --out scores.jsonl
+    PYTHONPATH=. python scripts/score_batch.py --input-dir /data/listings --out scores.parquet --resume
+    PYTHONPATH=. python scripts/score_batch.py --split test --out scores_tta.jsonl --tta five_crop
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import torch
+
+from src.config import DATA_PROCESSED, SCORING_BATCH_SIZE, TTA_AGGREGATION
+from src.inference import TTA_AGGREGATIONS, TTA_MODES, iter_directory_items, iter_split_items, load_model, score_items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score many images with large batched forward passes")
+    parser.add_argument("--model-path", type=Path, default=Path("models/model.pt"))
+    parser.add_argument("--backend", default="auto", help="eager, torchscript, onnx or auto (by file name)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--splits", type=Path, default=DATA_PROCESSED / "splits.json")
+    source.add_argument("--input-dir", type=Path, default=None, help="Score every image under this directory")
+    parser.add_argument("--split", action="append", default=None, help="Split(s) to score from --splits (default: test)")
+    parser.add_argument("--out", type=Path, default=Path("scores.jsonl"), help="*.jsonl file or *.parquet directory")
+    parser.add_argument("--format", choices=("auto", "jsonl", "parquet"), default="auto")
+    parser.add_argument("--batch-size", type=int, default=SCORING_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads for the forward pass")
+    parser.add_argument("--resume", action="store_true", help="Continue after the rows recorded in OUT.state.json")
+    parser.add_argument("--limit", type=int, default=None, help="Score at most this many inputs")
+    parser.add_argument("--tta", choices=TTA_MODES, default="none",
+                        help="Test-time augmentation views per image (all scored in the same forward pass)")
+    parser.add_argument("--tta-aggregation", choices=TTA_AGGREGATIONS, default=TTA_AGGREGATION)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    if args.input_dir is not None:
+        items = iter_directory_items(args.input_dir)
+    else:
+        items = iter_split_items(args.splits, args.split or ["test"])
+    model = load_model(args.model_path, backend=args.backend)
+    summary = score_items(
+        model, items, args.out, fmt=args.format, batch_size=args.batch_size,
+        workers=args.workers, resume=args.resume, limit=args.limit,
+        tta=args.tta, tta_aggregation=args.tta_aggregation,
+    )
+    print(json.dumps(summary, indent=2))
+    acc = summary["accuracy"]
+    print(
+        f"Scored {summary['rows']} images -> {args.out} ({summary['errors']} unreadable, "
+        f"{summary['images_per_sec']:.1f} img/s"
+        + (f", accuracy {acc:.2%} on {summary['labelled']} labelled)" if acc is not None else ")")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,21 @@
 """
 Train baseline CNN with MLflow experiment tracking.
 Logs params, metrics, confusion matrix, and loss curves.
+
+Checkpoints (model, optimizer, scheduler, RNG state) go to --checkpoint-dir after every
+--checkpoint-every epochs; --resume continues from the last one, in the same MLflow run.
+The weights with the best val_acc are kept and written to model.pt, and training stops
+early once val_acc has not improved for --early-stopping-patience epochs.
+
+Data-parallel on several CPU processes or nodes (see src/training/distributed.py):
+    torchrun --nproc_per_node 4 scripts/train.py --distributed
 """
 import argparse
+import contextlib
 import json
+import os
+import random
+import sys
 import warnings
 from pathlib import Path
 
@@ -15,9 +27,8 @@ import mlflow.pytorch
 import numpy as np
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import DataLoader, DistributedSampler
 from torchvision import transforms
-from PIL import Image
 
 from src.config import (
     DATA_PROCESSED,
@@ -26,12 +37,33 @@ from src.config import (
     DEFAULT_EPOCHS,
     DEFAULT_BATCH_SIZE,
     DEFAULT_LEARNING_RATE,
+    DEFAULT_GRAD_ACCUM_STEPS,
+    DEFAULT_EARLY_STOPPING_PATIENCE,
     CLASS_NAMES,
 )
-from src.data import load_and_resize_image
+from src.data import ImagePathDataset, ShardDataset
 from src.model import get_model
+from src.training import (
+    BatchAugment,
+    EarlyStopping,
+    ShardSampler,
+    cleanup_distributed,
+    evaluate,
+    init_distributed,
+    is_main_process,
+    load_checkpoint,
+    prepare_model,
+    reduce_epoch_stats,
+    save_checkpoint,
+    train_epoch,
+)
+from src.training.checkpoint import BEST_CHECKPOINT, LAST_CHECKPOINT
 
-# Data augmentation for better generalization (PDF requirement)
+# Data augmentation for better generalization (PDF requirement).
+# Default: applied to whole batches as tensor ops after collation (see src/training/augment.py).
+BATCH_AUGMENT_FULL = BatchAugment()
+BATCH_AUGMENT_FAST = BatchAugment.flip_only()
+# Per-sample PIL equivalents, kept for --per-sample-augment comparisons
 TRAIN_TRANSFORMS_FULL = transforms.Compose([
     transforms.RandomHorizontalFlip(p=0.5),
     transforms.RandomRotation(degrees=15),
@@ -46,62 +78,7 @@ TRAIN_TRANSFORMS_FAST = transforms.Compose([
 IDENTITY_TRANSFORM = transforms.Compose([])
 
 
-class ImagePathDataset(Dataset):
-    def __init__(self, items, target_size=(224, 224), transform=None):
-        self.items = items  # list of {"path": ..., "label": ...}
-        self.target_size = target_size
-        self.transform = transform
-
-    def __len__(self):
-        return len(self.items)
-
-    def __getitem__(self, idx):
-        item = self.items[idx]
-        img = load_and_resize_image(item["path"], self.target_size)
-        if self.transform is not None:
-            pil_img = Image.fromarray((img * 255).astype("uint8"))
-            pil_img = self.transform(pil_img)
-            img = np.array(pil_img, dtype=np.float32) / 255.0
-        x = np.transpose(img, (2, 0, 1))
-        x = torch.from_numpy(x.astype(np.float32)).float()
-        y = torch.tensor(item["label"], dtype=torch.long)
-        return x, y
-
-
-def train_epoch(model, loader, criterion, optimizer, device):
-    model.train()
-    total_loss = 0.0
-    for x, y in loader:
-        x, y = x.to(device), y.to(device)
-        optimizer.zero_grad()
-        logits = model(x)
-        loss = criterion(logits, y)
-        loss.backward()
-        optimizer.step()
-        total_loss += loss.item()
-    return total_loss / len(loader)
-
-
-@torch.no_grad()
-def evaluate(model, loader, device):
-    model.eval()
-    all_preds, all_labels = [], []
-    total_loss = 0.0
-    criterion = nn.CrossEntropyLoss()
-    for x, y in loader:
-        x, y = x.to(device), y.to(device)
-        logits = model(x)
-        loss = criterion(logits, y)
-        total_loss += loss.item()
-        preds = logits.argmax(dim=1)
-        all_preds.extend(preds.cpu().numpy())
-        all_labels.extend(y.cpu().numpy())
-    acc = (np.array(all_preds) == np.array(all_labels)).mean()
-    return total_loss / len(loader), acc, np.array(all_preds), np.array(all_labels)
-
-
 def main():
-    import sys
     try:
         sys.stdout.reconfigure(line_buffering=True)
     except Exception:
@@ -118,7 +95,42 @@ def main():
     parser.add_argument("--num-workers", type=int, default=4, help="DataLoader workers (0=main thread only)")
     parser.add_argument("--fast", action="store_true", help="Quick run: 2 epochs, subsample data, light augmentation")
     parser.add_argument("--max-train-samples", type=int, default=None, help="Cap training samples (for quick runs)")
+    parser.add_argument("--per-sample-augment", action="store_true", help="Augment per image with PIL transforms instead of per batch")
+    parser.add_argument("--seed", type=int, default=42, help="Base seed for batch augmentation")
+    parser.add_argument("--shards-dir", type=Path, default=None, help="Read preprocessed uint8 shards (build_shards.py) instead of JPEGs")
+    parser.add_argument("--precision", choices=("fp32", "bf16"), default="fp32", help="bf16: autocast forward passes to bfloat16")
+    parser.add_argument("--channels-last", action="store_true", help="Use the NHWC memory format for the model and inputs")
+    parser.add_argument(
+        "--grad-accum-steps", type=int, default=DEFAULT_GRAD_ACCUM_STEPS,
+        help="Batches per optimizer step (effective batch = batch size x steps)",
+    )
+    parser.add_argument("--compile", action="store_true", help="Wrap the model with torch.compile")
+    parser.add_argument("--checkpoint-dir", type=Path, default=None, help="Default: OUT_DIR/checkpoints")
+    parser.add_argument("--checkpoint-every", type=int, default=1, help="Save a resumable checkpoint every N epochs")
+    parser.add_argument(
+        "--resume", nargs="?", const="last", default=None, metavar="CHECKPOINT",
+        help="Continue from a checkpoint (default: the last one in --checkpoint-dir)",
+    )
+    parser.add_argument(
+        "--early-stopping-patience", type=int, default=DEFAULT_EARLY_STOPPING_PATIENCE,
+        help="Stop after this many epochs without a val_acc improvement (0 disables)",
+    )
+    parser.add_argument("--min-delta", type=float, default=0.0, help="Smallest val_acc gain that counts as an improvement")
+    parser.add_argument(
+        "--distributed", action="store_true",
+        help="DistributedDataParallel across the processes started by torchrun (gloo backend)",
+    )
+    parser.add_argument("--dist-backend", default="gloo")
+    parser.add_argument("--threads", type=int, default=None, help="Torch threads per process (default: CPU quota / local processes)")
     args = parser.parse_args()
+    checkpoint_dir = args.checkpoint_dir or args.out_dir / "checkpoints"
+    if args.distributed:
+        init_distributed(args.dist_backend, num_threads=args.threads)
+    elif args.threads:
+        torch.set_num_threads(args.threads)
+    main_process = is_main_process()
+    if not main_process:
+        sys.stdout = open(os.devnull, "w")  # one rank reports progress
 
     # --fast overrides for speed
     if args.fast:
@@ -126,19 +138,23 @@ def main():
         if args.max_train_samples is None:
             args.max_train_samples = 2000
         args.num_workers = 0  # avoid fork overhead when data is small
-        train_transform = TRAIN_TRANSFORMS_FAST
+        train_transform, batch_augment = TRAIN_TRANSFORMS_FAST, BATCH_AUGMENT_FAST
         print("Fast mode: 2 epochs, max 2000 train samples, light augmentation", flush=True)
     else:
-        train_transform = TRAIN_TRANSFORMS_FULL
+        train_transform, batch_augment = TRAIN_TRANSFORMS_FULL, BATCH_AUGMENT_FULL
         if args.max_train_samples is not None:
             print(f"Limiting to {args.max_train_samples} train samples", flush=True)
 
+    if args.per_sample_augment:
+        batch_augment = None
+    else:
+        train_transform = None
+
     with open(args.data_dir / "splits.json") as f:
         splits = json.load(f)
     train_items = splits["train"]
     val_items = splits["val"]
     if args.max_train_samples is not None and len(train_items) > args.max_train_samples:
-        import random
         random.Random(42).shuffle(train_items)
         train_items = train_items[: args.max_train_samples]
     if not train_items:
@@ -148,12 +164,24 @@ def main():
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
     use_cuda = device.type == "cuda"
-    train_ds = ImagePathDataset(train_items, IMG_SIZE, transform=train_transform)
-    val_ds = ImagePathDataset(val_items, IMG_SIZE, transform=IDENTITY_TRANSFORM)
+    if args.shards_dir is not None:
+        train_ds = ShardDataset(args.shards_dir, "train", transform=train_transform)
+        val_ds = ShardDataset(args.shards_dir, "val")
+        if args.max_train_samples is not None and len(train_ds) > args.max_train_samples:
+            keep = list(range(len(train_ds)))
+            random.Random(42).shuffle(keep)
+            train_ds = torch.utils.data.Subset(train_ds, keep[: args.max_train_samples])
+        print(f"Using preprocessed shards from {args.shards_dir}", flush=True)
+    else:
+        train_ds = ImagePathDataset(train_items, IMG_SIZE, transform=train_transform)
+        val_ds = ImagePathDataset(val_items, IMG_SIZE, transform=IDENTITY_TRANSFORM)
+    # Distributed: each rank reads its own shard; per-process batch size stays args.batch_size
+    train_sampler = DistributedSampler(train_ds, shuffle=True, seed=args.seed) if args.distributed else None
     train_loader = DataLoader(
         train_ds,
         batch_size=args.batch_size,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=args.num_workers,
         pin_memory=use_cuda,
         persistent_workers=args.num_workers > 0,
@@ -162,52 +190,149 @@ def main():
         val_ds,
         batch_size=args.batch_size,
         shuffle=False,
+        sampler=ShardSampler(val_ds) if args.distributed else None,
         num_workers=args.num_workers,
         pin_memory=use_cuda,
         persistent_workers=args.num_workers > 0,
     )
 
+    # Seed weight init, dropout and shuffling so a run (and a resumed run) is reproducible
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
     model = get_model(num_classes=2).to(device)
+    train_model = prepare_model(
+        model, channels_last=args.channels_last, compile_model=args.compile, ddp=args.distributed
+    )
+    # DDP needs no wrapper to evaluate (metrics are all-reduced in evaluate instead)
+    eval_model = model if args.distributed else train_model
+    amp_dtype = torch.bfloat16 if args.precision == "bf16" else None
     criterion = nn.CrossEntropyLoss()
     optimizer = torch.optim.Adam(model.parameters(), lr=args.lr)
     scheduler = torch.optim.lr_scheduler.ReduceLROnPlateau(
         optimizer, mode="min", factor=0.5, patience=2
     )
 
-    mlflow.set_experiment(args.experiment_name)
-    with mlflow.start_run():
-        mlflow.log_params({
-            "epochs": args.epochs,
-            "batch_size": args.batch_size,
-            "lr": args.lr,
-        })
-        history = {"train_loss": [], "val_loss": [], "val_acc": []}
-        for epoch in range(args.epochs):
-            train_loss = train_epoch(model, train_loader, criterion, optimizer, device)
-            val_loss, val_acc, val_preds, val_labels = evaluate(
-                model, val_loader, device
+    stopper = EarlyStopping(patience=args.early_stopping_patience, mode="max", min_delta=args.min_delta)
+    history = {"train_loss": [], "val_loss": [], "val_acc": [], "images_per_sec": []}
+    start_epoch, run_id = 0, None
+    if args.resume:
+        resume_path = checkpoint_dir / LAST_CHECKPOINT if args.resume == "last" else Path(args.resume)
+        if resume_path.exists():
+            ckpt = load_checkpoint(resume_path, model, optimizer, scheduler, map_location=device)
+            start_epoch, run_id = ckpt["epoch"], ckpt.get("mlflow_run_id")
+            history = ckpt.get("history", history)
+            if "early_stopping" in ckpt:
+                stopper.load_state_dict(ckpt["early_stopping"])
+            print(f"Resumed from {resume_path} after epoch {start_epoch}", flush=True)
+        else:
+            print(f"No checkpoint at {resume_path}; starting from scratch", flush=True)
+    if start_epoch == 0 and main_process:
+        (checkpoint_dir / BEST_CHECKPOINT).unlink(missing_ok=True)  # from an earlier run
+
+    # Only rank 0 talks to MLflow and writes files
+    if main_process:
+        mlflow.set_experiment(args.experiment_name)
+    with mlflow.start_run(run_id=run_id) if main_process else contextlib.nullcontext() as run:
+        if main_process and run_id is None:
+            mlflow.log_params({
+                "epochs": args.epochs,
+                "batch_size": args.batch_size,
+                "lr": args.lr,
+                "augmentation": "per_sample" if args.per_sample_augment else "batch",
+                "precision": args.precision,
+                "channels_last": args.channels_last,
+                "grad_accum_steps": args.grad_accum_steps,
+                "effective_batch_size": args.batch_size * max(1, args.grad_accum_steps),
+                "compile": args.compile,
+                "early_stopping_patience": args.early_stopping_patience,
+                "world_size": int(os.environ.get("WORLD_SIZE", 1)) if args.distributed else 1,
+            })
+        val_metrics = None
+        rank_seed = int(os.environ.get("RANK", 0)) * 7_919 if args.distributed else 0
+        for epoch in range(start_epoch, args.epochs):
+            if train_sampler is not None:
+                train_sampler.set_epoch(epoch)
+            stats = reduce_epoch_stats(train_epoch(
+                train_model, train_loader, criterion, optimizer, device,
+                augment=batch_augment, seed=args.seed * 1_000_003 + epoch * len(train_loader) + rank_seed,
+                amp_dtype=amp_dtype, channels_last=args.channels_last,
+                accumulation_steps=args.grad_accum_steps,
+            ))
+            train_loss = stats["loss"]
+            # val metrics are identical on every rank, so scheduling and early stopping stay in step
+            val_loss, val_acc, val_metrics = evaluate(
+                eval_model, val_loader, device, amp_dtype=amp_dtype, channels_last=args.channels_last,
+                distributed=args.distributed, num_classes=len(CLASS_NAMES),
             )
+            val_auc = val_metrics.roc_auc()
             scheduler.step(val_loss)
             history["train_loss"].append(train_loss)
             history["val_loss"].append(val_loss)
-            history["val_acc"].append(val_acc)
-            mlflow.log_metrics(
-                {"train_loss": train_loss, "val_loss": val_loss, "val_acc": val_acc},
-                step=epoch,
-            )
+            history["val_acc"].append(float(val_acc))
+            history["images_per_sec"].append(stats["images_per_sec"])
+            if main_process:
+                mlflow.log_metrics(
+                    {
+                        "train_loss": train_loss,
+                        "val_loss": val_loss,
+                        "val_acc": val_acc,
+                        **({"val_roc_auc": val_auc} if val_auc is not None else {}),
+                        "val_ece": val_metrics.expected_calibration_error(),
+                        "train_images_per_sec": stats["images_per_sec"],
+                        "peak_memory_mb": stats["peak_memory_mb"],
+                    },
+                    step=epoch,
+                )
             print(
                 f"Epoch {epoch+1}/{args.epochs} train_loss={train_loss:.4f} "
-                f"val_loss={val_loss:.4f} val_acc={val_acc:.4f}",
+                f"val_loss={val_loss:.4f} val_acc={val_acc:.4f} "
+                f"({stats['images_per_sec']:.1f} img/s, peak {stats['peak_memory_mb']:.0f} MiB)",
                 flush=True,
             )
 
-        # Confusion matrix
-        from sklearn.metrics import confusion_matrix
-        cm = confusion_matrix(val_labels, val_preds)
-        mlflow.log_dict(
-            {"confusion_matrix": cm.tolist(), "labels": CLASS_NAMES},
-            "confusion_matrix.json",
-        )
+            if stopper.improved(val_acc) and main_process:
+                save_checkpoint(checkpoint_dir / BEST_CHECKPOINT, model, optimizer, scheduler, epoch + 1, val_acc=float(val_acc))
+            stop = stopper.step(val_acc, epoch)
+            if main_process and (stop or (epoch + 1) % max(1, args.checkpoint_every) == 0 or epoch + 1 == args.epochs):
+                save_checkpoint(
+                    checkpoint_dir / LAST_CHECKPOINT, model, optimizer, scheduler, epoch + 1,
+                    history=history, early_stopping=stopper.state_dict(), mlflow_run_id=run.info.run_id,
+                )
+            if stop:
+                print(
+                    f"Early stopping: val_acc has not improved for {stopper.bad_epochs} epochs "
+                    f"(best {stopper.best:.4f} at epoch {stopper.best_epoch + 1})",
+                    flush=True,
+                )
+                if main_process:
+                    mlflow.set_tag("early_stopped_epoch", epoch + 1)
+                break
+
+        if not main_process:
+            cleanup_distributed()
+            return
+        # Ship the best weights, not the last ones (rank 0 alone, over the full validation set)
+        if args.distributed:
+            val_loader = DataLoader(val_ds, batch_size=args.batch_size, num_workers=args.num_workers)
+        best_path = checkpoint_dir / BEST_CHECKPOINT
+        if best_path.exists():
+            best = load_checkpoint(best_path, model, map_location=device, restore_rng=False)
+            mlflow.log_metrics({"best_val_acc": best["val_acc"], "best_epoch": best["epoch"]})
+            if val_metrics is None or best["epoch"] != len(history["val_acc"]):
+                _, _, val_metrics = evaluate(
+                    eval_model, val_loader, device, amp_dtype=amp_dtype, channels_last=args.channels_last,
+                    num_classes=len(CLASS_NAMES),
+                )
+
+        # Confusion matrix and per-class metrics (of the saved model)
+        if val_metrics is not None:
+            report = val_metrics.compute(CLASS_NAMES)
+            mlflow.log_dict(
+                {"confusion_matrix": report["confusion_matrix"], "labels": CLASS_NAMES},
+                "confusion_matrix.json",
+            )
+            mlflow.log_dict(report, "val_metrics.json")
         # Log loss curve as artifact
         mlflow.log_dict(history, "history.json")
 
@@ -218,6 +343,7 @@ def main():
         mlflow.log_artifact(str(model_path))
 
     print(f"Model saved to {model_path}", flush=True)
+    cleanup_distributed()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+from .fetch import ChecksumMismatchError, fetch_artifact, sha256_file
+
+__all__ = ["ChecksumMismatchError", "fetch_artifact", "sha256_file"]
@@ -0,0 +1,153 @@
+"""
+Streaming, resumable artifact download into a content-addressed local cache.
+
+Cache layout under cache_dir:
+    sha256/<hex digest>      verified artifacts, named by content
+    partial/<key>.part       in-progress downloads (key: expected digest, or hash of the URL)
+    locks/<key>.lock         held while a process downloads key, so pods sharing the
+                             directory on one node fetch each artifact once
+
+The body is hashed while it streams to the .part file. An interrupted download resumes
+with an HTTP Range request from the bytes already on disk. Only a fully verified file is
+renamed into sha256/ and then (atomically) to dest, so a crash never leaves a truncated
+artifact at either path.
+"""
+import contextlib
+import hashlib
+import http.client
+import os
+import shutil
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Iterator, Optional, Union
+
+from src.config import ARTIFACT_CACHE_DIR, ARTIFACT_FETCH_TIMEOUT_S
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock; concurrent fetches of one key may race
+    fcntl = None
+
+CHUNK_SIZE = 1 << 20
+
+
+class ChecksumMismatchError(ValueError):
+    """Downloaded (or cached) bytes do not match the expected SHA-256."""
+
+
+def sha256_file(path: Union[str, Path], chunk_size: int = CHUNK_SIZE) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+@contextlib.contextmanager
+def _locked(lock_path: Path) -> Iterator[None]:
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _place(src: Path, dest: Path) -> None:
+    """Atomically make dest a copy of src (hard link when on the same filesystem)."""
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.tmp")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+def _download(url: str, part: Path, timeout: float, retries: int, backoff_s: float) -> str:
+    """Stream url into part (resuming from its current size); return the SHA-256 of the whole file."""
+    attempt = 0
+    while True:
+        h = hashlib.sha256()
+        offset = 0
+        if part.exists():
+            # Re-hash what a previous attempt (or process) already wrote, then ask for the rest
+            with open(part, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    offset += len(chunk)
+        request = urllib.request.Request(url, headers={"Range": f"bytes={offset}-"} if offset else {})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as resp:
+                if offset and resp.status != 206:
+                    # Server ignored the Range header: start over
+                    h, offset = hashlib.sha256(), 0
+                length = resp.headers.get("Content-Length")
+                received = 0
+                with open(part, "ab" if offset else "wb") as out:
+                    for chunk in iter(lambda: resp.read(CHUNK_SIZE), b""):
+                        out.write(chunk)
+                        h.update(chunk)
+                        received += len(chunk)
+                    out.flush()
+                    os.fsync(out.fileno())
+                # read(amt) returns b"" when the peer closes early instead of raising
+                if length is not None and received < int(length):
+                    raise http.client.IncompleteRead(b"", int(length) - received)
+            return h.hexdigest()
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                return h.hexdigest()  # nothing left to fetch: the part file is already complete
+            if e.code < 500 or attempt >= retries:
+                raise
+        except (urllib.error.URLError, http.client.HTTPException, OSError):
+            # Includes timeouts and connections closed mid-body (IncompleteRead); resume next attempt
+            if attempt >= retries:
+                raise
+        attempt += 1
+        time.sleep(backoff_s * 2 ** (attempt - 1))
+
+
+def fetch_artifact(
+    url: str,
+    sha256: Optional[str] = None,
+    dest: Optional[Union[str, Path]] = None,
+    cache_dir: Union[str, Path] = ARTIFACT_CACHE_DIR,
+    timeout: float = ARTIFACT_FETCH_TIMEOUT_S,
+    retries: int = 3,
+    backoff_s: float = 0.5,
+) -> Path:
+    """
+    Return a local path holding the artifact at url, downloading it only if the cache lacks it.
+
+    With sha256, a cached copy is used without any network access and a download whose digest
+    differs raises ChecksumMismatchError (the partial file is discarded). Without it the
+    artifact is still cached by its digest, but every call downloads again. If dest is given
+    the verified file is also placed there atomically and dest is returned. timeout applies
+    to connecting and to each read; transient failures are retried (resuming) with backoff.
+    """
+    cache_dir = Path(cache_dir)
+    expected = sha256.lower() if sha256 else None
+    key = expected or hashlib.sha256(url.encode()).hexdigest()
+    with _locked(cache_dir / "locks" / f"{key}.lock"):
+        cached = cache_dir / "sha256" / expected if expected else None
+        if cached is None or not cached.exists():
+            part = cache_dir / "partial" / f"{key}.part"
+            part.parent.mkdir(parents=True, exist_ok=True)
+            digest = _download(url, part, timeout, retries, backoff_s)
+            if expected and digest != expected:
+                part.unlink(missing_ok=True)
+                raise ChecksumMismatchError(f"SHA-256 mismatch for {url}: expected {expected}, got {digest}")
+            cached = cache_dir / "sha256" / digest
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(part, cached)
+    if dest is None:
+        return cached
+    dest = Path(dest)
+    _place(cached, dest)
+    return dest
@@ -1,4 +1,5 @@
 """Configuration and constants for the project."""
+import os
 from pathlib import Path
 
 # Paths
@@ -12,16 +13,78 @@ IMG_SIZE = (224, 224)
 IMG_SHAPE = (224, 224, 3)
 NUM_CLASSES = 2
 CLASS_NAMES = ["cat", "dog"]
+# Image decoding: formats accepted (sniffed from the header, not the file name), max declared
+# width x height, and max estimated decode memory (JPEGs count at their draft-mode size);
+# larger images are rejected before any pixel data is decoded
+IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "BMP", "WEBP")
+MAX_IMAGE_PIXELS = 64_000_000
+MAX_DECODE_BYTES = 96 * 1024 * 1024
 
 # Train/val/test split
 TRAIN_RATIO = 0.8
 VAL_RATIO = 0.1
 TEST_RATIO = 0.1
 
+# Dataset validation: dHash Hamming distance (of 64 bits) at or below which two images are near-duplicates
+NEAR_DUPLICATE_MAX_DISTANCE = 4
+
 # Training defaults (fewer epochs for faster runs; use --epochs 12 for full training)
 DEFAULT_EPOCHS = 3
 DEFAULT_BATCH_SIZE = 64  # larger = fewer steps/epoch = faster (if memory allows)
 DEFAULT_LEARNING_RATE = 1e-3
+# Batches whose gradients are summed before each optimizer step (effective batch = batch size x steps)
+DEFAULT_GRAD_ACCUM_STEPS = 1
+# Stop when val_acc has not improved for this many epochs (0 disables early stopping)
+DEFAULT_EARLY_STOPPING_PATIENCE = 3
+
+# API micro-batching: concurrent /predict calls are grouped into one forward pass
+BATCH_MAX_SIZE = 16
+BATCH_MAX_WAIT_MS = 5.0
+
+# API inference pipeline: decode thread pool, torch intra-op threads for the forward-pass
+# worker, and the number of in-flight predictions admitted before returning 429
+DECODE_WORKERS = 2
+INFERENCE_NUM_THREADS = max(1, (os.cpu_count() or 2) // 2)
+MAX_PENDING_REQUESTS = 64
+# /predict/batch: max images per request; forward passes are chunked to this many images
+MAX_BATCH_FILES = 256
+# Upload limits enforced while the request body streams in: bytes per image file (/predict and
+# each file or archive member of a batch) and bytes per /predict/batch or /jobs request body
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_REQUEST_BYTES = 128 * 1024 * 1024
+INFERENCE_CHUNK_SIZE = 32
+# Offline batch scoring (scripts/score_batch.py): images per forward pass
+SCORING_BATCH_SIZE = 256
+# Test-time augmentation: default view set for /predict and /predict/batch ("none" = single
+# squashed view), how view probabilities are combined, the shorter side (px) images are resized
+# to before the five 224 crops, and the extra shorter-side scales of "multiscale"
+TTA_MODE = "none"
+TTA_AGGREGATION = "mean"
+TTA_CROP_RESIZE = 256
+TTA_SCALES = (256, 320)
+# Prediction cache keyed by upload content hash + checkpoint fingerprint (size 0 disables; TTL 0 = no expiry)
+PREDICTION_CACHE_SIZE = 4096
+PREDICTION_CACHE_TTL_S = 0.0
+# Model registry: versions kept resident for hot swap, A/B and shadow traffic
+MAX_MODEL_VERSIONS = 2
+# Batch sizes run through each model version before it takes traffic (single, micro-batch, /predict/batch chunk)
+WARMUP_BATCH_SIZES = (1, BATCH_MAX_SIZE, INFERENCE_CHUNK_SIZE)
+
+# Asynchronous prediction jobs (/jobs): SQLite queue shared by the API processes on a host, jobs
+# run concurrently per process, images per forward-pass request, lease after which a job whose
+# process died is picked up again, how long finished jobs and their results are kept, and the
+# max images per job
+JOB_DB_PATH = PROJECT_ROOT / ".cache" / "jobs.sqlite"
+JOB_WORKERS = 2
+JOB_CHUNK_SIZE = INFERENCE_CHUNK_SIZE
+JOB_LEASE_S = 60.0
+JOB_RETENTION_S = 24 * 3600.0
+MAX_JOB_FILES = 4096
 
 # Model artifact
 DEFAULT_MODEL_FILENAME = "model.pt"
+# Remote model fetch (MODEL_URL): expected SHA-256 (empty = not verified), content-addressed
+# cache shared by processes/pods on the same host, and per-read network timeout
+MODEL_SHA256 = ""
+ARTIFACT_CACHE_DIR = PROJECT_ROOT / ".cache" / "artifacts"
+ARTIFACT_FETCH_TIMEOUT_S = 30.0
@@ -1,11 +1,34 @@
+from .decode import ImageTooLargeError, decode_image, decode_resized, open_image, probe_image, to_chw_float32
+from .datasets import ImagePathDataset
+from .index import DatasetIndex, scan_images, split_for
+from .validate import check_image, dhash, near_duplicate_pairs, validate_index
+from .shards import ShardDataset, write_shards
 from .preprocess import (
     load_and_resize_image,
     get_train_val_test_splits,
+    load_quarantine,
     normalize_for_model,
 )
 
 __all__ = [
     "load_and_resize_image",
     "get_train_val_test_splits",
+    "load_quarantine",
     "normalize_for_model",
+    "decode_image",
+    "decode_resized",
+    "to_chw_float32",
+    "open_image",
+    "probe_image",
+    "ImageTooLargeError",
+    "ImagePathDataset",
+    "ShardDataset",
+    "DatasetIndex",
+    "scan_images",
+    "split_for",
+    "check_image",
+    "dhash",
+    "near_duplicate_pairs",
+    "validate_index",
+    "write_shards",
 ]
@@ -0,0 +1,26 @@
+"""PyTorch datasets over the split metadata written by prepare_data.py."""
+from typing import Callable, Optional, Tuple
+
+import torch
+from torch.utils.data import Dataset
+
+from .decode import decode_image
+
+
+class ImagePathDataset(Dataset):
+    """Decode images listed as {"path": ..., "label": ...} through the shared preprocessing path."""
+
+    def __init__(self, items, target_size: Tuple[int, int] = (224, 224), transform: Optional[Callable] = None):
+        self.items = items  # list of {"path": ..., "label": ...}
+        self.target_size = target_size
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.items)
+
+    def __getitem__(self, idx):
+        item = self.items[idx]
+        # Augmentation runs on the uint8 PIL image; one conversion to float32 CHW afterwards
+        x = torch.from_numpy(decode_image(item["path"], self.target_size, transform=self.transform))
+        y = torch.tensor(item["label"], dtype=torch.long)
+        return x, y
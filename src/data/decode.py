@@ -0,0 +1,165 @@
+"""
+Shared image preprocessing for the API, CLI inference and training.
+
+Every entry point decodes to a uint8 RGB image at the model size (JPEG draft-mode
+downscaling), optionally augments it while still uint8, and converts exactly once
+into a contiguous float32 CHW array in [0, 1].
+
+Images are checked from their header before any pixel data is decoded: the format is sniffed
+from the leading bytes (IMAGE_FORMATS only), and the declared width x height and the memory the
+decode would need are capped, so decompression bombs fail cheaply instead of exhausting memory.
+"""
+import io
+import time
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from src.config import IMAGE_FORMATS, MAX_DECODE_BYTES, MAX_IMAGE_PIXELS
+
+ImageSource = Union[str, Path, bytes, BinaryIO]
+
+
+class ImageTooLargeError(ValueError):
+    """The image header declares more pixels, or a larger decode, than the configured limits."""
+
+
+def open_image(source: ImageSource, max_pixels: int = MAX_IMAGE_PIXELS) -> Image.Image:
+    """
+    Open source lazily (header only). Raises ValueError unless it is one of IMAGE_FORMATS and
+    ImageTooLargeError if its width x height exceeds max_pixels. Use as a context manager: that
+    closes a file opened from a path but not a file object passed in.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif isinstance(source, (str, Path)) and not Path(source).exists():
+        raise FileNotFoundError(f"Image not found: {source}")
+    try:
+        img = Image.open(source, formats=IMAGE_FORMATS)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    except UnidentifiedImageError as e:
+        raise ValueError(f"Not a supported image (expected {', '.join(IMAGE_FORMATS)})") from e
+    w, h = img.size
+    if w * h > max_pixels:
+        with img:  # closes a file opened from a path, not a caller's file object
+            raise ImageTooLargeError(f"{w}x{h} image exceeds {max_pixels} pixels")
+    return img
+
+
+def _draft_scale(size: Tuple[int, int], draft_size: Tuple[int, int]) -> int:
+    """Reduction libjpeg draft mode picks: the largest of 8, 4, 2 that keeps size >= draft_size, else 1."""
+    scale = min(size[0] // max(1, draft_size[0]), size[1] // max(1, draft_size[1]))
+    return next((s for s in (8, 4, 2) if scale >= s), 1)
+
+
+def decoded_bytes(img: Image.Image, draft_size: Optional[Tuple[int, int]] = None) -> int:
+    """
+    Estimated peak memory of decoding an opened image to RGB, JPEGs in draft mode for draft_size:
+    PIL holds RGB at 4 bytes per pixel, and converting from another mode keeps both copies.
+    """
+    w, h = img.size
+    if img.format == "JPEG" and draft_size is not None:
+        s = _draft_scale(img.size, draft_size)
+        w, h = -(-w // s), -(-h // s)
+    return w * h * (4 if img.mode == "RGB" else 8)
+
+
+def check_decode_size(
+    img: Image.Image, draft_size: Optional[Tuple[int, int]] = None, max_bytes: int = MAX_DECODE_BYTES
+) -> None:
+    """Raise ImageTooLargeError if decoding img (see decoded_bytes) would need more than max_bytes."""
+    need = decoded_bytes(img, draft_size)
+    if need > max_bytes:
+        raise ImageTooLargeError(
+            f"decoding a {img.size[0]}x{img.size[1]} {img.format} needs ~{need >> 20} MiB "
+            f"(limit {max_bytes >> 20} MiB)"
+        )
+
+
+def probe_image(
+    source: ImageSource, draft_size: Tuple[int, int] = (224, 224)
+) -> Tuple[str, Tuple[int, int], int]:
+    """
+    Apply decode_resized's header checks without decoding any pixels; return (format,
+    (width, height), estimated decode bytes). A file object is left at its original position.
+    """
+    pos = source.tell() if hasattr(source, "seek") else None
+    try:
+        with open_image(source) as img:
+            check_decode_size(img, draft_size)
+            return img.format, img.size, decoded_bytes(img, draft_size)
+    finally:
+        if pos is not None:
+            source.seek(pos)
+
+
+def decode_resized(
+    source: ImageSource,
+    target_size: Tuple[int, int] = (224, 224),
+    timings: Optional[Dict[str, float]] = None,
+) -> Image.Image:
+    """
+    Open an image and return it as RGB resized to target_size (width, height).
+
+    For JPEGs, draft mode asks libjpeg for a reduced-DCT decode (scale 1/2, 1/4 or 1/8)
+    that is still at least target_size, so a 12 MP photo is decoded at ~0.2 MP instead
+    of full resolution before the final BILINEAR resize.
+    Raises ValueError (ImageTooLargeError over the size limits) before decoding anything if the
+    header is not an accepted image. If timings is given, "decode" and "resize" durations (ms)
+    are recorded in it.
+    """
+    t0 = time.perf_counter()
+    with open_image(source) as opened:
+        check_decode_size(opened, target_size)
+        if opened.format == "JPEG":
+            opened.draft("RGB", target_size)
+        img = opened.convert("RGB")
+    t1 = time.perf_counter()
+    if img.size != tuple(target_size):
+        img = img.resize(target_size, Image.Resampling.BILINEAR)
+    if timings is not None:
+        timings["decode"] = (t1 - t0) * 1000
+        timings["resize"] = (time.perf_counter() - t1) * 1000
+    return img
+
+
+def to_chw_float32(img: Union[Image.Image, np.ndarray], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Convert RGB uint8 pixels to float32 channels-first in [0, 1] with a single vectorized pass.
+    Accepts a PIL image or HWC array (-> (3, H, W)) or a NHWC batch (-> (N, 3, H, W)).
+    Writes into out (float32, matching shape) when given, e.g. one slot of a batch buffer.
+    """
+    arr = np.asarray(img)
+    axes = (2, 0, 1) if arr.ndim == 3 else (0, 3, 1, 2)
+    shape = tuple(arr.shape[a] for a in axes)
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    elif out.shape != shape or out.dtype != np.float32:
+        raise ValueError(f"out must be float32 with shape {shape}; got {out.dtype} {out.shape}")
+    np.divide(arr.transpose(axes), np.float32(255.0), out=out, dtype=np.float32)
+    return out
+
+
+def decode_image(
+    source: ImageSource,
+    target_size: Tuple[int, int] = (224, 224),
+    out: Optional[np.ndarray] = None,
+    transform: Optional[Callable[[Image.Image], Image.Image]] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> np.ndarray:
+    """
+    Decode (draft mode for JPEG), resize, apply an optional uint8 PIL transform (e.g. training
+    augmentation) and return float32 CHW in [0, 1], optionally written into out.
+    If timings is given, "decode", "resize" and "tensor_build" durations (ms) are recorded in it.
+    """
+    img = decode_resized(source, target_size, timings=timings)
+    if transform is not None:
+        img = transform(img)
+    t0 = time.perf_counter()
+    arr = to_chw_float32(img, out=out)
+    if timings is not None:
+        timings["tensor_build"] = (time.perf_counter() - t0) * 1000
+    return arr
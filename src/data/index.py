@@ -0,0 +1,188 @@
+"""
+Incremental dataset index: one SQLite table of every image's size, mtime and SHA-256
+(plus cached validation results per content digest, see validate.py).
+
+update() scans the class directories in parallel, stats every file and hashes only the
+ones that are new or whose size/mtime changed since the last run; removed files are
+dropped. Paths are stored relative to the data directory, so the index survives the
+dataset being mounted elsewhere.
+
+Splits are assigned by hashing each image's content digest (with the seed) into [0, 1)
+and cutting at the split ratios, so an image's split never depends on which other images
+exist: adding files does not move existing ones, and identical files always land in the
+same split (no train/test leakage through exact duplicates).
+"""
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from src.artifacts import sha256_file
+
+from .preprocess import _CAT_NAMES, _DOG_NAMES, _class_dirs, _list_images
+
+INDEX_FILENAME = "index.sqlite"
+SPLITS = ("train", "val", "test")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path     TEXT PRIMARY KEY,
+    label    INTEGER NOT NULL,
+    size     INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checks (
+    sha256 TEXT PRIMARY KEY,
+    ok     INTEGER NOT NULL,
+    error  TEXT,
+    dhash  TEXT
+)
+"""
+
+
+def _default_workers() -> int:
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def split_for(digest: str, train_ratio: float, val_ratio: float, seed: int = 42) -> str:
+    """Deterministic split for one content digest."""
+    u = int.from_bytes(hashlib.sha256(f"{seed}:{digest}".encode()).digest()[:8], "big") / 2**64
+    if u < train_ratio:
+        return "train"
+    if u < train_ratio + val_ratio:
+        return "val"
+    return "test"
+
+
+def scan_images(data_dir: Union[str, Path], workers: Optional[int] = None) -> List[Tuple[Path, int]]:
+    """
+    (path, label) for every image, using the same folder names and layouts as
+    get_train_val_test_splits; all candidate directories are listed concurrently.
+    """
+    data_dir = Path(data_dir)
+    classes = [(_CAT_NAMES, 0), (_DOG_NAMES, 1)]
+    candidates = [_class_dirs(data_dir, names) for names, _ in classes]
+    with ThreadPoolExecutor(max_workers=workers or _default_workers()) as pool:
+        listings = [list(pool.map(_list_images, dirs)) for dirs in candidates]
+    out = []
+    for (_, label), found in zip(classes, listings):
+        first = next((paths for paths in found if paths), [])
+        out.extend((p, label) for p in sorted(first))
+    return out
+
+
+class DatasetIndex:
+    """SQLite-backed index of a raw image directory (see module docstring)."""
+
+    def __init__(self, db_path: Union[str, Path], data_dir: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.data_dir = Path(data_dir)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path))
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "DatasetIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def update(self, workers: Optional[int] = None) -> Dict[str, int]:
+        """
+        Bring the index in line with data_dir. Returns counts of added, changed, removed
+        and unchanged files; only added and changed files are read and hashed.
+        """
+        workers = workers or _default_workers()
+        known = {
+            row[0]: row[1:]
+            for row in self._conn.execute("SELECT path, label, size, mtime_ns FROM files")
+        }
+        stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        todo = []  # (rel, label, size, mtime_ns, absolute path)
+        for path, label in scan_images(self.data_dir, workers):
+            rel = path.relative_to(self.data_dir).as_posix()
+            if rel in seen:
+                continue
+            seen.add(rel)
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue  # deleted between listing and stat
+            prev = known.get(rel)
+            if prev == (label, st.st_size, st.st_mtime_ns):
+                stats["unchanged"] += 1
+                continue
+            stats["added" if prev is None else "changed"] += 1
+            todo.append((rel, label, st.st_size, st.st_mtime_ns, path))
+
+        removed = [(rel,) for rel in known if rel not in seen]
+        stats["removed"] = len(removed)
+        # hashlib releases the GIL while hashing, so threads scale on file reads and digests
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            digests = list(pool.map(lambda t: sha256_file(t[4]), todo))
+        with self._conn:
+            self._conn.executemany("DELETE FROM files WHERE path = ?", removed)
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (path, label, size, mtime_ns, sha256) VALUES (?, ?, ?, ?, ?)",
+                [(rel, label, size, mtime, digest) for (rel, label, size, mtime, _), digest in zip(todo, digests)],
+            )
+        return stats
+
+    def records(self) -> List[Tuple[str, int, str]]:
+        """(path under data_dir, label, sha256) for every indexed image, sorted by path."""
+        rows = self._conn.execute("SELECT path, label, sha256 FROM files ORDER BY path")
+        return [(str(self.data_dir / rel), label, digest) for rel, label, digest in rows]
+
+    def unchecked(self) -> List[Tuple[str, str]]:
+        """(sha256, one path with that content) for every digest without a validation result."""
+        rows = self._conn.execute(
+            "SELECT f.sha256, MIN(f.path) FROM files f LEFT JOIN checks c ON c.sha256 = f.sha256 "
+            "WHERE c.sha256 IS NULL GROUP BY f.sha256"
+        )
+        return [(digest, str(self.data_dir / rel)) for digest, rel in rows]
+
+    def record_checks(self, rows: List[Tuple[str, bool, Optional[str], Optional[str]]]) -> None:
+        """Store (sha256, ok, error, dhash hex) results; they stay valid while the content does."""
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO checks (sha256, ok, error, dhash) VALUES (?, ?, ?, ?)",
+                [(digest, int(ok), error, dhash) for digest, ok, error, dhash in rows],
+            )
+
+    def checks(self) -> Dict[str, Tuple[bool, Optional[str], Optional[str]]]:
+        """sha256 -> (ok, error, dhash hex) for every validated digest."""
+        rows = self._conn.execute("SELECT sha256, ok, error, dhash FROM checks")
+        return {digest: (bool(ok), error, dhash) for digest, ok, error, dhash in rows}
+
+    def splits(
+        self,
+        train_ratio: float = 0.8,
+        val_ratio: float = 0.1,
+        test_ratio: float = 0.1,
+        seed: int = 42,
+        exclude: Iterable[str] = (),
+    ) -> Tuple[list, list, list]:
+        """
+        (train, val, test), each a list of (path, label), assigned by content hash.
+        Paths in exclude (e.g. a quarantine list) are left out.
+        """
+        if abs(train_ratio + val_ratio + test_ratio - 1.0) > 1e-6:
+            raise ValueError("Splits must sum to 1.0")
+        skip = {os.path.abspath(p) for p in exclude}
+        out = {name: [] for name in SPLITS}
+        for path, label, digest in self.records():
+            if skip and os.path.abspath(path) in skip:
+                continue
+            out[split_for(digest, train_ratio, val_ratio, seed)].append((path, label))
+        return out["train"], out["val"], out["test"]
@@ -1,10 +1,12 @@
 """Data preprocessing: load, resize to 224x224 RGB, split, and augment."""
+import json
 import os
 from pathlib import Path
-from typing import Tuple, Union
+from typing import Iterable, Set, Tuple, Union
 
 import numpy as np
-from PIL import Image
+
+from .decode import decode_resized
 
 
 def load_and_resize_image(
@@ -12,16 +14,11 @@ def load_and_resize_image(
     target_size: Tuple[int, int] = (224, 224),
 ) -> np.ndarray:
     """
-    Load an image from path and resize to target_size as RGB.
+    Load an image from path and resize to target_size as RGB (JPEGs use draft-mode decoding).
     Returns numpy array of shape (H, W, 3) with values in [0, 1].
     """
-    path = Path(image_path)
-    if not path.exists():
-        raise FileNotFoundError(f"Image not found: {path}")
-    img = Image.open(path)
-    img = img.convert("RGB")
-    img = img.resize(target_size, Image.Resampling.BILINEAR)
-    arr = np.array(img, dtype=np.float32) / 255.0
+    img = decode_resized(Path(image_path), target_size)
+    arr = np.asarray(img, dtype=np.float32) / 255.0
     return arr
 
 
@@ -30,24 +27,46 @@ _CAT_NAMES = ("cats", "cat", "Cats", "Cat", "CAT")
 _DOG_NAMES = ("dogs", "dog", "Dogs", "Dog", "DOG")
 
 
+# Sub-layouts tried in order; the first one holding images for a class wins
+_LAYOUTS = ("train", "Train", "training_set", "training_set/training_set", "valid", "test", "PetImages", "")
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png"})
+
+
+def _class_dirs(data_dir: Path, class_folders: tuple) -> list:
+    """Candidate directories for one class, in the order they are tried."""
+    data_dir = Path(data_dir)
+    return [data_dir / sub / name if sub else data_dir / name for name in class_folders for sub in _LAYOUTS]
+
+
+def _list_images(d: Path) -> list:
+    """Image files directly inside d (one directory read instead of a glob per extension)."""
+    try:
+        with os.scandir(d) as it:
+            return [Path(e.path) for e in it if os.path.splitext(e.name)[1].lower() in IMAGE_EXTENSIONS and e.is_file()]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
 def _collect_class_images(data_dir: Path, class_folders: tuple, label: int) -> list:
     """Collect (path, label) for one class, trying multiple folder names and layouts."""
-    data_dir = Path(data_dir)
-    out = []
-    for class_name in class_folders:
-        for sub in ["train", "Train", "training_set", "training_set/training_set", "valid", "test", "PetImages", ""]:
-            if sub:
-                d = data_dir / sub / class_name
-            else:
-                d = data_dir / class_name
-            if not d.exists():
-                continue
-            for ext in ("*.jpg", "*.jpeg", "*.png", "*.JPG", "*.JPEG", "*.PNG"):
-                for p in d.glob(ext):
-                    out.append((str(p), label))
-            if out:
-                return out
-    return out
+    for d in _class_dirs(data_dir, class_folders):
+        found = _list_images(d)
+        if found:
+            return [(str(p), label) for p in sorted(found)]
+    return []
+
+
+def load_quarantine(quarantine: Union[str, Path, Iterable[str], None]) -> Set[str]:
+    """
+    Absolute paths to leave out of training. Accepts a quarantine.json written by the
+    validation stage ({"files": [{"path", "reason"}, ...]}), an iterable of paths, or None.
+    """
+    if quarantine is None:
+        return set()
+    if isinstance(quarantine, (str, Path)):
+        with open(quarantine) as f:
+            quarantine = [entry["path"] for entry in json.load(f)["files"]]
+    return {os.path.abspath(p) for p in quarantine}
 
 
 def get_train_val_test_splits(
@@ -56,11 +75,13 @@ def get_train_val_test_splits(
     val_ratio: float = 0.1,
     test_ratio: float = 0.1,
     seed: int = 42,
+    quarantine: Union[str, Path, Iterable[str], None] = None,
 ) -> Tuple[list, list, list]:
     """
     Split image paths into train/val/test by class.
     Supports: data/raw/train/cats, data/raw/train/dogs; data/raw/cats, data/raw/dogs;
     data/raw/training_set/cats; data/raw/cat, data/raw/dog (singular); etc.
+    Files listed in quarantine (see load_quarantine) are skipped.
     Returns (train_paths, val_paths, test_paths) each as list of (path, label).
     """
     if abs(train_ratio + val_ratio + test_ratio - 1.0) > 1e-6:
@@ -70,6 +91,9 @@ def get_train_val_test_splits(
     samples = []
     samples.extend(_collect_class_images(data_dir, _CAT_NAMES, 0))
     samples.extend(_collect_class_images(data_dir, _DOG_NAMES, 1))
+    skip = load_quarantine(quarantine)
+    if skip:
+        samples = [s for s in samples if os.path.abspath(s[0]) not in skip]
     rng.shuffle(samples)
     n = len(samples)
     n_train = int(n * train_ratio)
@@ -0,0 +1,140 @@
+"""
+Preprocessed dataset cache: resized uint8 images in memory-mapped .npy shards.
+
+Layout of a shards directory:
+    index.json                  image size, and per split: shard files, counts, labels file
+    {split}-{k:05d}.npy         uint8 array (n, H, W, 3), loaded with mmap_mode="r"
+    {split}-labels.npy          int64 labels; -1 marks an image that failed to decode
+
+Decoding happens once when the shards are written; epochs then read pixels straight
+from the page cache, which DataLoader workers share.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+
+from .decode import decode_resized, to_chw_float32
+
+INDEX_FILENAME = "index.json"
+
+
+def _decode_into(args) -> bool:
+    path, target_size, out = args
+    try:
+        out[...] = np.asarray(decode_resized(path, target_size))
+        return True
+    except Exception:
+        return False
+
+
+def write_split_shards(
+    items: List[dict],
+    out_dir: Path,
+    split: str,
+    target_size: Tuple[int, int] = (224, 224),
+    shard_size: int = 1024,
+    workers: int = 4,
+) -> dict:
+    """
+    Decode items ({"path", "label"}) into uint8 shards for one split. Returns its index entry.
+    Images that fail to decode are kept as zeros with label -1 so offsets stay aligned with items.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    w, h = target_size
+    labels = np.array([it["label"] for it in items], dtype=np.int64)
+    shards = []
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for k, start in enumerate(range(0, len(items), shard_size)):
+            chunk = items[start : start + shard_size]
+            name = f"{split}-{k:05d}.npy"
+            arr = np.lib.format.open_memmap(out_dir / name, mode="w+", dtype=np.uint8, shape=(len(chunk), h, w, 3))
+            ok = pool.map(_decode_into, [(it["path"], target_size, arr[i]) for i, it in enumerate(chunk)])
+            for i, good in enumerate(ok):
+                if not good:
+                    labels[start + i] = -1
+            arr.flush()
+            del arr
+            shards.append({"file": name, "count": len(chunk)})
+    labels_name = f"{split}-labels.npy"
+    np.save(out_dir / labels_name, labels)
+    return {
+        "count": len(items),
+        "failed": int((labels < 0).sum()),
+        "labels": labels_name,
+        "shards": shards,
+        "paths": [it["path"] for it in items],
+    }
+
+
+def write_shards(
+    splits: Dict[str, List[dict]],
+    out_dir: Path,
+    target_size: Tuple[int, int] = (224, 224),
+    shard_size: int = 1024,
+    workers: int = 4,
+) -> dict:
+    """Write shards for every split in splits (as loaded from splits.json) plus index.json."""
+    out_dir = Path(out_dir)
+    index = {"image_size": list(target_size), "splits": {}}
+    for split, items in splits.items():
+        index["splits"][split] = write_split_shards(items, out_dir, split, target_size, shard_size, workers)
+    with open(out_dir / INDEX_FILENAME, "w") as f:
+        json.dump(index, f)
+    return index
+
+
+class ShardDataset(Dataset):
+    """
+    Serve (x, y) samples from memory-mapped shards written by write_shards.
+
+    Shards are opened lazily in each process (after DataLoader workers fork), so the
+    pages are shared through the OS page cache rather than copied into each worker.
+    Without a transform, pixels go straight from the mmap into one float32 conversion.
+    """
+
+    def __init__(self, shards_dir: Path, split: str, transform: Optional[Callable] = None):
+        self.shards_dir = Path(shards_dir)
+        with open(self.shards_dir / INDEX_FILENAME) as f:
+            index = json.load(f)
+        if split not in index["splits"]:
+            raise KeyError(f"Split {split!r} not in {self.shards_dir / INDEX_FILENAME}")
+        entry = index["splits"][split]
+        self.split = split
+        self.transform = transform
+        self._files = [s["file"] for s in entry["shards"]]
+        counts = [s["count"] for s in entry["shards"]]
+        self._starts = np.cumsum([0] + counts[:-1]).astype(np.int64)
+        labels = np.load(self.shards_dir / entry["labels"])
+        self._valid = np.flatnonzero(labels >= 0)
+        self.labels = labels[self._valid]
+        self._shards = None
+
+    def __len__(self):
+        return len(self._valid)
+
+    def _open(self):
+        self._shards = [np.load(self.shards_dir / f, mmap_mode="r") for f in self._files]
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = None  # reopen in the worker instead of pickling mapped data
+        return state
+
+    def __getitem__(self, idx):
+        if self._shards is None:
+            self._open()
+        gidx = self._valid[idx]
+        k = int(np.searchsorted(self._starts, gidx, side="right") - 1)
+        img = self._shards[k][gidx - self._starts[k]]  # (H, W, 3) uint8 view on the mmap
+        if self.transform is not None:
+            img = self.transform(Image.fromarray(img))
+        x = torch.from_numpy(to_chw_float32(img))
+        y = torch.tensor(int(self.labels[idx]), dtype=torch.long)
+        return x, y
@@ -0,0 +1,145 @@
+"""
+Dataset validation: find undecodable files, exact duplicates and near-duplicates.
+
+Every distinct content digest in a DatasetIndex is fully decoded once in a process pool
+(truncated JPEGs and zero-byte files fail here instead of inside a DataLoader worker);
+results are cached in the index, so re-runs only check new content. Exact duplicates
+share a SHA-256; near-duplicates (re-encodes, resizes) have 64-bit difference hashes
+(dHash) within max_distance bits. One file of each duplicate group is kept and the rest
+are quarantined, so no image can appear in both train and test.
+"""
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from src.config import NEAR_DUPLICATE_MAX_DISTANCE
+
+from .index import DatasetIndex
+
+QUARANTINE_FILENAME = "quarantine.json"
+
+_HASH_SIZE = 8  # 8x8 comparisons -> 64-bit dHash
+
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel is brighter than its right neighbour on a 9x8 thumbnail."""
+    small = np.asarray(img.convert("L").resize((_HASH_SIZE + 1, _HASH_SIZE), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def check_image(path: Union[str, Path]) -> Tuple[bool, Optional[str], Optional[str]]:
+    """Decode path completely; return (ok, error, dhash as 16 hex digits)."""
+    try:
+        with Image.open(path) as img:
+            if img.format == "JPEG":
+                img.draft("L", (64, 64))  # reduced-DCT decode still reads (and checks) every block
+            img.load()
+            return True, None, f"{dhash(img):016x}"
+    except Exception as e:  # UnidentifiedImageError, truncated data, decompression bombs, ...
+        return False, f"{type(e).__name__}: {e}", None
+
+
+def _check(item: Tuple[str, str]) -> Tuple[str, bool, Optional[str], Optional[str]]:
+    digest, path = item
+    return (digest,) + check_image(path)
+
+
+def near_duplicate_pairs(hashes: Dict[str, int], max_distance: int) -> List[Tuple[str, str]]:
+    """
+    Pairs of keys whose hashes differ in at most max_distance bits.
+
+    The 64 bits are cut into max_distance + 1 bands; by pigeonhole two hashes that close
+    agree exactly on at least one band, so only keys sharing a band value are compared.
+    """
+    if max_distance < 0 or not hashes:
+        return []
+    n_bands = min(max_distance + 1, 64)
+    bounds = [64 * b // n_bands for b in range(n_bands + 1)]
+    buckets: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+    for key, h in hashes.items():
+        for b in range(n_bands):
+            lo, hi = bounds[b], bounds[b + 1]
+            buckets[(b, (h >> lo) & ((1 << (hi - lo)) - 1))].append(key)
+    pairs = set()
+    for keys in buckets.values():
+        for i, a in enumerate(keys):
+            for c in keys[i + 1 :]:
+                pair = (a, c) if a < c else (c, a)
+                if pair not in pairs and bin(hashes[a] ^ hashes[c]).count("1") <= max_distance:
+                    pairs.add(pair)
+    return sorted(pairs)
+
+
+def validate_index(
+    index: DatasetIndex,
+    workers: Optional[int] = None,
+    max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE,
+) -> dict:
+    """
+    Check every new digest in index, then group duplicates. Returns a report with counts and
+    "quarantine": [{"path", "reason"}] (corrupt files, and all but the first path of each
+    exact or near-duplicate group, first by path order). max_distance < 0 disables
+    near-duplicate detection.
+    """
+    pending = index.unchecked()
+    if pending:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_check, pending, chunksize=max(1, len(pending) // (workers * 8))))
+        index.record_checks(results)
+    checks = index.checks()
+
+    quarantine = []
+    corrupt = 0
+    by_digest: Dict[str, List[str]] = defaultdict(list)
+    for path, _, digest in index.records():
+        ok, error, _ = checks[digest]
+        if not ok:
+            quarantine.append({"path": path, "reason": f"corrupt: {error}"})
+            corrupt += 1
+        else:
+            by_digest[digest].append(path)
+    exact = 0
+    for paths in by_digest.values():
+        for dup in paths[1:]:
+            quarantine.append({"path": dup, "reason": f"duplicate of {paths[0]}"})
+            exact += 1
+
+    # Near-duplicates among distinct valid contents: union-find over close dHash pairs
+    parent = {digest: digest for digest in by_digest}
+
+    def find(d: str) -> str:
+        while parent[d] != d:
+            parent[d] = parent[parent[d]]
+            d = parent[d]
+        return d
+
+    hashes = {digest: int(checks[digest][2], 16) for digest in by_digest}
+    for a, b in near_duplicate_pairs(hashes, max_distance):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb, key=lambda d: by_digest[d][0])] = min(ra, rb, key=lambda d: by_digest[d][0])
+    near = 0
+    for digest, paths in by_digest.items():
+        root = find(digest)
+        if root != digest:
+            # paths[1:] are already quarantined as exact duplicates of paths[0]
+            quarantine.append({"path": paths[0], "reason": f"near-duplicate of {by_digest[root][0]}"})
+            near += 1
+
+    quarantine.sort(key=lambda entry: entry["path"])
+    return {
+        "files": len(index),
+        "checked": len(pending),
+        "corrupt": corrupt,
+        "exact_duplicates": exact,
+        "near_duplicates": near,
+        "max_distance": max_distance,
+        "quarantine": quarantine,
+    }
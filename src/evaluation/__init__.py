@@ -0,0 +1,3 @@
+from .metrics import MetricsAccumulator
+
+__all__ = ["MetricsAccumulator"]
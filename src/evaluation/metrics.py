@@ -0,0 +1,168 @@
+"""
+Streaming classification metrics with memory independent of the dataset size.
+
+MetricsAccumulator keeps only fixed-size count tensors, updated once per batch:
+- a (C, C) confusion matrix (rows: true class, columns: predicted class) and the loss sum;
+- per class, histograms of its one-vs-rest score over score_bins equal-width bins for
+  samples of that class and of the others, from which ROC curves and AUC are computed
+  (scores in the same bin count as ties, so AUC is exact up to bin width);
+- calibration_bins bins of top-class confidence: count, confidence sum and hits (ECE).
+
+Accumulators from several ranks or runs combine by adding their tensors (merge, all_reduce),
+and state_dict() is plain JSON for resumable jobs.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import torch
+import torch.distributed as dist
+
+
+class MetricsAccumulator:
+    def __init__(self, num_classes: int = 2, score_bins: int = 1000, calibration_bins: int = 15):
+        self.num_classes = num_classes
+        self.score_bins = score_bins
+        self.calibration_bins = calibration_bins
+        self.confusion = torch.zeros(num_classes, num_classes, dtype=torch.int64)
+        # [class, is that class (0/1), bin]
+        self.score_hist = torch.zeros(num_classes, 2, score_bins, dtype=torch.int64)
+        self.calib_count = torch.zeros(calibration_bins, dtype=torch.int64)
+        self.calib_hits = torch.zeros(calibration_bins, dtype=torch.int64)
+        self.calib_conf = torch.zeros(calibration_bins, dtype=torch.float64)
+        self.loss_sum = torch.zeros((), dtype=torch.float64)
+        self.loss_count = torch.zeros((), dtype=torch.int64)
+
+    # --- updates -------------------------------------------------------------------
+
+    @torch.no_grad()
+    def update(
+        self,
+        targets: torch.Tensor,
+        logits: Optional[torch.Tensor] = None,
+        probs: Optional[torch.Tensor] = None,
+        loss: Optional[float] = None,
+    ) -> None:
+        """
+        Add one batch: targets (N,) class indices and either logits or probabilities (N, C).
+        loss is the batch's mean loss; it is weighted by N so loss is a per-sample mean.
+        """
+        if probs is None:
+            probs = torch.softmax(logits.detach().float(), dim=1)
+        probs = probs.detach().to("cpu", torch.float64)
+        targets = targets.detach().to("cpu", torch.int64)
+        n, c = probs.shape
+        conf, preds = probs.max(dim=1)
+        self.confusion += torch.bincount(targets * c + preds, minlength=c * c).view(c, c)
+
+        bins = (probs * self.score_bins).long().clamp_(0, self.score_bins - 1)  # (N, C)
+        is_class = (targets.unsqueeze(1) == torch.arange(c)).long()  # (N, C)
+        flat = (torch.arange(c) * 2 * self.score_bins + is_class * self.score_bins + bins).flatten()
+        self.score_hist += torch.bincount(flat, minlength=c * 2 * self.score_bins).view(c, 2, self.score_bins)
+
+        cbins = (conf * self.calibration_bins).long().clamp_(0, self.calibration_bins - 1)
+        self.calib_count += torch.bincount(cbins, minlength=self.calibration_bins)
+        self.calib_hits += torch.bincount(cbins, weights=(preds == targets).double(), minlength=self.calibration_bins).long()
+        self.calib_conf += torch.bincount(cbins, weights=conf, minlength=self.calibration_bins)
+        if loss is not None:
+            self.loss_sum += float(loss) * n
+            self.loss_count += n
+
+    def _tensors(self) -> List[torch.Tensor]:
+        return [self.confusion, self.score_hist, self.calib_count, self.calib_hits, self.calib_conf, self.loss_sum, self.loss_count]
+
+    def merge(self, other: "MetricsAccumulator") -> "MetricsAccumulator":
+        for mine, theirs in zip(self._tensors(), other._tensors()):
+            mine += theirs
+        return self
+
+    def all_reduce(self) -> "MetricsAccumulator":
+        """Sum the counts of every rank in place (no-op outside torch.distributed)."""
+        if dist.is_available() and dist.is_initialized():
+            for t in self._tensors():
+                dist.all_reduce(t, op=dist.ReduceOp.SUM)
+        return self
+
+    # --- results -------------------------------------------------------------------
+
+    @property
+    def count(self) -> int:
+        return int(self.confusion.sum())
+
+    @property
+    def accuracy(self) -> float:
+        return float(self.confusion.trace()) / self.count if self.count else 0.0
+
+    @property
+    def loss(self) -> float:
+        return float(self.loss_sum) / int(self.loss_count) if int(self.loss_count) else 0.0
+
+    def roc_auc(self, cls: int = 1) -> Optional[float]:
+        """One-vs-rest AUC for cls; None if only one of positives / negatives has been seen."""
+        neg, pos = self.score_hist[cls].double()
+        if pos.sum() == 0 or neg.sum() == 0:
+            return None
+        # Thresholds from the highest bin down; trapezoids treat each bin's scores as ties
+        tpr = torch.cat([torch.zeros(1, dtype=torch.float64), pos.flip(0).cumsum(0) / pos.sum()])
+        fpr = torch.cat([torch.zeros(1, dtype=torch.float64), neg.flip(0).cumsum(0) / neg.sum()])
+        return float(torch.trapezoid(tpr, fpr))
+
+    def roc_curve(self, cls: int = 1) -> Dict[str, List[float]]:
+        neg, pos = self.score_hist[cls].double()
+        thresholds = torch.arange(self.score_bins - 1, -1, -1, dtype=torch.float64) / self.score_bins
+        return {
+            "threshold": thresholds.tolist(),
+            "tpr": (pos.flip(0).cumsum(0) / pos.sum().clamp(min=1)).tolist(),
+            "fpr": (neg.flip(0).cumsum(0) / neg.sum().clamp(min=1)).tolist(),
+        }
+
+    def expected_calibration_error(self) -> float:
+        """Sum over confidence bins of |accuracy - mean confidence|, weighted by bin size."""
+        total = int(self.calib_count.sum())
+        if not total:
+            return 0.0
+        gap = (self.calib_hits.double() - self.calib_conf).abs()
+        return float(gap.sum()) / total
+
+    def compute(self, class_names: Optional[Sequence[str]] = None) -> dict:
+        names = list(class_names) if class_names is not None else [str(i) for i in range(self.num_classes)]
+        cm = self.confusion.double()
+        tp = cm.diag()
+        precision = torch.where(cm.sum(0) > 0, tp / cm.sum(0).clamp(min=1), torch.zeros_like(tp))
+        recall = torch.where(cm.sum(1) > 0, tp / cm.sum(1).clamp(min=1), torch.zeros_like(tp))
+        f1 = torch.where(precision + recall > 0, 2 * precision * recall / (precision + recall).clamp(min=1e-12), torch.zeros_like(tp))
+        per_class = {
+            name: {
+                "precision": float(precision[i]),
+                "recall": float(recall[i]),
+                "f1": float(f1[i]),
+                "support": int(cm[i].sum()),
+                "roc_auc": self.roc_auc(i),
+            }
+            for i, name in enumerate(names)
+        }
+        return {
+            "count": self.count,
+            "accuracy": self.accuracy,
+            "loss": self.loss if int(self.loss_count) else None,
+            "roc_auc": self.roc_auc(1) if self.num_classes == 2 else None,
+            "ece": self.expected_calibration_error(),
+            "per_class": per_class,
+            "confusion_matrix": self.confusion.tolist(),
+            "labels": names,
+        }
+
+    # --- persistence ---------------------------------------------------------------
+
+    def state_dict(self) -> dict:
+        return {
+            "num_classes": self.num_classes,
+            "score_bins": self.score_bins,
+            "calibration_bins": self.calibration_bins,
+            "tensors": [t.tolist() for t in self._tensors()],
+        }
+
+    @classmethod
+    def from_state_dict(cls, state: dict) -> "MetricsAccumulator":
+        acc = cls(state["num_classes"], state["score_bins"], state["calibration_bins"])
+        for t, values in zip(acc._tensors(), state["tensors"]):
+            t.copy_(torch.tensor(values, dtype=t.dtype))
+        return acc
@@ -1,15 +1,50 @@
 from .predict import (
     load_model,
     preprocess_image,
+    preprocess_bytes,
     predict_proba,
+    predict_proba_batch,
     predict_label,
     predict,
 )
+from .batching import MicroBatcher, QueueFullError
+from .pipeline import InferencePipeline
+from .archive import ArchiveTooLargeError, read_image_archive
+from .cache import PredictionCache, model_fingerprint
+from .registry import ModelRegistry, ModelVersion
+from .scoring import iter_directory_items, iter_split_items, score_items
+from .jobs import JobQueue, JobStore, LeaseLostError, job_id_for
+from .tta import TTA_AGGREGATIONS, TTA_MODES, aggregate_views, decode_views, num_views, predict_tta, tta_views
 
 __all__ = [
     "load_model",
     "preprocess_image",
+    "preprocess_bytes",
     "predict_proba",
+    "predict_proba_batch",
     "predict_label",
     "predict",
+    "MicroBatcher",
+    "QueueFullError",
+    "InferencePipeline",
+    "read_image_archive",
+    "ArchiveTooLargeError",
+    "PredictionCache",
+    "model_fingerprint",
+    "ModelRegistry",
+    "ModelVersion",
+    "iter_directory_items",
+    "iter_split_items",
+    "score_items",
+    "TTA_MODES",
+    "TTA_AGGREGATIONS",
+    "tta_views",
+    "decode_views",
+    "aggregate_views",
+    "num_views",
+    "predict_tta",
+    "JobQueue",
+    "JobStore",
+    "LeaseLostError",
+    "job_id_for",
 ]
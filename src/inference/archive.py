@@ -0,0 +1,99 @@
+"""Unpack zip/tar uploads into (name, bytes or spooled file) image entries for batch prediction."""
+import io
+import shutil
+import tarfile
+import zipfile
+from tempfile import SpooledTemporaryFile
+from pathlib import PurePosixPath
+from typing import BinaryIO, List, Optional, Tuple, Union
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".gif", ".webp")
+
+
+def _is_image_member(name: str) -> bool:
+    p = PurePosixPath(name)
+    if any(part.startswith(".") or part == "__MACOSX" for part in p.parts):
+        return False
+    return p.suffix.lower() in IMAGE_EXTENSIONS
+
+
+class ArchiveTooLargeError(ValueError):
+    """An archive with more images, or more uncompressed image bytes, than allowed."""
+
+
+class _Limits:
+    """Running count and uncompressed size of the extracted images, checked from the archive index."""
+
+    def __init__(self, max_files: int, max_member_bytes: Optional[int], max_total_bytes: Optional[int]):
+        self.max_files = max_files
+        self.max_member_bytes = max_member_bytes
+        self.max_total_bytes = max_total_bytes
+        self.files = 0
+        self.total = 0
+
+    def admit(self, name: str, size: int) -> None:
+        if self.files >= self.max_files:
+            raise ArchiveTooLargeError(f"Archive contains more than {self.max_files} images")
+        if self.max_member_bytes is not None and size > self.max_member_bytes:
+            raise ArchiveTooLargeError(f"{name} is {size} bytes uncompressed (limit {self.max_member_bytes})")
+        if self.max_total_bytes is not None and self.total + size > self.max_total_bytes:
+            raise ArchiveTooLargeError(f"Images in the archive exceed {self.max_total_bytes} bytes uncompressed")
+        self.files += 1
+        self.total += size
+
+
+def _extract(member: BinaryIO, spool_max_size: Optional[int]) -> Union[bytes, BinaryIO]:
+    if spool_max_size is None:
+        return member.read()
+    spooled = SpooledTemporaryFile(max_size=spool_max_size)
+    shutil.copyfileobj(member, spooled, 1024 * 1024)
+    spooled.seek(0)
+    return spooled
+
+
+def read_image_archive(
+    data: Union[bytes, BinaryIO],
+    max_files: int,
+    max_member_bytes: Optional[int] = None,
+    max_total_bytes: Optional[int] = None,
+    spool_max_size: Optional[int] = None,
+) -> List[Tuple[str, Union[bytes, BinaryIO]]]:
+    """
+    Return (member_name, bytes) for every image file in a zip or tar (optionally gzip/bz2/xz) archive,
+    given as bytes or a seekable binary file (read in place, e.g. a spooled upload). Non-image members
+    are skipped. Raises ValueError for unreadable archives and ArchiveTooLargeError for more than
+    max_files images, an image over max_member_bytes or images over max_total_bytes in all; sizes come
+    from the archive index, so nothing over a limit is extracted.
+    With spool_max_size, each image comes back as a SpooledTemporaryFile (in memory up to that many
+    bytes, on disk beyond; the caller closes it) instead of bytes.
+    """
+    buf = io.BytesIO(data) if isinstance(data, (bytes, bytearray, memoryview)) else data
+    buf.seek(0)
+    limits = _Limits(max_files, max_member_bytes, max_total_bytes)
+    entries: List[Tuple[str, Union[bytes, BinaryIO]]] = []
+    try:
+        if zipfile.is_zipfile(buf):
+            with zipfile.ZipFile(buf) as zf:
+                for info in zf.infolist():
+                    if info.is_dir() or not _is_image_member(info.filename):
+                        continue
+                    limits.admit(info.filename, info.file_size)
+                    with zf.open(info) as member:
+                        entries.append((info.filename, _extract(member, spool_max_size)))
+            return entries
+        buf.seek(0)
+        try:
+            with tarfile.open(fileobj=buf, mode="r:*") as tf:
+                for member in tf:
+                    if not member.isfile() or not _is_image_member(member.name):
+                        continue
+                    limits.admit(member.name, member.size)
+                    entries.append((member.name, _extract(tf.extractfile(member), spool_max_size)))
+        except tarfile.TarError as e:
+            raise ValueError(f"Unsupported archive (expected zip or tar): {e}") from e
+        return entries
+    except BaseException:
+        for _, entry in entries:
+            if not isinstance(entry, bytes):
+                entry.close()
+        raise
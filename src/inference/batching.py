@@ -0,0 +1,179 @@
+"""Dynamic micro-batching: coalesce concurrent single-image requests into one forward pass."""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+
+from src.config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+from src.monitoring import Histogram
+
+from .predict import predict_proba_batch
+
+_STOP = object()
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the inference queue is saturated; callers should back off and retry."""
+
+
+class _Request:
+    __slots__ = ("array", "single", "timings", "future", "enqueued_at")
+
+    def __init__(self, array: np.ndarray, single: bool, timings: Optional[Dict[str, float]] = None):
+        self.array = array  # (n, C, H, W)
+        self.single = single
+        self.timings = timings
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """
+    Queue single-image inputs and run them through the model in groups.
+
+    A batch is dispatched when it reaches max_batch_size images or when the oldest
+    queued request has waited max_wait_ms, whichever comes first. Each submit() returns
+    a Future resolving to that caller's own [P(cat), P(dog)] list; submit_many() queues
+    a whole (N, C, H, W) array and resolves to an (N, num_classes) array. Forward passes
+    are split into chunks of at most chunk_size images (default: max_batch_size).
+
+    Forward passes run on one dedicated worker thread. num_threads sets torch's
+    intra-op thread count from that worker (None leaves torch's default); a
+    max_queue_size > 0 bounds the queue and makes submit() raise QueueFullError.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        max_queue_size: int = 0,
+        num_threads: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max(max_wait_ms, 0.0) / 1000.0
+        self.num_threads = num_threads
+        self.chunk_size = chunk_size or max_batch_size
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(max_queue_size, 0))
+        self._thread: Optional[threading.Thread] = None
+        self.batch_size_hist = Histogram(
+            "inference_batch_size",
+            "Number of images per model forward pass",
+            [1, 2, 4, 8, 16, 32, 64, 128],
+        )
+        self.queue_wait_hist = Histogram(
+            "inference_queue_wait_ms",
+            "Time a request waited in the batching queue before its forward pass (ms)",
+            [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000],
+        )
+
+    def start(self) -> "MicroBatcher":
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        """Finish queued work, then stop the worker thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        self._thread = None
+
+    def submit(self, image_array: np.ndarray, timings: Optional[Dict[str, float]] = None) -> Future:
+        """
+        Queue one image of shape (C, H, W) or (1, C, H, W).
+        If timings is given, "queue_wait" and "forward" durations (ms) are recorded in it.
+        """
+        if image_array.ndim == 4:
+            if image_array.shape[0] != 1:
+                raise ValueError("submit() takes a single image; got batch of %d" % image_array.shape[0])
+            image_array = image_array[0]
+        return self._put(_Request(image_array[np.newaxis, ...], single=True, timings=timings))
+
+    def submit_many(self, batch: np.ndarray, timings: Optional[Dict[str, float]] = None) -> Future:
+        """Queue a stacked (N, C, H, W) array; the Future resolves to (N, num_classes) probabilities."""
+        if batch.ndim != 4:
+            raise ValueError("submit_many() expects an (N, C, H, W) array")
+        return self._put(_Request(batch, single=False, timings=timings))
+
+    def _put(self, req: _Request) -> Future:
+        try:
+            self._queue.put_nowait(req)
+        except queue.Full:
+            raise QueueFullError(f"Inference queue full ({self._queue.maxsize} pending)") from None
+        return req.future
+
+    def _collect(self, first: _Request) -> Tuple[List[_Request], bool]:
+        """Gather up to max_batch_size images, waiting at most max_wait_s after the first request."""
+        batch = [first]
+        n_images = len(first.array)
+        deadline = first.enqueued_at + self.max_wait_s
+        while n_images < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+            n_images += len(item.array)
+        return batch, False
+
+    def _run(self) -> None:
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch, stop = self._collect(item)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        # Skip requests whose caller gave up (e.g. a cancelled task); the rest can no longer be cancelled
+        batch = [req for req in batch if req.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        dispatched_at = time.perf_counter()
+        for req in batch:
+            wait_ms = (dispatched_at - req.enqueued_at) * 1000
+            self.queue_wait_hist.observe(wait_ms)
+            if req.timings is not None:
+                req.timings["queue_wait"] = wait_ms
+        try:
+            x = batch[0].array if len(batch) == 1 else np.concatenate([req.array for req in batch])
+            for start in range(0, len(x), self.chunk_size):
+                self.batch_size_hist.observe(min(self.chunk_size, len(x) - start))
+            probs = predict_proba_batch(self.model, x, chunk_size=self.chunk_size)
+        except Exception as e:
+            for req in batch:
+                req.future.set_exception(e)
+            return
+        forward_ms = (time.perf_counter() - dispatched_at) * 1000
+        offset = 0
+        for req in batch:
+            if req.timings is not None:
+                req.timings["forward"] = forward_ms
+            n = len(req.array)
+            out = probs[offset : offset + n]
+            offset += n
+            req.future.set_result(out[0].tolist() if req.single else out)
+
+    def reset_metrics(self) -> None:
+        self.batch_size_hist.reset()
+        self.queue_wait_hist.reset()
+
+    def render_metrics(self) -> str:
+        return self.batch_size_hist.render() + "\n" + self.queue_wait_hist.render()
@@ -0,0 +1,102 @@
+"""Content-hash prediction cache with LRU eviction and optional TTL."""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import BinaryIO, List, Optional, Union
+
+
+def content_digest(contents: Union[bytes, BinaryIO]) -> str:
+    """SHA-256 hex digest of an upload; a file object is hashed in chunks from the start and rewound."""
+    if isinstance(contents, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(contents).hexdigest()
+    contents.seek(0)
+    digest = hashlib.file_digest(contents, "sha256").hexdigest()
+    contents.seek(0)
+    return digest
+
+
+def model_fingerprint(model_path: Union[str, Path]) -> str:
+    """SHA-256 of the checkpoint file; identifies which weights produced a cached prediction."""
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """
+    Map sha256(upload bytes) + model fingerprint -> class probabilities.
+
+    Holds at most max_entries results (least recently used are evicted first); entries
+    older than ttl_seconds are treated as misses when ttl_seconds is set. Changing the
+    model fingerprint drops every entry, so a new checkpoint never serves old results.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds or None
+        self.fingerprint = ""
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def set_model_fingerprint(self, fingerprint: str) -> None:
+        """Record the loaded checkpoint; clears the cache if it differs from the previous one."""
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                self._data.clear()
+                self.fingerprint = fingerprint
+
+    def key(self, contents: Union[bytes, BinaryIO]) -> str:
+        return self.fingerprint + ":" + content_digest(contents)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and self.ttl_seconds and time.monotonic() - entry[1] > self.ttl_seconds:
+                del self._data[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, probs: List[float]) -> None:
+        if self.max_entries <= 0 or not key.startswith(self.fingerprint + ":"):
+            return  # disabled, or computed by a model that has since been replaced
+        with self._lock:
+            self._data[key] = (list(probs), time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def render_metrics(self) -> str:
+        return (
+            "# HELP prediction_cache_hits_total Predictions served from the content-hash cache\n"
+            "# TYPE prediction_cache_hits_total counter\n"
+            f"prediction_cache_hits_total {self.hits}\n"
+            "\n# HELP prediction_cache_misses_total Cache lookups that required a model forward pass\n"
+            "# TYPE prediction_cache_misses_total counter\n"
+            f"prediction_cache_misses_total {self.misses}\n"
+            "\n# HELP prediction_cache_evictions_total Entries evicted by the LRU bound\n"
+            "# TYPE prediction_cache_evictions_total counter\n"
+            f"prediction_cache_evictions_total {self.evictions}\n"
+            "\n# HELP prediction_cache_entries Entries currently cached\n"
+            "# TYPE prediction_cache_entries gauge\n"
+            f"prediction_cache_entries {len(self._data)}\n"
+        )
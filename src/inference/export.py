@@ -0,0 +1,149 @@
+"""Export optimized inference variants: BatchNorm-folded TorchScript, int8 quantized, and ONNX."""
+import copy
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+import numpy as np
+import torch
+
+from src.config import IMG_SIZE
+
+# Suffixes load_model(backend="auto") uses to pick a backend
+TORCHSCRIPT_SUFFIX = ".ts.pt"
+ONNX_SUFFIX = ".onnx"
+
+VARIANTS = ("torchscript", "int8-dynamic", "int8-static", "onnx")
+
+
+def quantized_engine() -> str:
+    """Pick the int8 kernel backend for this CPU (x86/fbgemm on Intel/AMD, qnnpack on ARM)."""
+    engines = torch.backends.quantized.supported_engines
+    return "x86" if "x86" in engines else ("qnnpack" if "qnnpack" in engines else engines[0])
+
+
+def example_input(batch_size: int = 1) -> torch.Tensor:
+    return torch.rand(batch_size, 3, IMG_SIZE[1], IMG_SIZE[0])
+
+
+def fold_batchnorm(model: torch.nn.Module) -> torch.nn.Module:
+    """Fold each Conv2d+BatchNorm2d pair into a single Conv2d (eval mode). No-op for the legacy CNN."""
+    from torch.fx.experimental.optimization import fuse
+
+    return fuse(copy.deepcopy(model).eval())
+
+
+def _freeze_trace(model: torch.nn.Module) -> torch.jit.ScriptModule:
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input(2))
+    return torch.jit.freeze(traced.eval())
+
+
+def to_torchscript(model: torch.nn.Module) -> torch.jit.ScriptModule:
+    """BatchNorm-folded, traced and frozen float32 TorchScript module."""
+    return _freeze_trace(fold_batchnorm(model))
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.jit.ScriptModule:
+    """int8 weights for Linear layers, activations quantized on the fly; convolutions stay float (BN-folded)."""
+    from torch.ao.quantization import quantize_dynamic
+
+    torch.backends.quantized.engine = quantized_engine()
+    q = quantize_dynamic(fold_batchnorm(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return _freeze_trace(q)
+
+
+def quantize_static_int8(
+    model: torch.nn.Module, calibration_batches: Iterable[torch.Tensor]
+) -> torch.jit.ScriptModule:
+    """Post-training static int8 quantization (FX graph mode); activation ranges come from calibration_batches."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = quantized_engine()
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(copy.deepcopy(model).eval(), get_default_qconfig_mapping(engine), (example_input(),))
+    with torch.no_grad():
+        for x in calibration_batches:
+            prepared(x)
+    return _freeze_trace(convert_fx(prepared))
+
+
+def export_onnx(model: torch.nn.Module, path: Union[str, Path]) -> Path:
+    """Write a BatchNorm-folded ONNX graph with a dynamic batch dimension (requires the onnx package)."""
+    path = Path(path)
+    torch.onnx.export(
+        fold_batchnorm(model),
+        example_input(1),
+        str(path),
+        input_names=["input"],
+        output_names=["logits"],
+        dynamic_axes={"input": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+    )
+    return path
+
+
+def compare_to_reference(
+    reference: torch.nn.Module,
+    candidates: Dict[str, torch.nn.Module],
+    batches: Iterable[Tuple[torch.Tensor, torch.Tensor]],
+) -> Dict[str, dict]:
+    """
+    Run every model over the same (inputs, labels) batches and report accuracy, accuracy delta
+    vs the reference, top-1 agreement, max |delta P| and mean ms per batch. batches is read
+    once, each batch going through every model before the next, so it can be a generator
+    decoding from disk; only the probabilities are kept.
+    """
+    models = {"float32": reference, **candidates}
+    probs: Dict[str, List[torch.Tensor]] = {name: [] for name in models}
+    elapsed = dict.fromkeys(models, 0.0)
+    labels = []
+    with torch.no_grad():
+        for x, y in batches:
+            labels.append(y)
+            for name, m in models.items():
+                t0 = time.perf_counter()
+                probs[name].append(torch.softmax(m(x), dim=1))
+                elapsed[name] += time.perf_counter() - t0
+    y = torch.cat(labels) if labels else torch.zeros(0, dtype=torch.long)
+    n_batches = max(len(labels), 1)
+
+    def joined(name):
+        return torch.cat(probs[name]) if probs[name] else torch.zeros(0, 2)
+
+    ref_p = joined("float32")
+    ref_acc = (ref_p.argmax(1) == y).float().mean().item() if len(y) else float("nan")
+    report = {"float32": {"accuracy": ref_acc, "accuracy_delta": 0.0, "agreement": 1.0,
+                          "max_prob_delta": 0.0, "ms_per_batch": elapsed["float32"] * 1000 / n_batches}}
+    for name in candidates:
+        p = joined(name)
+        acc = (p.argmax(1) == y).float().mean().item() if len(y) else float("nan")
+        report[name] = {
+            "accuracy": acc,
+            "accuracy_delta": acc - ref_acc,
+            "agreement": (p.argmax(1) == ref_p.argmax(1)).float().mean().item() if len(p) else float("nan"),
+            "max_prob_delta": (p - ref_p).abs().max().item() if len(p) else 0.0,
+            "ms_per_batch": elapsed[name] * 1000 / n_batches,
+        }
+    return report
+
+
+class OnnxModule(torch.nn.Module):
+    """Wrap an onnxruntime session so it can be called like the eager model (tensor in, logits out)."""
+
+    def __init__(self, path: Union[str, Path], num_threads: int = 0):
+        super().__init__()
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("ONNX backend requires onnxruntime: pip install onnxruntime") from e
+        opts = ort.SessionOptions()
+        if num_threads:
+            opts.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.session.run(None, {self.input_name: np.ascontiguousarray(x.numpy(), dtype=np.float32)})[0]
+        return torch.from_numpy(out)
@@ -0,0 +1,445 @@
+"""
+Asynchronous prediction jobs on a local SQLite queue (no external broker).
+
+A job is a list of images plus prediction options. submit() stores the uploads and returns
+at once; worker coroutines claim queued jobs and pass their images, a chunk at a time, to a
+caller-supplied async process() (the API runs them through its InferencePipeline). Each
+image's JSON result is recorded as its chunk completes, so results can be polled or
+streamed while the job is still running, and uploads are dropped once scored.
+
+Job ids are a hash of the images' SHA-256 digests and the options: submitting the same
+content again (e.g. a client retrying after a timeout) returns the existing job instead of
+running it twice. A failed job is queued again on resubmission and continues after its
+last recorded result.
+
+Processes sharing the database (api/serve.py workers) claim jobs atomically with a lease
+that is renewed after every chunk and while a chunk waits for pipeline capacity; a job whose
+lease expires (its process died) is claimed again and resumes at its first image without a
+result. Each claim gets its own lease token, and results are only written by the worker
+holding the current one, so a worker that lost its lease stops instead of running the job
+alongside its new owner.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, BinaryIO, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from src.config import JOB_CHUNK_SIZE, JOB_LEASE_S, JOB_RETENTION_S, JOB_WORKERS
+
+from .batching import QueueFullError
+from .cache import content_digest
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    options     TEXT NOT NULL,
+    total       INTEGER NOT NULL,
+    done        INTEGER NOT NULL DEFAULT 0,
+    errors      INTEGER NOT NULL DEFAULT 0,
+    created     REAL NOT NULL,
+    started     REAL,
+    finished    REAL,
+    lease_until REAL,
+    lease_owner TEXT,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS items (
+    job_id   TEXT NOT NULL,
+    idx      INTEGER NOT NULL,
+    filename TEXT,
+    payload  BLOB,
+    result   TEXT,
+    PRIMARY KEY (job_id, idx)
+)
+"""
+
+# (filename, image as bytes or a seekable binary file such as a spooled upload)
+JobItem = Tuple[str, Union[bytes, BinaryIO]]
+# process(payloads, options) -> one JSON-serialisable result dict per payload
+ProcessFn = Callable[[List[bytes], Dict[str, Any]], Awaitable[List[Dict[str, Any]]]]
+
+
+class LeaseLostError(RuntimeError):
+    """Raised when a worker's lease on a job has expired and the job was claimed again."""
+
+
+def job_id_for(digests: Sequence[str], options: Dict[str, Any]) -> str:
+    """Deterministic job id for images with these SHA-256 digests (in order) and options."""
+    key = json.dumps({"items": list(digests), "options": options}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _payload(data: Union[bytes, BinaryIO]) -> sqlite3.Binary:
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        return sqlite3.Binary(data)
+    data.seek(0)
+    return sqlite3.Binary(data.read())
+
+
+def _lease_clause(lease: Optional[str]) -> Tuple[str, Tuple[str, ...]]:
+    """SQL condition (and its argument) restricting an update to the holder of lease, if given."""
+    return (" AND lease_owner = ?", (lease,)) if lease is not None else ("", ())
+
+
+def _job_dict(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "job_id": row["id"],
+        "status": row["status"],
+        "total": row["total"],
+        "done": row["done"],
+        "errors": row["errors"],
+        "options": json.loads(row["options"]),
+        "created": row["created"],
+        "started": row["started"],
+        "finished": row["finished"],
+        "error": row["error"],
+    }
+
+
+class JobStore:
+    """SQLite tables of jobs and their images (see module docstring); usable from any thread or process."""
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")  # readers (polling, streaming) never block the writer
+            conn.executescript(_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "lease_owner" not in columns:  # database created before lease tokens
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        # One short-lived connection per call: cheap for SQLite and safe from asyncio.to_thread workers
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def submit(self, items: Sequence[JobItem], options: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """
+        Store (filename, bytes or file) items as a queued job. Returns (job, created); an identical
+        earlier submission is returned as is (created False) unless it failed, in which case
+        it is queued again. Files are hashed in chunks and copied into the database one at a
+        time, so only one image is in memory at once.
+        """
+        job_id = job_id_for([content_digest(data) for _, data in items], options)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row["status"] != "failed":
+                return _job_dict(row), False
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = NULL, finished = NULL, lease_until = NULL, "
+                    "lease_owner = NULL WHERE id = ?",
+                    (job_id,),
+                )
+            else:
+                conn.execute(
+                    "INSERT INTO jobs (id, status, options, total, created) VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, json.dumps(options, sort_keys=True), len(items), now),
+                )
+                conn.executemany(
+                    "INSERT INTO items (job_id, idx, filename, payload) VALUES (?, ?, ?, ?)",
+                    ((job_id, i, name, _payload(data)) for i, (name, data) in enumerate(items)),
+                )
+            return _job_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def claim(self, lease_s: float = JOB_LEASE_S) -> Optional[Dict[str, Any]]:
+        """
+        Take the oldest queued job, or a running one whose lease has expired, and lease it.
+        The returned job carries a "lease" token to pass to renew/record/finish/release.
+        """
+        now = time.time()
+        lease = uuid.uuid4().hex
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY created LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started = COALESCE(started, ?), lease_until = ?, lease_owner = ? "
+                "WHERE id = ?",
+                (now, now + lease_s, lease, row["id"]),
+            )
+            job = _job_dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return {**job, "lease": lease}
+
+    def renew(self, job_id: str, lease: str, lease_s: float = JOB_LEASE_S) -> bool:
+        """Extend the lease; False if it is no longer held (expired and claimed again, or released)."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND lease_owner = ?",
+                (time.time() + lease_s, job_id, lease),
+            )
+            return cur.rowcount == 1
+
+    def pending_items(self, job_id: str, limit: int) -> List[Tuple[int, bytes]]:
+        """Up to limit (index, bytes) of the job's images without a result, in order."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT idx, payload FROM items WHERE job_id = ? AND result IS NULL ORDER BY idx LIMIT ?",
+                (job_id, limit),
+            ).fetchall()
+        return [(r["idx"], bytes(r["payload"])) for r in rows]
+
+    def record(
+        self,
+        job_id: str,
+        results: Sequence[Tuple[int, Dict[str, Any]]],
+        lease_s: float = JOB_LEASE_S,
+        lease: Optional[str] = None,
+    ) -> None:
+        """
+        Save results (dropping the uploads they came from) and renew the job's lease. With
+        lease, nothing is written unless it is still held; LeaseLostError otherwise.
+        """
+        n_errors = sum("error" in r for _, r in results)
+        owned, args = _lease_clause(lease)
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET done = done + ?, errors = errors + ?, lease_until = ? WHERE id = ?" + owned,
+                (len(results), n_errors, time.time() + lease_s, job_id, *args),
+            )
+            if cur.rowcount != 1:
+                raise LeaseLostError(f"Lease on job {job_id} is no longer held")
+            conn.executemany(
+                "UPDATE items SET result = ?, payload = NULL WHERE job_id = ? AND idx = ?",
+                ((json.dumps(r), job_id, idx) for idx, r in results),
+            )
+
+    def finish(self, job_id: str, error: Optional[str] = None, lease: Optional[str] = None) -> None:
+        """Mark the job done (or failed with error); with lease, only if it is still held."""
+        owned, args = _lease_clause(lease)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, lease_until = NULL, lease_owner = NULL "
+                "WHERE id = ?" + owned,
+                ("failed" if error else "done", error, time.time(), job_id, *args),
+            )
+
+    def release(self, job_id: str, lease: Optional[str] = None) -> None:
+        """Put a running job back in the queue (e.g. on shutdown) so another worker resumes it now."""
+        owned, args = _lease_clause(lease)
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'queued', lease_until = NULL, lease_owner = NULL "
+                "WHERE id = ? AND status = 'running'" + owned,
+                (job_id, *args),
+            )
+
+    def results(self, job_id: str, start: int = 0) -> List[Dict[str, Any]]:
+        """Recorded results from index start onwards, stopping at the first image not yet scored."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT idx, filename, result FROM items WHERE job_id = ? AND idx >= ? AND result IS NOT NULL "
+                "ORDER BY idx",
+                (job_id, start),
+            ).fetchall()
+        out = []
+        for expected, row in enumerate(rows, start):
+            if row["idx"] != expected:
+                break
+            out.append({"index": row["idx"], "filename": row["filename"], **json.loads(row["result"])})
+        return out
+
+    def purge(self, older_than_s: float = JOB_RETENTION_S) -> int:
+        """Delete jobs that finished more than older_than_s ago; returns how many."""
+        cutoff = time.time() - older_than_s
+        with self._transaction() as conn:
+            ids = [r["id"] for r in conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed') AND finished < ?", (cutoff,)
+            )]
+            conn.executemany("DELETE FROM items WHERE job_id = ?", ((i,) for i in ids))
+            conn.executemany("DELETE FROM jobs WHERE id = ?", ((i,) for i in ids))
+        return len(ids)
+
+    def counts(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            found = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: found.get(status, 0) for status in JOB_STATUSES}
+
+
+class JobQueue:
+    """
+    Worker coroutines running JobStore jobs through process() on the current event loop.
+
+    Up to workers jobs run at once in this process; each sends chunk_size images per
+    process() call. When process() raises QueueFullError (the pipeline is saturated by
+    interactive traffic) the chunk is retried with backoff, so jobs never take the last
+    admission slots from synchronous requests; the job's lease is renewed while it waits.
+    A worker whose lease was lost (e.g. the process stalled past lease_s) drops the job
+    without writing results. Any other exception fails the job.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        process: ProcessFn,
+        workers: int = JOB_WORKERS,
+        chunk_size: int = JOB_CHUNK_SIZE,
+        lease_s: float = JOB_LEASE_S,
+        retention_s: float = JOB_RETENTION_S,
+        poll_interval_s: float = 1.0,
+    ):
+        self.store = store
+        self.process = process
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        self.lease_s = lease_s
+        self.retention_s = retention_s
+        self.poll_interval_s = poll_interval_s
+        self._tasks: List[asyncio.Task] = []
+        self._running: Set[str] = set()
+        self._wake: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+
+    def start(self) -> "JobQueue":
+        """Start the workers; call from a coroutine on the loop they should run on."""
+        self._wake = asyncio.Event()
+        self._tasks = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self) -> None:
+        """Cancel the workers and hand their unfinished jobs back to the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, items: Sequence[JobItem], options: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        job, created = await asyncio.to_thread(self.store.submit, items, options)
+        if created and self._wake is not None:
+            self._wake.set()
+        return job, created
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def stream(self, job_id: str, follow: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the job's results in image order. With follow, keep waiting for new results
+        until the job has finished; otherwise stop after those already recorded.
+        """
+        cursor = 0
+        while True:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            batch = await asyncio.to_thread(self.store.results, job_id, cursor)
+            for result in batch:
+                yield result
+            cursor += len(batch)
+            if job is None or not follow or cursor >= job["total"] or job["status"] == "failed":
+                return
+            if not batch:
+                await asyncio.sleep(min(self.poll_interval_s, 0.2))
+
+    async def _worker(self) -> None:
+        while True:
+            claim = asyncio.ensure_future(asyncio.to_thread(self.store.claim, self.lease_s))
+            try:
+                job = await asyncio.shield(claim)
+            except asyncio.CancelledError:
+                # Cancelling does not stop the thread: hand back whatever it claims
+                job = await claim
+                if job is not None:
+                    await asyncio.to_thread(self.store.release, job["job_id"], job["lease"])
+                raise
+            if job is None:
+                await self._idle()
+                continue
+            await self._run(job)
+
+    async def _idle(self) -> None:
+        if time.monotonic() - self._last_purge > 60:
+            self._last_purge = time.monotonic()
+            await asyncio.to_thread(self.store.purge, self.retention_s)
+        self._wake.clear()
+        try:
+            # Woken by submit() in this process; jobs submitted through other processes are found by polling
+            await asyncio.wait_for(self._wake.wait(), self.poll_interval_s)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, job: Dict[str, Any]) -> None:
+        job_id, lease = job["job_id"], job["lease"]
+        self._running.add(job_id)
+        try:
+            while True:
+                items = await asyncio.to_thread(self.store.pending_items, job_id, self.chunk_size)
+                if not items:
+                    break
+                outcomes = await self._process([data for _, data in items], job["options"], job_id, lease)
+                await asyncio.to_thread(
+                    self.store.record, job_id, [(idx, out) for (idx, _), out in zip(items, outcomes)],
+                    self.lease_s, lease,
+                )
+            await asyncio.to_thread(self.store.finish, job_id, None, lease)
+        except asyncio.CancelledError:
+            await asyncio.shield(asyncio.to_thread(self.store.release, job_id, lease))
+            raise
+        except LeaseLostError:
+            pass  # claimed again by another worker, which continues the job
+        except Exception as e:
+            await asyncio.to_thread(self.store.finish, job_id, f"{type(e).__name__}: {e}", lease)
+        finally:
+            self._running.discard(job_id)
+
+    async def _process(
+        self, payloads: List[bytes], options: Dict[str, Any], job_id: str, lease: str
+    ) -> List[Dict[str, Any]]:
+        delay = 0.05
+        renewed = time.monotonic()  # the lease was just taken or renewed by claim/record
+        while True:
+            try:
+                return await self.process(payloads, options)
+            except QueueFullError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+                if time.monotonic() - renewed > self.lease_s / 3:
+                    if not await asyncio.to_thread(self.store.renew, job_id, lease, self.lease_s):
+                        raise LeaseLostError(f"Lease on job {job_id} is no longer held") from None
+                    renewed = time.monotonic()
+
+    def render_metrics(self) -> str:
+        counts = self.store.counts()
+        lines = [
+            "# HELP prediction_jobs Asynchronous prediction jobs in the queue database by status",
+            "# TYPE prediction_jobs gauge",
+        ]
+        lines += [f'prediction_jobs{{status="{s}"}} {n}' for s, n in counts.items()]
+        lines += [
+            "# HELP prediction_jobs_running_local Jobs being run by this process",
+            "# TYPE prediction_jobs_running_local gauge",
+            f"prediction_jobs_running_local {len(self._running)}",
+        ]
+        return "\n".join(lines) + "\n"
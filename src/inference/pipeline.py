@@ -0,0 +1,253 @@
+"""Executor-backed inference pipeline: decode in a thread pool, forward pass in the batching worker."""
+import asyncio
+import functools
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+import torch
+from PIL import Image
+
+from src.config import (
+    BATCH_MAX_SIZE,
+    BATCH_MAX_WAIT_MS,
+    DECODE_WORKERS,
+    IMG_SIZE,
+    INFERENCE_CHUNK_SIZE,
+    INFERENCE_NUM_THREADS,
+    MAX_PENDING_REQUESTS,
+    TTA_AGGREGATION,
+)
+
+from .batching import MicroBatcher, QueueFullError
+from .cache import PredictionCache
+from .predict import preprocess_bytes
+from .tta import aggregate_views, decode_views, num_views
+
+
+def _sample_image(fmt: str) -> bytes:
+    """Small photo-sized image (large enough for JPEG draft mode) encoded in fmt, for warm-up."""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (480, 640, 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, fmt)
+    return buf.getvalue()
+
+
+class InferencePipeline:
+    """
+    Keep CPU-bound work off the asyncio event loop.
+
+    Image decode/resize runs in a bounded ThreadPoolExecutor (PIL releases the GIL
+    while decoding) and the forward pass runs in the MicroBatcher's dedicated worker.
+    At most max_pending predictions are admitted at once; beyond that predict()
+    raises QueueFullError immediately instead of queueing unbounded work.
+    With a PredictionCache, repeated uploads are answered from the cache without
+    taking an admission slot or running decode/forward; the content hash of the key is
+    computed in the decode pool too (uploads can be large spooled files).
+    With a TTA mode other than "none", every view of an image goes to the batching worker as
+    one request (one forward pass) and the view probabilities are aggregated.
+    """
+
+    def __init__(
+        self,
+        model: torch.nn.Module,
+        decode_workers: int = DECODE_WORKERS,
+        num_threads: Optional[int] = INFERENCE_NUM_THREADS,
+        max_pending: int = MAX_PENDING_REQUESTS,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        chunk_size: int = INFERENCE_CHUNK_SIZE,
+        cache: Optional[PredictionCache] = None,
+    ):
+        self.max_pending = max_pending
+        self.cache = cache
+        self.batcher = MicroBatcher(
+            model,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue_size=max_pending,
+            num_threads=num_threads,
+            chunk_size=chunk_size,
+        )
+        self._decode_pool = ThreadPoolExecutor(max_workers=decode_workers, thread_name_prefix="decode")
+        self._pending = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def start(self) -> "InferencePipeline":
+        self.batcher.start()
+        return self
+
+    def stop(self) -> None:
+        self.batcher.stop()
+        self._decode_pool.shutdown(wait=True)
+
+    def warm_up(self, batch_sizes: Sequence[int] = (1,)) -> float:
+        """
+        Push representative batches through the serving path before it takes traffic: decode
+        threads and PIL's JPEG/PNG plugins, the batching worker, and the forward kernels for each
+        batch size. Batching metrics are reset afterwards. Returns the elapsed time in ms.
+        """
+        t0 = time.perf_counter()
+        samples = [_sample_image("JPEG"), _sample_image("PNG")]
+        n = max(batch_sizes)
+        buf = np.empty((n, 3, IMG_SIZE[1], IMG_SIZE[0]), dtype=np.float32)
+        decodes = [self._decode_pool.submit(preprocess_bytes, samples[i % 2], buf[i]) for i in range(n)]
+        for f in decodes:
+            f.result()
+        for size in batch_sizes:
+            self.batcher.submit_many(buf[:size]).result()
+        self.batcher.reset_metrics()
+        return (time.perf_counter() - t0) * 1000
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise QueueFullError(f"Inference pipeline saturated ({self._pending} in flight)")
+            self._pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _cache_key(self, contents: Union[bytes, BinaryIO], tta: str, aggregation: str) -> str:
+        key = self.cache.key(contents)
+        return key if tta == "none" else f"{key}:{tta}:{aggregation}"
+
+    async def _cache_keys(
+        self, contents_list: Sequence[Union[bytes, BinaryIO]], tta: str, aggregation: str
+    ) -> Optional[List[str]]:
+        """Cache keys hashed in the decode pool (not on the event loop), or None without a cache."""
+        if self.cache is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(self._decode_pool, self._cache_key, c, tta, aggregation) for c in contents_list
+        ))
+
+    async def predict(
+        self,
+        contents: Union[bytes, BinaryIO],
+        timings: Optional[Dict[str, float]] = None,
+        tta: str = "none",
+        aggregation: str = TTA_AGGREGATION,
+    ) -> List[float]:
+        """
+        Decode an image (raw bytes, or a binary file such as a spooled upload, read in place) and
+        return [P(cat), P(dog)] without blocking the event loop.
+        Raises QueueFullError when saturated and ValueError if the bytes are not a decodable image.
+        If timings is given, per-stage durations (ms) are recorded in it.
+        tta selects the test-time augmentation views (see src.inference.tta), combined by aggregation.
+        """
+        keys = await self._cache_keys([contents], tta, aggregation)
+        key = keys[0] if keys is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            decode = preprocess_bytes if tta == "none" else functools.partial(decode_views, mode=tta)
+            try:
+                arr = await loop.run_in_executor(
+                    self._decode_pool, functools.partial(decode, contents, timings=timings)
+                )
+            except Exception as e:
+                # Any decode failure is a client error, distinct from model failures below
+                raise ValueError(str(e)) from e
+            if tta == "none":
+                probs = await asyncio.wrap_future(self.batcher.submit(arr, timings=timings))
+            else:
+                views = await asyncio.wrap_future(self.batcher.submit_many(arr, timings=timings))
+                probs = aggregate_views(views, len(arr), aggregation)[0].tolist()
+        finally:
+            self._release()
+        if key is not None:
+            self.cache.put(key, probs)
+        return probs
+
+    async def predict_many(
+        self,
+        contents_list: Sequence[Union[bytes, BinaryIO]],
+        timings: Optional[Dict[str, float]] = None,
+        tta: str = "none",
+        aggregation: str = TTA_AGGREGATION,
+    ) -> List[Union[List[float], ValueError]]:
+        """
+        Decode many images in parallel, stack the decodable ones into one (N, C, H, W) array
+        and run it through chunked forward passes. Returns one entry per input: the
+        [P(cat), P(dog)] list, or a ValueError for an image that could not be decoded.
+        The whole call occupies a single admission slot. If timings is given, the wall time of
+        the parallel decode phase ("decode") and of the forward passes ("forward") are recorded.
+        With tta, each image contributes its V views as consecutive rows (N x V rows in all).
+        """
+        keys = await self._cache_keys(contents_list, tta, aggregation)
+        results: List[Union[List[float], ValueError, None]] = (
+            [self.cache.get(k) for k in keys] if keys is not None else [None] * len(contents_list)
+        )
+        todo = [i for i, r in enumerate(results) if r is None]
+        if not todo:
+            return results
+        self._acquire()
+        try:
+            loop = asyncio.get_running_loop()
+            # Each decode thread writes straight into its row(s) of one preallocated batch buffer
+            v = num_views(tta)
+            buf = np.empty((len(todo) * v, 3, IMG_SIZE[1], IMG_SIZE[0]), dtype=np.float32)
+            t0 = time.perf_counter()
+            if tta == "none":
+                jobs = (
+                    loop.run_in_executor(self._decode_pool, preprocess_bytes, contents_list[i], buf[j])
+                    for j, i in enumerate(todo)
+                )
+            else:
+                jobs = (
+                    loop.run_in_executor(self._decode_pool, decode_views, contents_list[i], tta, buf[j * v : (j + 1) * v])
+                    for j, i in enumerate(todo)
+                )
+            decoded = await asyncio.gather(*jobs, return_exceptions=True)
+            if timings is not None:
+                timings["decode"] = (time.perf_counter() - t0) * 1000
+            ok_rows, ok_idx = [], []
+            for j, (i, d) in enumerate(zip(todo, decoded)):
+                if isinstance(d, Exception):
+                    results[i] = ValueError(str(d))
+                else:
+                    ok_rows.append(j)
+                    ok_idx.append(i)
+            if ok_idx:
+                rows = [j * v + k for j in ok_rows for k in range(v)]
+                batch = buf if len(ok_rows) == len(todo) else buf[rows]
+                probs = await asyncio.wrap_future(self.batcher.submit_many(batch, timings=timings))
+                probs = aggregate_views(probs, v, aggregation)
+                for i, p in zip(ok_idx, probs):
+                    results[i] = p.tolist()
+                    if keys is not None:
+                        self.cache.put(keys[i], results[i])
+            return results
+        finally:
+            self._release()
+
+    def render_metrics(self) -> str:
+        cache_text = "\n" + self.cache.render_metrics() if self.cache is not None else ""
+        return (
+            self.batcher.render_metrics()
+            + "\n# HELP inference_pending_requests Predictions admitted and not yet completed\n"
+            + "# TYPE inference_pending_requests gauge\n"
+            + f"inference_pending_requests {self._pending}\n"
+            + "\n# HELP inference_rejected_total Predictions rejected with 429 because the pipeline was saturated\n"
+            + "# TYPE inference_rejected_total counter\n"
+            + f"inference_rejected_total {self._rejected}\n"
+            + cache_text
+        )
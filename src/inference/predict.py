@@ -1,25 +1,51 @@
 """Model loading and prediction utilities for inference API."""
 from pathlib import Path
-from typing import Any, Dict, List, Union
+from typing import Any, BinaryIO, Dict, List, Optional, Union
 
 import numpy as np
 import torch
 
 from src.config import CLASS_NAMES, IMG_SIZE
-from src.data import load_and_resize_image
+from src.data import decode_image
 from src.model import get_model
 
+from .export import ONNX_SUFFIX, TORCHSCRIPT_SUFFIX, OnnxModule, quantized_engine
+
+BACKENDS = ("auto", "eager", "torchscript", "onnx")
+
 
 def _is_legacy_state_dict(state: Dict[str, torch.Tensor]) -> bool:
     """True if state_dict is from the older CNN without BatchNorm (features.3, features.6)."""
     return "features.3.weight" in state and "features.1.weight" not in state
 
 
-def load_model(model_path: Union[str, Path]) -> torch.nn.Module:
-    """Load trained model from .pt file (state_dict). Supports both BatchNorm and legacy (no-BN) checkpoints."""
+def load_model(model_path: Union[str, Path], backend: str = "eager") -> torch.nn.Module:
+    """
+    Load a model for inference. backend selects the runtime:
+    - "eager": state_dict .pt file into SimpleCNN (supports BatchNorm and legacy no-BN checkpoints)
+    - "torchscript": TorchScript file from scripts/export_model.py (float or int8 quantized)
+    - "onnx": ONNX file run through onnxruntime (optional dependency)
+    - "auto": pick by file name (*.ts.pt -> torchscript, *.onnx -> onnx, otherwise eager)
+    """
     path = Path(model_path)
     if not path.exists():
         raise FileNotFoundError(f"Model not found: {path}")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+    if backend == "auto":
+        if path.name.endswith(ONNX_SUFFIX):
+            backend = "onnx"
+        elif path.name.endswith(TORCHSCRIPT_SUFFIX):
+            backend = "torchscript"
+        else:
+            backend = "eager"
+    if backend == "torchscript":
+        torch.backends.quantized.engine = quantized_engine()  # int8 variants need the engine they were built for
+        model = torch.jit.load(str(path), map_location="cpu")
+        model.eval()
+        return model
+    if backend == "onnx":
+        return OnnxModule(path)
     state = torch.load(path, map_location="cpu", weights_only=True)
     legacy = _is_legacy_state_dict(state)
     model = get_model(num_classes=len(CLASS_NAMES), legacy=legacy)
@@ -30,18 +56,42 @@ def load_model(model_path: Union[str, Path]) -> torch.nn.Module:
 
 def preprocess_image(image_path: Union[str, Path]) -> np.ndarray:
     """Load and preprocess a single image for model input. Returns (1, C, H, W)."""
-    img = load_and_resize_image(image_path, target_size=IMG_SIZE)
-    img = np.transpose(img, (2, 0, 1))
-    return img[np.newaxis, ...].astype(np.float32)
+    return decode_image(Path(image_path), IMG_SIZE)[np.newaxis, ...]
+
+
+def preprocess_bytes(
+    contents: Union[bytes, BinaryIO], out: Optional[np.ndarray] = None, timings: Optional[Dict[str, float]] = None
+) -> np.ndarray:
+    """
+    Decode an uploaded image (raw bytes or a binary file, e.g. a spooled upload) and preprocess for model input. Returns (1, C, H, W).
+    If out (float32 (C, H, W), e.g. one row of a batch buffer) is given, pixels are written there;
+    if timings is given, per-stage durations (ms) are recorded in it.
+    """
+    return decode_image(contents, IMG_SIZE, out=out, timings=timings)[np.newaxis, ...]
+
+
+def predict_proba_batch(
+    model: torch.nn.Module, batch: np.ndarray, chunk_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Return class probabilities of shape (N, num_classes) for input (N, C, H, W).
+    Runs one forward pass, or ceil(N / chunk_size) passes when chunk_size is set.
+    """
+    x = torch.from_numpy(batch).float()
+    step = chunk_size or max(len(x), 1)
+    outs = []
+    with torch.no_grad():
+        for start in range(0, len(x), step):
+            logits = model(x[start : start + step])
+            outs.append(torch.softmax(logits, dim=1))
+    if not outs:
+        return np.zeros((0, len(CLASS_NAMES)), dtype=np.float32)
+    return torch.cat(outs).numpy()
 
 
 def predict_proba(model: torch.nn.Module, image_array: np.ndarray) -> List[float]:
     """Return class probabilities [P(cat), P(dog)] for input (1, C, H, W)."""
-    x = torch.from_numpy(image_array).float()
-    with torch.no_grad():
-        logits = model(x)
-        probs = torch.softmax(logits, dim=1)
-    return probs[0].tolist()
+    return predict_proba_batch(model, image_array)[0].tolist()
 
 
 def predict_label(model: torch.nn.Module, image_array: np.ndarray) -> str:
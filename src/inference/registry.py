@@ -0,0 +1,346 @@
+"""
+In-process model registry: hot reload, several resident versions, and traffic routing.
+
+A new checkpoint is loaded and warmed up (in the background with load_async), then
+swapped in with a single reference assignment, so requests never wait on a cold model.
+Each resident version has its own InferencePipeline (decode pool, micro-batcher and
+prediction cache). A request counts as in flight on its version from acquire() (routing)
+until release(), and a replaced or evicted version stops only after those requests drain.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import torch
+
+from src.config import MAX_MODEL_VERSIONS
+from src.monitoring import merge_metrics, with_labels
+
+from .cache import model_fingerprint
+from .pipeline import InferencePipeline
+from .predict import load_model
+
+# (model, fingerprint) -> started or startable pipeline for that model
+PipelineFactory = Callable[[torch.nn.Module, str], InferencePipeline]
+
+
+class ModelVersion:
+    """One resident checkpoint and the pipeline serving it."""
+
+    def __init__(self, name: str, path: Path, fingerprint: str, model: torch.nn.Module, load_ms: float = 0.0):
+        self.name = name
+        self.path = path
+        self.fingerprint = fingerprint
+        self.model = model
+        self.load_ms = load_ms
+        self.warmup_ms = 0.0
+        self.loaded_at = time.time()
+        self.pipeline: Optional[InferencePipeline] = None
+        self.in_flight = 0  # requests routed here (acquire) and not yet released
+
+    def describe(self) -> dict:
+        return {
+            "version": self.name,
+            "path": str(self.path),
+            "fingerprint": self.fingerprint,
+            "loaded_at": self.loaded_at,
+            "load_ms": round(self.load_ms, 2),
+            "warmup_ms": round(self.warmup_ms, 2),
+        }
+
+
+class ModelRegistry:
+    """
+    Keep up to max_versions models resident and route predictions between them.
+
+    Routing for a request: an explicitly requested version (e.g. from a header) wins;
+    otherwise a version is drawn from the traffic weights set with set_traffic (A/B);
+    otherwise the active version serves. An optional shadow version receives a copy
+    of traffic whose results are only compared, never returned.
+    """
+
+    def __init__(
+        self,
+        build_pipeline: PipelineFactory,
+        max_versions: int = MAX_MODEL_VERSIONS,
+        backend: str = "auto",
+        warmup_batch_sizes: Sequence[int] = (1,),
+        drain_timeout_s: float = 30.0,
+    ):
+        self.build_pipeline = build_pipeline
+        self.max_versions = max(1, max_versions)
+        self.backend = backend
+        self.warmup_batch_sizes = tuple(warmup_batch_sizes)
+        self.drain_timeout_s = drain_timeout_s
+        self._versions: Dict[str, ModelVersion] = {}
+        self._active: Optional[ModelVersion] = None
+        self._shadow: Optional[str] = None
+        self._traffic: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+        self._loading: Dict[str, float] = {}  # name (or path) -> load start time
+        self.load_errors: Dict[str, str] = {}
+        self.swaps = 0
+        # shadow version -> [compared, disagreed with the served label, failed]
+        self._shadow_stats: Dict[str, List[int]] = {}
+
+    # --- loading -------------------------------------------------------------------
+
+    def _evictable(self, incoming: str) -> List[ModelVersion]:
+        """Resident versions that could make room for incoming, oldest first."""
+        protected = {incoming, self._shadow, self._active.name if self._active else None}
+        protected.update(name for name, w in self._traffic.items() if w > 0)
+        return sorted(
+            (v for v in self._versions.values() if v.name not in protected), key=lambda v: v.loaded_at
+        )
+
+    def load(
+        self,
+        name: Optional[str],
+        path: Union[str, Path],
+        activate: bool = True,
+        model: Optional[torch.nn.Module] = None,
+    ) -> ModelVersion:
+        """
+        Load path as version name (default: first 12 hex digits of its SHA-256), start its
+        pipeline, warm it up with warmup_batch_sizes (so lazy initialisation of decode threads,
+        kernels and allocator happens before traffic) and register it; with activate, swap it in as the default model.
+        model may be passed if the checkpoint was already loaded (e.g. before fork).
+        Reloading an existing name replaces it. Raises ValueError if the registry is full of
+        versions that are active, shadowed or receiving traffic.
+        """
+        path = Path(path)
+        fingerprint = model_fingerprint(path)
+        name = name or fingerprint[:12]
+        with self._lock:
+            if name not in self._versions and len(self._versions) >= self.max_versions and not self._evictable(name):
+                raise ValueError(
+                    f"Registry full ({self.max_versions} versions in use); "
+                    "deactivate a version or remove its traffic first"
+                )
+        t0 = time.perf_counter()
+        if model is None:
+            model = load_model(path, backend=self.backend)
+        version = ModelVersion(name, path, fingerprint, model, (time.perf_counter() - t0) * 1000)
+        version.pipeline = self.build_pipeline(model, fingerprint).start()
+        try:
+            version.warmup_ms = version.pipeline.warm_up(self.warmup_batch_sizes)
+        except Exception:
+            version.pipeline.stop()
+            raise
+
+        retired = []
+        with self._lock:
+            old = self._versions.get(name)
+            if old is not None:
+                retired.append(old)
+            self._versions[name] = version
+            if activate or self._active is None or (old is not None and self._active is old):
+                if self._active is not version:
+                    self.swaps += self._active is not None
+                self._active = version
+            while len(self._versions) > self.max_versions:
+                candidates = self._evictable(name)
+                if not candidates:
+                    break
+                retired.append(self._versions.pop(candidates[0].name))
+            self.load_errors.pop(name, None)
+        for v in retired:
+            self._retire(v)
+        return version
+
+    def load_async(
+        self, name: Optional[str], path: Union[str, Path], activate: bool = True
+    ) -> "Future[ModelVersion]":
+        """Load on the background loader thread; the current versions keep serving meanwhile."""
+        key = name or str(path)
+
+        def run():
+            try:
+                return self.load(name, path, activate=activate)
+            except Exception as e:
+                self.load_errors[key] = str(e)
+                raise
+            finally:
+                self._loading.pop(key, None)
+
+        self._loading[key] = time.time()
+        return self._loader.submit(run)
+
+    def _retire(self, version: ModelVersion) -> None:
+        """Stop a version's pipeline once its in-flight requests finish (or drain_timeout_s passes)."""
+        def drain():
+            # The version left _versions under the lock, so acquire() can no longer return it
+            deadline = time.monotonic() + self.drain_timeout_s
+            while (version.in_flight or version.pipeline.pending) and time.monotonic() < deadline:
+                time.sleep(0.05)
+            version.pipeline.stop()
+
+        threading.Thread(target=drain, name=f"retire-{version.name}", daemon=True).start()
+
+    # --- routing -------------------------------------------------------------------
+
+    @property
+    def active(self) -> Optional[ModelVersion]:
+        return self._active
+
+    @property
+    def shadow(self) -> Optional[ModelVersion]:
+        return self._versions.get(self._shadow) if self._shadow else None
+
+    def get(self, name: str) -> ModelVersion:
+        try:
+            return self._versions[name]
+        except KeyError:
+            raise KeyError(f"Unknown model version {name!r}") from None
+
+    def activate(self, name: str) -> ModelVersion:
+        """Make name the default version (atomic reference swap)."""
+        with self._lock:
+            version = self.get(name)
+            if self._active is not version:
+                self._active = version
+                self.swaps += 1
+        return version
+
+    def set_traffic(self, weights: Dict[str, float]) -> None:
+        """Split default traffic between versions by relative weight; {} sends it all to the active one."""
+        with self._lock:
+            for name, w in weights.items():
+                self.get(name)
+                if w < 0:
+                    raise ValueError(f"Traffic weight for {name!r} must be >= 0")
+            if weights and sum(weights.values()) <= 0:
+                raise ValueError("Traffic weights must not all be zero")
+            self._traffic = dict(weights)
+
+    def set_shadow(self, name: Optional[str]) -> None:
+        """Mirror traffic to name (results compared, not returned); None disables shadowing."""
+        with self._lock:
+            if name is not None:
+                self.get(name)
+            self._shadow = name
+
+    def select(self, requested: Optional[str] = None) -> ModelVersion:
+        """Pick the version for one request (raises KeyError for an unknown requested version)."""
+        if requested:
+            return self.get(requested)
+        traffic = {n: w for n, w in self._traffic.items() if w > 0 and n in self._versions}
+        if traffic:
+            names = list(traffic)
+            return self._versions[random.choices(names, weights=[traffic[n] for n in names])[0]]
+        if self._active is None:
+            raise RuntimeError("No model version loaded")
+        return self._active
+
+    def acquire(self, requested: Optional[str] = None) -> ModelVersion:
+        """
+        select() a version and count the request as in flight on it until release(version),
+        so a swap or eviction meanwhile does not stop its pipeline under the request.
+        """
+        with self._lock:
+            version = self.select(requested)
+            version.in_flight += 1
+        return version
+
+    def release(self, version: ModelVersion) -> None:
+        with self._lock:
+            version.in_flight -= 1
+
+    @contextmanager
+    def use(self, requested: Optional[str] = None) -> Iterator[ModelVersion]:
+        """acquire() for the duration of a with block."""
+        version = self.acquire(requested)
+        try:
+            yield version
+        finally:
+            self.release(version)
+
+    async def shadow_predict(self, contents: Union[bytes, BinaryIO], served: Sequence[float], **predict_kwargs) -> None:
+        """
+        Run the shadow version on contents (with the same predict options, e.g. tta, as the served
+        request) and record whether its top class matches served.
+        """
+        with self._lock:
+            shadow = self.shadow
+            if shadow is None:
+                return
+            shadow.in_flight += 1
+        stats = self._shadow_stats.setdefault(shadow.name, [0, 0, 0])
+        try:
+            probs = await shadow.pipeline.predict(contents, **predict_kwargs)
+        except Exception:
+            stats[2] += 1  # saturated or failed; shadow traffic never affects the served response
+            return
+        finally:
+            self.release(shadow)
+        stats[0] += 1
+        stats[1] += int(np.argmax(probs)) != int(np.argmax(served))
+
+    # --- lifecycle and reporting ---------------------------------------------------
+
+    def describe(self) -> dict:
+        with self._lock:
+            versions = [v.describe() for v in self._versions.values()]
+        return {
+            "active": self._active.name if self._active else None,
+            "shadow": self._shadow,
+            "traffic": dict(self._traffic),
+            "versions": versions,
+            "loading": sorted(self._loading),
+            "load_errors": dict(self.load_errors),
+        }
+
+    def stop(self) -> None:
+        self._loader.shutdown(wait=True)
+        with self._lock:
+            versions = list(self._versions.values())
+            self._versions.clear()
+            self._active = None
+        for v in versions:
+            v.pipeline.stop()
+
+    def render_metrics(self) -> str:
+        """Per-version pipeline metrics labelled model_version, plus version state gauges."""
+        with self._lock:
+            versions = list(self._versions.values())
+            active = self._active
+        lines = [
+            "# HELP model_version_info Resident model versions (role: active, shadow or standby)",
+            "# TYPE model_version_info gauge",
+        ]
+        for v in versions:
+            role = "active" if v is active else ("shadow" if v.name == self._shadow else "standby")
+            lines.append(f'model_version_info{{model_version="{v.name}",fingerprint="{v.fingerprint[:12]}",role="{role}"}} 1')
+        lines += [
+            "",
+            "# HELP model_traffic_weight Relative share of default traffic routed to each version",
+            "# TYPE model_traffic_weight gauge",
+        ]
+        total = sum(self._traffic.values())
+        for v in versions:
+            share = self._traffic.get(v.name, 0) / total if total else float(v is active)
+            lines.append(f'model_traffic_weight{{model_version="{v.name}"}} {share}')
+        lines += [
+            "",
+            "# HELP model_swaps_total Times the active model version changed",
+            "# TYPE model_swaps_total counter",
+            f"model_swaps_total {self.swaps}",
+        ]
+        for metric, help_text, idx in (
+            ("shadow_predictions_total", "Shadow predictions compared with the served result", 0),
+            ("shadow_disagreements_total", "Shadow predictions whose top class differed from the served one", 1),
+            ("shadow_failures_total", "Shadow predictions dropped (saturated or failed)", 2),
+        ):
+            lines += ["", f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{model_version="{n}"}} {st[idx]}' for n, st in sorted(self._shadow_stats.items())]
+        text = "\n".join(lines) + "\n"
+        pipelines = [with_labels(v.pipeline.render_metrics(), model_version=v.name) for v in versions]
+        if pipelines:
+            text += "\n" + merge_metrics(pipelines)
+        return text
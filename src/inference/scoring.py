@@ -0,0 +1,293 @@
+"""
+Offline batch scoring: stream image paths through a process-pool decoder and large batched
+forward passes, writing results incrementally (JSONL or Parquet) with resumable progress.
+
+Paths come from splits.json or a directory walk, in a deterministic order, so a run can
+resume from the number of rows already written. After every batch the output is flushed and
+a small state file ({out}.state.json) records the row offset, the output size and the
+running metrics (a MetricsAccumulator state); on resume the output is cut back to that state, so a crash
+between the two writes never duplicates or loses rows. Memory stays bounded by
+batch_size x (prefetch + 1) decoded images whatever the number of inputs.
+
+With a test-time augmentation mode (src.inference.tta) each worker returns all views of its
+image; a batch then holds batch_size x views rows and the view probabilities are aggregated
+per image before writing.
+"""
+import functools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+
+from src.config import CLASS_NAMES, IMG_SIZE, SCORING_BATCH_SIZE, TTA_AGGREGATION
+from src.data import to_chw_float32
+from src.data.preprocess import _CAT_NAMES, _DOG_NAMES, IMAGE_EXTENSIONS
+from src.evaluation import MetricsAccumulator
+
+from .predict import predict_proba_batch
+from .tta import TTA_AGGREGATIONS, aggregate_views, num_views, tta_views
+
+# (path, true label index or None)
+Item = Tuple[str, Optional[int]]
+
+_FOLDER_LABELS = {**{name: 0 for name in _CAT_NAMES}, **{name: 1 for name in _DOG_NAMES}}
+
+
+def iter_split_items(splits_path: Union[str, Path], split_names: Sequence[str] = ("test",)) -> Iterator[Item]:
+    with open(splits_path) as f:
+        splits = json.load(f)
+    for name in split_names:
+        for item in splits.get(name, []):
+            yield item["path"], item.get("label")
+
+
+def iter_directory_items(root: Union[str, Path]) -> Iterator[Item]:
+    """Every image under root in sorted order; the label comes from a cat/dog parent folder name if any."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        label = _FOLDER_LABELS.get(os.path.basename(dirpath))
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(dirpath, name), label
+
+
+def _decode(path: str, tta: str = "none") -> Tuple[Optional[np.ndarray], Optional[str]]:
+    """Worker: uint8 (views, H, W, 3) pixels at the model size (a quarter of the float32 bytes to ship back)."""
+    try:
+        return tta_views(path, tta, IMG_SIZE), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+
+def _batches(items: Iterable[Item], size: int) -> Iterator[List[Item]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _JsonlSink:
+    def __init__(self, path: Path, size: Optional[int]):
+        self.path = path
+        mode = "r+b" if size is not None and path.exists() else "wb"
+        self._f = open(path, mode)
+        if size is not None and mode == "r+b":
+            actual = os.fstat(self._f.fileno()).st_size
+            if size > actual:
+                self._f.close()
+                raise ValueError(
+                    f"{path} has {actual} bytes but its state file records {size}; it was not written "
+                    "by the run being resumed (score again without resume)"
+                )
+            self._f.truncate(size)
+            self._f.seek(size)
+
+    def write(self, rows: List[dict]) -> None:
+        self._f.write("".join(json.dumps(r) + "\n" for r in rows).encode())
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    @property
+    def position(self) -> int:
+        return self._f.tell()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+class _ParquetSink:
+    """A directory of part files (Parquet files cannot be appended to); position = parts written."""
+
+    def __init__(self, path: Path, parts: Optional[int]):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+
+        self.path = path
+        # Explicit schema: a batch whose column is all null must not change the dataset's types
+        self.schema = pa.schema(
+            [("path", pa.string()), ("true_label", pa.string()), ("pred_label", pa.string())]
+            + [(f"prob_{name}", pa.float64()) for name in CLASS_NAMES]
+            + [("error", pa.string())]
+        )
+        path.mkdir(parents=True, exist_ok=True)
+        self.parts = parts or 0
+        missing = [i for i in range(self.parts) if not (path / f"part-{i:06d}.parquet").exists()]
+        if missing:
+            raise ValueError(
+                f"{path} lacks part {missing[0]} of the {self.parts} its state file records; it was not "
+                "written by the run being resumed (score again without resume)"
+            )
+        for stale in path.glob("part-*.parquet"):
+            if int(stale.stem.split("-")[1]) >= self.parts:
+                stale.unlink()
+
+    def write(self, rows: List[dict]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tmp = self.path / f".part-{self.parts:06d}.tmp"
+        pq.write_table(pa.Table.from_pylist(rows, schema=self.schema), tmp)
+        os.replace(tmp, self.path / f"part-{self.parts:06d}.parquet")
+        self.parts += 1
+
+    @property
+    def position(self) -> int:
+        return self.parts
+
+    def close(self) -> None:
+        pass
+
+
+def _state_path(out: Path) -> Path:
+    return out.with_name(out.name + ".state.json")
+
+
+def _write_state(out: Path, state: dict) -> None:
+    path = _state_path(out)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, path)
+
+
+def score_items(
+    model: torch.nn.Module,
+    items: Iterable[Item],
+    out: Union[str, Path],
+    fmt: str = "auto",
+    batch_size: int = SCORING_BATCH_SIZE,
+    workers: Optional[int] = None,
+    prefetch: int = 2,
+    resume: bool = False,
+    limit: Optional[int] = None,
+    progress_every_s: float = 10.0,
+    tta: str = "none",
+    tta_aggregation: str = TTA_AGGREGATION,
+) -> dict:
+    """
+    Score items and write one row per image to out. Returns (and keeps in the state file)
+    {"rows", "errors", "labelled", "correct", "accuracy", "confusion_matrix", "images_per_sec",
+    "metrics"}, metrics being MetricsAccumulator.compute() (per-class precision / recall, ROC AUC, ECE).
+    fmt is "jsonl", "parquet" or "auto" (by suffix). With resume, rows already recorded in the
+    state file are skipped. Decode failures are written with an error and left out of metrics.
+    tta / tta_aggregation select test-time augmentation views and how they are combined.
+    """
+    out = Path(out)
+    if fmt == "auto":
+        fmt = "parquet" if out.suffix == ".parquet" else "jsonl"
+    state = {"rows": 0, "errors": 0, "position": None}
+    metrics = MetricsAccumulator(len(CLASS_NAMES))
+    if resume and _state_path(out).exists():
+        state = json.loads(_state_path(out).read_text())
+        metrics = MetricsAccumulator.from_state_dict(state["metrics"])
+    elif not resume:
+        # A crash before this run's first batch must not resume from the previous run's state
+        _state_path(out).unlink(missing_ok=True)
+    start = state["rows"]
+    out.parent.mkdir(parents=True, exist_ok=True)
+    sink = _JsonlSink(out, state["position"]) if fmt == "jsonl" else _ParquetSink(out, state["position"])
+
+    def stream():
+        for i, item in enumerate(items):
+            if limit is not None and i >= limit:
+                return
+            if i >= start:
+                yield item
+
+    views = num_views(tta)
+    if tta_aggregation not in TTA_AGGREGATIONS:
+        raise ValueError(f"Unknown TTA aggregation {tta_aggregation!r}; expected one of {TTA_AGGREGATIONS}")
+    buffer = np.empty((batch_size * views, 3, IMG_SIZE[1], IMG_SIZE[0]), dtype=np.float32)
+    score = functools.partial(_score_batch, model, buffer=buffer, sink=sink, state=state, metrics=metrics,
+                              aggregation=tta_aggregation, forward_size=max(1, batch_size // views) * views)
+    decode = functools.partial(_decode, tta=tta)
+    scored = 0
+    t0 = last_report = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, batch_size // (workers * 4))
+            pending = deque()
+            batches = _batches(stream(), batch_size)
+            for batch in batches:
+                # Keep prefetch batches decoding while the current one runs through the model
+                pending.append((batch, pool.map(decode, [p for p, _ in batch], chunksize=chunksize)))
+                if len(pending) <= prefetch:
+                    continue
+                scored += score(*pending.popleft())
+                if time.perf_counter() - last_report >= progress_every_s:
+                    last_report = time.perf_counter()
+                    print(f"[SCORE] {state['rows']} rows ({scored / (last_report - t0):.1f} img/s)", flush=True)
+            while pending:
+                scored += score(*pending.popleft())
+    finally:
+        sink.close()
+    elapsed = time.perf_counter() - t0
+    summary = _summary(state, metrics, scored / elapsed if elapsed > 0 else 0.0)
+    summary["tta"] = tta
+    return summary
+
+
+def _score_batch(
+    model, batch: List[Item], decoded, buffer: np.ndarray, sink, state: dict, metrics: MetricsAccumulator,
+    aggregation: str = TTA_AGGREGATION, forward_size: Optional[int] = None,
+) -> int:
+    """Write one batch; forward passes of forward_size rows keep all views of an image together."""
+    rows, ok_rows = [], []
+    n_ok = n_views = 0
+    for (path, label), (pixels, error) in zip(batch, decoded):
+        row = {"path": path, "true_label": CLASS_NAMES[label] if label is not None else None, "pred_label": None}
+        row.update({f"prob_{name}": None for name in CLASS_NAMES})
+        row["error"] = error
+        if pixels is not None:
+            n_views = len(pixels)
+            to_chw_float32(pixels, out=buffer[n_ok * n_views : (n_ok + 1) * n_views])
+            ok_rows.append((row, label))
+            n_ok += 1
+        rows.append(row)
+    if n_ok:
+        probs = predict_proba_batch(model, buffer[: n_ok * n_views], chunk_size=forward_size)
+        probs = aggregate_views(probs, n_views, aggregation)
+        preds = probs.argmax(axis=1)
+        for (row, label), p, pred in zip(ok_rows, probs, preds):
+            row["pred_label"] = CLASS_NAMES[int(pred)]
+            row.update({f"prob_{name}": float(p[i]) for i, name in enumerate(CLASS_NAMES)})
+        labelled = [i for i, (_, label) in enumerate(ok_rows) if label is not None]
+        if labelled:
+            metrics.update(
+                torch.tensor([ok_rows[i][1] for i in labelled]), probs=torch.from_numpy(probs[labelled])
+            )
+    sink.write(rows)
+    state["rows"] += len(rows)
+    state["errors"] += len(rows) - n_ok
+    state["position"] = sink.position
+    state["metrics"] = metrics.state_dict()
+    _write_state(sink.path, state)
+    return n_ok
+
+
+def _summary(state: dict, metrics: MetricsAccumulator, images_per_sec: float) -> dict:
+    labelled = metrics.count
+    correct = int(metrics.confusion.trace())
+    return {
+        "rows": state["rows"],
+        "errors": state["errors"],
+        "labelled": labelled,
+        "correct": correct,
+        "accuracy": correct / labelled if labelled else None,
+        "confusion_matrix": metrics.confusion.tolist(),
+        "labels": list(CLASS_NAMES),
+        "images_per_sec": images_per_sec,
+        "metrics": metrics.compute(CLASS_NAMES) if labelled else None,
+    }
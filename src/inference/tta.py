@@ -0,0 +1,161 @@
+"""
+Test-time augmentation (TTA): several views of one image, scored in a single forward pass.
+
+Modes (views per image):
+- "none" (1): the whole image squashed to IMG_SIZE, exactly as predict() does
+- "flip" (2): that view and its horizontal mirror
+- "five_crop" (5): resize so the shorter side is TTA_CROP_RESIZE, then IMG_SIZE crops at the
+  center and the four corners (keeps the aspect ratio, so wide or off-centre pets stay in frame
+  in at least one crop)
+- "ten_crop" (10): the five crops and their mirrors
+- "multiscale" (1 + len(TTA_SCALES)): the squashed view plus a center crop after resizing
+  the shorter side to each of TTA_SCALES
+
+The image is decoded once (JPEG draft mode at the largest size any view needs) and every
+view is cut from that decode as uint8, then converted to float32 in one pass. The views of
+an image are consecutive rows of the batch; aggregate_views() folds them back into one
+probability vector per image.
+"""
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from src.config import CLASS_NAMES, IMG_SIZE, TTA_AGGREGATION, TTA_CROP_RESIZE, TTA_MODE, TTA_SCALES
+from src.data import decode_resized, to_chw_float32
+from src.data.decode import ImageSource, check_decode_size, open_image
+
+from .predict import predict_proba_batch
+
+TTA_MODES = ("none", "flip", "five_crop", "ten_crop", "multiscale")
+# mean: average probability; geometric: average log-probability, renormalised (a confident
+# wrong view weighs more); max: per-class maximum over views, renormalised
+TTA_AGGREGATIONS = ("mean", "geometric", "max")
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in TTA_MODES:
+        raise ValueError(f"Unknown TTA mode {mode!r}; expected one of {TTA_MODES}")
+
+
+def num_views(mode: str = TTA_MODE) -> int:
+    _check_mode(mode)
+    return {"none": 1, "flip": 2, "five_crop": 5, "ten_crop": 10, "multiscale": 1 + len(TTA_SCALES)}[mode]
+
+
+def _cover_scale(size: Tuple[int, int], short_side: int, target: Tuple[int, int]) -> float:
+    """Factor that resizes size so target scaled by short_side / min(target) fits inside it."""
+    k = short_side / min(target)
+    return max(target[0] * k / size[0], target[1] * k / size[1])
+
+
+def _resize(img: Image.Image, size: Tuple[int, int]) -> Image.Image:
+    return img if img.size == size else img.resize(size, Image.Resampling.BILINEAR)
+
+
+def _cover(img: Image.Image, short_side: int, target: Tuple[int, int]) -> np.ndarray:
+    f = _cover_scale(img.size, short_side, target)
+    size = (max(target[0], round(img.size[0] * f)), max(target[1], round(img.size[1] * f)))
+    return np.asarray(_resize(img, size))
+
+
+def _crop(arr: np.ndarray, target: Tuple[int, int], where: str) -> np.ndarray:
+    h, w = arr.shape[:2]
+    tw, th = target
+    top = {"center": (h - th) // 2, "tl": 0, "tr": 0, "bl": h - th, "br": h - th}[where]
+    left = {"center": (w - tw) // 2, "tl": 0, "tr": w - tw, "bl": 0, "br": w - tw}[where]
+    return arr[top : top + th, left : left + tw]
+
+
+def tta_views(
+    source: ImageSource,
+    mode: str = TTA_MODE,
+    target_size: Tuple[int, int] = IMG_SIZE,
+    timings: Optional[Dict[str, float]] = None,
+) -> np.ndarray:
+    """
+    Decode source once and return its views as uint8 (V, H, W, 3). If timings is given,
+    "decode" and "resize" (building every view) durations (ms) are recorded in it.
+    """
+    _check_mode(mode)
+    if mode == "none":
+        return np.asarray(decode_resized(source, target_size, timings=timings))[np.newaxis]
+    t0 = time.perf_counter()
+    short_sides = [TTA_CROP_RESIZE] if mode in ("five_crop", "ten_crop") else list(TTA_SCALES)
+    with open_image(source) as opened:
+        w, h = opened.size
+        f = max(_cover_scale((w, h), s, target_size) for s in short_sides)
+        draft_size = (max(target_size[0], math.ceil(w * f)), max(target_size[1], math.ceil(h * f)))
+        check_decode_size(opened, draft_size)
+        if opened.format == "JPEG":
+            opened.draft("RGB", draft_size)
+        img = opened.convert("RGB")
+    t1 = time.perf_counter()
+    if mode in ("five_crop", "ten_crop"):
+        covered = _cover(img, TTA_CROP_RESIZE, target_size)
+        views = [_crop(covered, target_size, w) for w in ("center", "tl", "tr", "bl", "br")]
+    else:
+        views = [np.asarray(_resize(img, tuple(target_size)))]
+        if mode == "multiscale":
+            views += [_crop(_cover(img, s, target_size), target_size, "center") for s in TTA_SCALES]
+    if mode in ("flip", "ten_crop"):
+        views += [v[:, ::-1] for v in views]
+    out = np.stack(views)
+    if timings is not None:
+        timings["decode"] = (t1 - t0) * 1000
+        timings["resize"] = (time.perf_counter() - t1) * 1000
+    return out
+
+
+def decode_views(
+    source: ImageSource,
+    mode: str = TTA_MODE,
+    out: Optional[np.ndarray] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> np.ndarray:
+    """
+    Views of source as model input, float32 (V, C, H, W) in [0, 1], optionally written into out
+    (e.g. V consecutive rows of a batch buffer). Adds "tensor_build" to timings when given.
+    """
+    views = tta_views(source, mode, IMG_SIZE, timings=timings)
+    t0 = time.perf_counter()
+    arr = to_chw_float32(views, out=out)
+    if timings is not None:
+        timings["tensor_build"] = (time.perf_counter() - t0) * 1000
+    return arr
+
+
+def aggregate_views(probs: np.ndarray, n_views: int, aggregation: str = TTA_AGGREGATION) -> np.ndarray:
+    """Fold (N * n_views, C) per-view probabilities, views of an image adjacent, into (N, C)."""
+    if aggregation not in TTA_AGGREGATIONS:
+        raise ValueError(f"Unknown TTA aggregation {aggregation!r}; expected one of {TTA_AGGREGATIONS}")
+    p = np.asarray(probs, dtype=np.float64).reshape(-1, n_views, probs.shape[-1])
+    if n_views == 1:
+        return p[:, 0].astype(np.float32)
+    if aggregation == "mean":
+        out = p.mean(axis=1)
+    elif aggregation == "geometric":
+        log_mean = np.log(np.clip(p, 1e-12, 1.0)).mean(axis=1)
+        out = np.exp(log_mean - log_mean.max(axis=1, keepdims=True))
+    else:
+        out = p.max(axis=1)
+    return (out / out.sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def predict_tta(
+    model,
+    image_path: Union[str, Path],
+    mode: str = TTA_MODE,
+    aggregation: str = TTA_AGGREGATION,
+) -> Dict[str, Any]:
+    """predict() with test-time augmentation: all views in one forward pass, then aggregated."""
+    views = decode_views(image_path, mode)
+    probs: List[float] = aggregate_views(predict_proba_batch(model, views), len(views), aggregation)[0].tolist()
+    return {
+        "label": CLASS_NAMES[int(np.argmax(probs))],
+        "probabilities": {CLASS_NAMES[i]: probs[i] for i in range(len(CLASS_NAMES))},
+        "tta": mode,
+    }
@@ -0,0 +1,19 @@
+from .metrics import LATENCY_BUCKETS_MS, Histogram, with_labels
+from .logs import get_structured_logger
+from .multiprocess import MetricsSnapshotWriter, merge_metrics, read_worker_metrics
+from .resources import cpu_quota, peak_rss_mb, reset_peak_rss
+from .startup import StartupProfile
+
+__all__ = [
+    "Histogram",
+    "LATENCY_BUCKETS_MS",
+    "MetricsSnapshotWriter",
+    "StartupProfile",
+    "cpu_quota",
+    "get_structured_logger",
+    "merge_metrics",
+    "peak_rss_mb",
+    "read_worker_metrics",
+    "reset_peak_rss",
+    "with_labels",
+]
@@ -0,0 +1,66 @@
+"""Structured (JSON lines) logging that never blocks the request path on stdout I/O."""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, event message and any `fields` extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def get_structured_logger(name: str, level: int = logging.INFO, max_queue: int = 10000) -> logging.Logger:
+    """
+    Return a logger whose records go through a bounded in-memory queue to a background
+    thread that formats and writes them to stdout. When the queue is full, records are
+    dropped rather than stalling the caller. Use logger.info("event", extra={"fields": {...}}).
+    A forked child (api/serve.py workers) gets a fresh queue and thread of its own, since
+    the parent's thread does not survive fork.
+    """
+    logger = logging.getLogger(name)
+    if any(isinstance(h, QueueHandler) for h in logger.handlers):
+        return logger
+    q: "queue.Queue" = queue.Queue(maxsize=max_queue)
+
+    class _DroppingQueueHandler(QueueHandler):
+        def enqueue(self, record):
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                pass
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    handler = _DroppingQueueHandler(q)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    listeners = [QueueListener(q, stream, respect_handler_level=False)]
+
+    def restart_in_child():
+        # The inherited queue's lock may have been held by the parent's listener thread
+        handler.queue = queue.Queue(maxsize=max_queue)
+        listeners[0] = QueueListener(handler.queue, stream, respect_handler_level=False)
+        listeners[0].start()
+
+    listeners[0].start()
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=restart_in_child)
+    atexit.register(lambda: listeners[0].stop())
+    return logger
@@ -0,0 +1,103 @@
+"""Lightweight Prometheus-style metric primitives (no external client library)."""
+import bisect
+import re
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+# Latency buckets (ms) shared by request and per-stage histograms
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+_SAMPLE_NAME = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{?)")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def with_labels(text: str, **labels: str) -> str:
+    """Add constant labels (e.g. model_version) to every sample line of Prometheus exposition text."""
+    extra = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    out = []
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            m = _SAMPLE_NAME.match(line)
+            if m:
+                rest = line[m.end():]
+                if m.group(2):  # existing label set: prepend ours
+                    line = f"{m.group(1)}{{{extra}" + ("," if not rest.startswith("}") else "") + rest
+                else:
+                    line = f"{m.group(1)}{{{extra}}}{rest}"
+        out.append(line)
+    return "\n".join(out) + ("\n" if text.endswith("\n") else "")
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram rendered in Prometheus text format.
+
+    Memory is constant per label combination: one counter per bucket plus sum and count.
+    Label values are passed to observe() as keyword arguments matching labelnames; keep
+    them low-cardinality (route templates, status codes, stage names).
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self.labelnames = tuple(labelnames)
+        # label values -> [bucket counts (last slot is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    def reset(self) -> None:
+        """Drop all observations (e.g. after warm-up traffic)."""
+        with self._lock:
+            self._series.clear()
+
+    @property
+    def count(self) -> int:
+        """Observations across all label combinations."""
+        with self._lock:
+            return sum(s[2] for s in self._series.values())
+
+    @property
+    def sum(self) -> float:
+        with self._lock:
+            return sum(s[1] for s in self._series.values())
+
+    def render(self) -> str:
+        """Return HELP/TYPE header plus cumulative _bucket, _sum and _count lines per label combination."""
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in sorted(self._series.items())]
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        if not snapshot and not self.labelnames:
+            snapshot = [((), [0] * (len(self.buckets) + 1), 0.0, 0)]
+        for key, counts, total, count in snapshot:
+            base = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            sep = "," if base else ""
+            suffix = f"{{{base}}}" if base else ""
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return "\n".join(lines) + "\n"
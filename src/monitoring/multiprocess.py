@@ -0,0 +1,144 @@
+"""
+Aggregate Prometheus text metrics across pre-forked server workers.
+
+Each worker periodically writes its own rendered metrics to {directory}/worker-{id}.prom
+(atomic rename). The worker answering a scrape merges its live text with the other
+workers' files: counters and histograms are summed; gauges are summed unless listed
+in gauge_agg with "max" or "min" (e.g. uptime, model_loaded).
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?\s+(\S+)$")
+_HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def _worker_file(directory: Union[str, Path], worker_id: Union[int, str]) -> Path:
+    return Path(directory) / f"worker-{worker_id}.prom"
+
+
+def parse_metrics(text: str) -> Tuple[Dict[str, Tuple[str, str]], "OrderedDict[Tuple[str, str], float]"]:
+    """Parse exposition text into ({family: (type, help)}, {(sample name, label string): value})."""
+    families: Dict[str, Tuple[str, str]] = {}
+    samples: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+    helps: Dict[str, str] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("# HELP "):
+            name, _, help_text = line[7:].partition(" ")
+            helps[name] = help_text
+        elif line.startswith("# TYPE "):
+            name, _, kind = line[7:].partition(" ")
+            families[name] = (kind.strip(), helps.get(name, ""))
+        elif line and not line.startswith("#"):
+            m = _SAMPLE.match(line)
+            if m:
+                key = (m.group(1), m.group(2) or "")
+                samples[key] = samples.get(key, 0.0) + float(m.group(3))
+    return families, samples
+
+
+def _family_of(sample_name: str, families: Dict[str, Tuple[str, str]]) -> str:
+    if sample_name in families:
+        return sample_name
+    for suffix in _HISTOGRAM_SUFFIXES:
+        if sample_name.endswith(suffix) and sample_name[: -len(suffix)] in families:
+            return sample_name[: -len(suffix)]
+    return sample_name
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def merge_metrics(texts: List[str], gauge_agg: Optional[Dict[str, str]] = None) -> str:
+    """Merge several workers' exposition texts into one, keeping the first text's family order."""
+    gauge_agg = gauge_agg or {}
+    families: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+    merged: "OrderedDict[str, OrderedDict[Tuple[str, str], float]]" = OrderedDict()
+    for text in texts:
+        fams, samples = parse_metrics(text)
+        for name, meta in fams.items():
+            families.setdefault(name, meta)
+            merged.setdefault(name, OrderedDict())
+        for key, value in samples.items():
+            family = _family_of(key[0], fams)
+            series = merged.setdefault(family, OrderedDict())
+            if key not in series:
+                series[key] = value
+                continue
+            kind = families.get(family, ("untyped", ""))[0]
+            how = gauge_agg.get(family, "sum") if kind == "gauge" else "sum"
+            if how == "max":
+                series[key] = max(series[key], value)
+            elif how == "min":
+                series[key] = min(series[key], value)
+            else:
+                series[key] += value
+    blocks = []
+    for family, series in merged.items():
+        lines = []
+        if family in families:
+            kind, help_text = families[family]
+            lines += [f"# HELP {family} {help_text}", f"# TYPE {family} {kind}"]
+        lines += [f"{name}{labels} {_format(v)}" for (name, labels), v in series.items()]
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks) + "\n"
+
+
+def read_worker_metrics(directory: Union[str, Path], exclude: Optional[Union[int, str]] = None) -> List[str]:
+    """Return the last metrics text written by every worker except exclude."""
+    skip = _worker_file(directory, exclude).name if exclude is not None else None
+    texts = []
+    for path in sorted(Path(directory).glob("worker-*.prom")):
+        if path.name == skip:
+            continue
+        try:
+            texts.append(path.read_text())
+        except OSError:
+            continue  # worker replaced its file mid-read; its next snapshot will be picked up
+    return texts
+
+
+class MetricsSnapshotWriter:
+    """Background thread that writes render() to this worker's file every interval_s (and on stop)."""
+
+    def __init__(
+        self,
+        directory: Union[str, Path],
+        worker_id: Union[int, str],
+        render: Callable[[], str],
+        interval_s: float = 1.0,
+    ):
+        self.path = _worker_file(directory, worker_id)
+        self.render = render
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self) -> None:
+        tmp = self.path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(self.render())
+        os.replace(tmp, self.path)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.write()
+
+    def start(self) -> "MetricsSnapshotWriter":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.write()
+        self._thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write()
@@ -0,0 +1,60 @@
+"""Startup profiling: wall-clock time of heavy imports and initialisation phases."""
+import importlib
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Sequence
+
+
+class StartupProfile:
+    """
+    Record how long each startup step takes, in ms, in the order the steps ran.
+
+    import_modules() times first imports individually ("import:torch"); a module already
+    in sys.modules records 0 because an earlier step paid for it. For a full per-module
+    tree, run the server with python -X importtime.
+    """
+
+    def __init__(self):
+        self.phases: "OrderedDict[str, float]" = OrderedDict()
+
+    def record(self, name: str, ms: float) -> None:
+        self.phases[name] = self.phases.get(name, 0.0) + ms
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - t0) * 1000)
+
+    def import_modules(self, names: Sequence[str]) -> None:
+        for name in names:
+            if name in sys.modules:
+                self.record(f"import:{name}", 0.0)
+                continue
+            with self.phase(f"import:{name}"):
+                importlib.import_module(name)
+
+    @property
+    def total_ms(self) -> float:
+        return sum(self.phases.values())
+
+    def report(self) -> str:
+        """Phases sorted slowest first, as an aligned text table."""
+        width = max((len(n) for n in self.phases), default=5)
+        lines = [f"{'phase':<{width}}  {'ms':>9}"]
+        for name, ms in sorted(self.phases.items(), key=lambda kv: -kv[1]):
+            lines.append(f"{name:<{width}}  {ms:9.1f}")
+        lines.append(f"{'total':<{width}}  {self.total_ms:9.1f}")
+        return "\n".join(lines)
+
+    def render_metrics(self) -> str:
+        lines = [
+            "# HELP startup_phase_duration_ms Time spent in each startup import or initialisation phase",
+            "# TYPE startup_phase_duration_ms gauge",
+        ]
+        lines += [f'startup_phase_duration_ms{{phase="{name}"}} {ms:.2f}' for name, ms in self.phases.items()]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,25 @@
+from .augment import BatchAugment
+from .checkpoint import EarlyStopping, load_checkpoint, save_checkpoint
+from .distributed import (
+    ShardSampler,
+    cleanup_distributed,
+    init_distributed,
+    is_main_process,
+    reduce_epoch_stats,
+)
+from .loop import evaluate, prepare_model, train_epoch
+
+__all__ = [
+    "BatchAugment",
+    "EarlyStopping",
+    "ShardSampler",
+    "cleanup_distributed",
+    "evaluate",
+    "init_distributed",
+    "is_main_process",
+    "load_checkpoint",
+    "prepare_model",
+    "reduce_epoch_stats",
+    "save_checkpoint",
+    "train_epoch",
+]
@@ -0,0 +1,101 @@
+"""Batch-level data augmentation on collated image tensors (no per-sample PIL work)."""
+import math
+from typing import Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+# ITU-R 601 luma weights, as used by torchvision's grayscale/saturation ops
+_LUMA = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+
+
+class BatchAugment:
+    """
+    Random flip, affine warp (rotation/translation/scale) and brightness/contrast/saturation
+    jitter applied to a whole (N, 3, H, W) batch at once.
+
+    Matches the ranges of the per-sample torchvision pipeline it replaces (RandomHorizontalFlip,
+    RandomRotation, RandomAffine, ColorJitter). The flip and all geometric transforms are folded
+    into one affine matrix per image and resampled with a single batched grid_sample; empty
+    borders are filled with black like torchvision. Pass seed to make a batch reproducible.
+    """
+
+    def __init__(
+        self,
+        flip_p: float = 0.5,
+        degrees: float = 15.0,
+        translate: Tuple[float, float] = (0.05, 0.05),
+        scale: Tuple[float, float] = (0.95, 1.05),
+        brightness: float = 0.2,
+        contrast: float = 0.2,
+        saturation: float = 0.2,
+    ):
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.translate = translate
+        self.scale = scale
+        self.brightness = brightness
+        self.contrast = contrast
+        self.saturation = saturation
+        self._generator = torch.Generator()
+
+    @classmethod
+    def flip_only(cls) -> "BatchAugment":
+        return cls(degrees=0.0, translate=(0.0, 0.0), scale=(1.0, 1.0), brightness=0.0, contrast=0.0, saturation=0.0)
+
+    @property
+    def _geometric(self) -> bool:
+        return bool(self.degrees or any(self.translate) or self.scale != (1.0, 1.0))
+
+    def _uniform(self, n: int, low: float, high: float) -> torch.Tensor:
+        return torch.rand(n, generator=self._generator) * (high - low) + low
+
+    def __call__(self, x: torch.Tensor, seed: Optional[int] = None) -> torch.Tensor:
+        """Augment a float [0, 1] or uint8 batch; returns float32 in [0, 1] on x's device."""
+        if seed is not None:
+            self._generator.manual_seed(seed)
+        if x.dtype == torch.uint8:
+            x = x.float().div_(255.0)
+        n = x.shape[0]
+        flip = torch.rand(n, generator=self._generator) < self.flip_p
+        if self._geometric:
+            x = self._affine(x, flip)
+        elif flip.any():
+            x = torch.where(flip.to(x.device).view(n, 1, 1, 1), x.flip(-1), x)
+        return self._color(x)
+
+    def _affine(self, x: torch.Tensor, flip: torch.Tensor) -> torch.Tensor:
+        n = x.shape[0]
+        angle = self._uniform(n, -self.degrees, self.degrees) * (math.pi / 180.0)
+        s = self._uniform(n, *self.scale)
+        # translate is a fraction of width/height; affine_grid coordinates span [-1, 1]
+        tx = self._uniform(n, -self.translate[0], self.translate[0]) * 2
+        ty = self._uniform(n, -self.translate[1], self.translate[1]) * 2
+        cos, sin = torch.cos(angle) / s, torch.sin(angle) / s
+        fx = torch.where(flip, -1.0, 1.0)
+        # theta maps output coords to input coords (inverse of scale*rotate+translate), then flips x
+        off_x = -(cos * tx + sin * ty)
+        off_y = -(-sin * tx + cos * ty)
+        theta = torch.stack([
+            torch.stack([cos * fx, sin * fx, off_x * fx], dim=1),
+            torch.stack([-sin, cos, off_y], dim=1),
+        ], dim=1).to(device=x.device, dtype=x.dtype)
+        grid = F.affine_grid(theta, list(x.shape), align_corners=False)
+        return F.grid_sample(x, grid, mode="bilinear", padding_mode="zeros", align_corners=False)
+
+    def _color(self, x: torch.Tensor) -> torch.Tensor:
+        n = x.shape[0]
+        view = (n, 1, 1, 1)
+        luma = _LUMA.to(device=x.device, dtype=x.dtype)
+        if self.brightness:
+            b = self._uniform(n, 1 - self.brightness, 1 + self.brightness).to(x.device).view(view)
+            x = (x * b).clamp_(0, 1)
+        if self.contrast:
+            c = self._uniform(n, 1 - self.contrast, 1 + self.contrast).to(x.device).view(view)
+            mean = (x * luma).sum(dim=1, keepdim=True).mean(dim=(2, 3), keepdim=True)
+            x = ((x - mean) * c + mean).clamp_(0, 1)
+        if self.saturation:
+            s = self._uniform(n, 1 - self.saturation, 1 + self.saturation).to(x.device).view(view)
+            gray = (x * luma).sum(dim=1, keepdim=True)
+            x = ((x - gray) * s + gray).clamp_(0, 1)
+        return x
@@ -0,0 +1,126 @@
+"""
+Training checkpoints and early stopping.
+
+A checkpoint holds everything needed to continue a run exactly where it stopped: model,
+optimizer and LR-scheduler state, the next epoch to run, the Python / NumPy / torch RNG
+states (the DataLoader shuffle draws from torch's global generator), plus any extra
+entries the caller adds (history, early-stopping state, MLflow run id). Files are written
+to a temporary name and renamed, so a preempted job never leaves a truncated checkpoint.
+"""
+import os
+import random
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+import torch
+
+LAST_CHECKPOINT = "last.pt"
+BEST_CHECKPOINT = "best.pt"
+
+
+def capture_rng_state() -> Dict[str, Any]:
+    state = {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state: Dict[str, Any]) -> None:
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def _atomic_save(obj: Any, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+
+def save_checkpoint(
+    path: Union[str, Path],
+    model: torch.nn.Module,
+    optimizer: torch.optim.Optimizer,
+    scheduler: Optional[Any],
+    epoch: int,
+    **extra: Any,
+) -> Path:
+    """Write a resumable checkpoint; epoch is the number of completed epochs."""
+    path = Path(path)
+    _atomic_save(
+        {
+            "epoch": epoch,
+            "model": model.state_dict(),
+            "optimizer": optimizer.state_dict(),
+            "scheduler": scheduler.state_dict() if scheduler is not None else None,
+            "rng": capture_rng_state(),
+            **extra,
+        },
+        path,
+    )
+    return path
+
+
+def load_checkpoint(
+    path: Union[str, Path],
+    model: torch.nn.Module,
+    optimizer: Optional[torch.optim.Optimizer] = None,
+    scheduler: Optional[Any] = None,
+    map_location: Union[str, torch.device] = "cpu",
+    restore_rng: bool = True,
+) -> Dict[str, Any]:
+    """Restore state written by save_checkpoint into the given objects; returns the checkpoint dict."""
+    # Our own files: they contain RNG state tuples and NumPy arrays, which weights_only rejects
+    ckpt = torch.load(path, map_location=map_location, weights_only=False)
+    model.load_state_dict(ckpt["model"])
+    if optimizer is not None:
+        optimizer.load_state_dict(ckpt["optimizer"])
+    if scheduler is not None and ckpt.get("scheduler") is not None:
+        scheduler.load_state_dict(ckpt["scheduler"])
+    if restore_rng and "rng" in ckpt:
+        restore_rng_state(ckpt["rng"])
+    return ckpt
+
+
+class EarlyStopping:
+    """
+    Stop after patience epochs without improving the monitored value by more than min_delta.
+    mode="max" for accuracy-like metrics, "min" for losses; patience <= 0 never stops.
+    """
+
+    def __init__(self, patience: int = 3, mode: str = "max", min_delta: float = 0.0):
+        if mode not in ("max", "min"):
+            raise ValueError("mode must be 'max' or 'min'")
+        self.patience = patience
+        self.mode = mode
+        self.min_delta = min_delta
+        self.best: Optional[float] = None
+        self.best_epoch = -1
+        self.bad_epochs = 0
+
+    def improved(self, value: float) -> bool:
+        if self.best is None:
+            return True
+        if self.mode == "max":
+            return value > self.best + self.min_delta
+        return value < self.best - self.min_delta
+
+    def step(self, value: float, epoch: int) -> bool:
+        """Record one epoch's value; True when training should stop."""
+        if self.improved(value):
+            self.best, self.best_epoch, self.bad_epochs = float(value), epoch, 0
+        else:
+            self.bad_epochs += 1
+        return self.patience > 0 and self.bad_epochs >= self.patience
+
+    def state_dict(self) -> Dict[str, Any]:
+        return {"best": self.best, "best_epoch": self.best_epoch, "bad_epochs": self.bad_epochs}
+
+    def load_state_dict(self, state: Dict[str, Any]) -> None:
+        self.best = state["best"]
+        self.best_epoch = state["best_epoch"]
+        self.bad_epochs = state["bad_epochs"]
@@ -0,0 +1,104 @@
+"""
+Data-parallel training across CPU processes (and nodes) with torch.distributed + gloo.
+
+Launch with torchrun, which sets RANK / WORLD_SIZE / LOCAL_WORLD_SIZE / MASTER_ADDR:
+    torchrun --nproc_per_node 4 scripts/train.py --distributed
+    torchrun --nnodes 2 --node_rank 0 --nproc_per_node 8 --master_addr HOST --master_port 29500 \\
+        scripts/train.py --distributed
+
+Each rank trains on its own shard of the training set (DistributedSampler) and DDP averages
+gradients after every backward. Validation shards are not padded, so all-reduced metrics
+count every image exactly once.
+"""
+import os
+from typing import Dict, Iterator, Optional
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+
+from src.monitoring import cpu_quota
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+
+def init_distributed(backend: str = "gloo", num_threads: Optional[int] = None) -> int:
+    """
+    Join the process group described by torchrun's environment variables; returns the rank.
+    Intra-op threads are set to num_threads, or the CPU quota split between the processes on
+    this node (torchrun otherwise defaults OMP_NUM_THREADS to 1).
+    """
+    if not is_distributed():
+        dist.init_process_group(backend=backend, init_method="env://")
+    local_world = int(os.environ.get("LOCAL_WORLD_SIZE", get_world_size()))
+    torch.set_num_threads(num_threads or max(1, cpu_quota() // max(local_world, 1)))
+    return get_rank()
+
+
+def cleanup_distributed() -> None:
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def barrier() -> None:
+    if is_distributed():
+        dist.barrier()
+
+
+def all_reduce_sum(values: Dict[str, float]) -> Dict[str, float]:
+    """Sum scalar values over all ranks (one collective for the whole dict)."""
+    if not is_distributed():
+        return dict(values)
+    keys = sorted(values)
+    t = torch.tensor([float(values[k]) for k in keys], dtype=torch.float64)
+    dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return dict(zip(keys, t.tolist()))
+
+
+def reduce_epoch_stats(stats: dict) -> dict:
+    """
+    Combine train_epoch results from all ranks: loss averaged over every rank's batches,
+    images summed, wall time of the slowest rank (so images_per_sec is the global rate).
+    """
+    if not is_distributed():
+        return stats
+    t = torch.tensor([stats["seconds"], stats["peak_memory_mb"]], dtype=torch.float64)
+    dist.all_reduce(t, op=dist.ReduceOp.MAX)
+    sums = all_reduce_sum({"loss": stats["loss"], "images": stats["images"]})
+    seconds = t[0].item()
+    return {
+        "loss": sums["loss"] / get_world_size(),
+        "images": int(sums["images"]),
+        "seconds": seconds,
+        "images_per_sec": sums["images"] / seconds if seconds > 0 else 0.0,
+        "peak_memory_mb": t[1].item(),  # largest single process
+    }
+
+
+class ShardSampler(Sampler):
+    """Every world_size-th index starting at rank, without DistributedSampler's padding (for evaluation)."""
+
+    def __init__(self, dataset, rank: Optional[int] = None, world_size: Optional[int] = None):
+        self.n = len(dataset)
+        self.rank = get_rank() if rank is None else rank
+        self.world_size = get_world_size() if world_size is None else world_size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.rank, self.n, self.world_size))
+
+    def __len__(self) -> int:
+        return len(range(self.rank, self.n, self.world_size))
@@ -0,0 +1,140 @@
+"""
+Training and evaluation loops with an optional CPU performance mode.
+
+- amp_dtype=torch.bfloat16 runs forward passes under autocast (weights, gradients and the
+  optimizer state stay float32; bf16 has float32's exponent range, so no loss scaling).
+  It pays off on CPUs with native bf16 (AVX512-BF16 / AMX); elsewhere it can be slower.
+- channels_last stores activations NHWC, the layout oneDNN convolutions run fastest in.
+- accumulation_steps > 1 sums gradients over several loader batches before each optimizer
+  step: an effective batch of batch_size x accumulation_steps in the memory of one batch.
+  Under DistributedDataParallel the intermediate backwards skip the gradient all-reduce.
+"""
+import contextlib
+import time
+from typing import Callable, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+from src.evaluation import MetricsAccumulator
+from src.monitoring import peak_rss_mb, reset_peak_rss
+
+
+def _autocast(device: torch.device, amp_dtype: Optional[torch.dtype]):
+    if amp_dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=device.type, dtype=amp_dtype)
+
+
+def prepare_model(
+    model: nn.Module, channels_last: bool = False, compile_model: bool = False, ddp: bool = False
+) -> nn.Module:
+    """
+    Apply the memory format in place, then optionally wrap with DistributedDataParallel and
+    torch.compile. Returns the module to train; keep the original for state_dict() (wrappers
+    prefix its keys) and for evaluation.
+    """
+    if channels_last:
+        model.to(memory_format=torch.channels_last)
+    if ddp:
+        model = nn.parallel.DistributedDataParallel(model)
+    return torch.compile(model) if compile_model else model
+
+
+def _peak_memory_mb(device: torch.device) -> float:
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device) / (1024 * 1024)
+    return peak_rss_mb()
+
+
+def _reset_peak_memory(device: torch.device) -> None:
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+    else:
+        reset_peak_rss()
+
+
+def train_epoch(
+    model: nn.Module,
+    loader,
+    criterion: Callable,
+    optimizer: torch.optim.Optimizer,
+    device: torch.device,
+    augment: Optional[Callable] = None,
+    seed: int = 0,
+    amp_dtype: Optional[torch.dtype] = None,
+    channels_last: bool = False,
+    accumulation_steps: int = 1,
+) -> dict:
+    """
+    One pass over loader. Returns {"loss" (mean per batch), "images", "seconds",
+    "images_per_sec", "peak_memory_mb"} (peak RSS on CPU, peak allocated on CUDA).
+    """
+    model.train()
+    accumulation_steps = max(1, accumulation_steps)
+    _reset_peak_memory(device)
+    total_loss = 0.0
+    images = 0
+    n_batches = len(loader)
+    optimizer.zero_grad(set_to_none=True)
+    t0 = time.perf_counter()
+    for i, (x, y) in enumerate(loader):
+        x, y = x.to(device), y.to(device)
+        if augment is not None:
+            x = augment(x, seed=seed + i)
+        if channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        stepping = (i + 1) % accumulation_steps == 0 or i + 1 == n_batches
+        # DDP: only the backward before an optimizer step needs to all-reduce gradients
+        sync = contextlib.nullcontext() if stepping or not hasattr(model, "no_sync") else model.no_sync()
+        with sync:
+            with _autocast(device, amp_dtype):
+                logits = model(x)
+            loss = criterion(logits.float(), y)
+            # Scale so accumulated gradients average over the group (the last group may be shorter)
+            group = min(accumulation_steps, n_batches - (i // accumulation_steps) * accumulation_steps)
+            (loss / group).backward()
+        if stepping:
+            optimizer.step()
+            optimizer.zero_grad(set_to_none=True)
+        total_loss += loss.item()
+        images += y.shape[0]
+    seconds = time.perf_counter() - t0
+    return {
+        "loss": total_loss / max(n_batches, 1),
+        "images": images,
+        "seconds": seconds,
+        "images_per_sec": images / seconds if seconds > 0 else 0.0,
+        "peak_memory_mb": _peak_memory_mb(device),
+    }
+
+
+@torch.no_grad()
+def evaluate(
+    model: nn.Module,
+    loader,
+    device: torch.device,
+    amp_dtype: Optional[torch.dtype] = None,
+    channels_last: bool = False,
+    distributed: bool = False,
+    num_classes: int = 2,
+) -> Tuple[float, float, MetricsAccumulator]:
+    """
+    Returns (mean loss per image, accuracy, MetricsAccumulator with the confusion matrix,
+    ROC and calibration counts). Memory does not grow with the dataset. With distributed,
+    each rank passes its shard of the data and all ranks get the metrics of the whole set.
+    """
+    model.eval()
+    metrics = MetricsAccumulator(num_classes)
+    criterion = nn.CrossEntropyLoss()
+    for x, y in loader:
+        x, y = x.to(device), y.to(device)
+        if channels_last:
+            x = x.contiguous(memory_format=torch.channels_last)
+        with _autocast(device, amp_dtype):
+            logits = model(x)
+        logits = logits.float()
+        metrics.update(y, logits=logits, loss=criterion(logits, y).item())
+    if distributed:
+        metrics.all_reduce()
+    return metrics.loss, metrics.accuracy, metrics
@@ -0,0 +1,319 @@
+"""Tests for the FastAPI inference service (uses a randomly initialised model)."""
+import io
+import json
+import re
+import struct
+import time
+import zlib
+
+import pytest
+import torch
+from fastapi.testclient import TestClient
+import numpy as np
+from PIL import Image
+
+from src.model import get_model
+
+
+def _jpeg_bytes(size=(64, 48), color=(120, 80, 40)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, color=color).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    model_path = tmp_path / "model.pt"
+    torch.save(get_model(num_classes=2).state_dict(), model_path)
+    monkeypatch.setenv("MODEL_PATH", str(model_path))
+    monkeypatch.setenv("WARMUP_BATCH_SIZES", "1,2")  # keep per-test startup short
+    monkeypatch.setenv("JOB_DB_PATH", str(tmp_path / "jobs.sqlite"))
+    import api.main as main
+
+    monkeypatch.setattr(main, "_model", None)
+    monkeypatch.setattr(main, "_registry", None)
+    with TestClient(main.app) as c:
+        yield c
+
+
+def test_health(client):
+    r = client.get("/health")
+    assert r.status_code == 200
+    assert r.json()["status"] == "ok"
+
+
+def test_predict_returns_label_and_probabilities(client):
+    r = client.post("/predict", files={"file": ("pet.jpg", _jpeg_bytes(), "image/jpeg")})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["label"] in ("cat", "dog")
+    assert abs(sum(body["probabilities"].values()) - 1.0) < 1e-3
+
+
+def test_predict_rejects_non_image(client):
+    r = client.post("/predict", files={"file": ("notes.txt", b"hello", "text/plain")})
+    assert r.status_code == 400
+
+
+def test_metrics_exposes_batching_histograms(client):
+    client.post("/predict", files={"file": ("pet.jpg", _jpeg_bytes(), "image/jpeg")})
+    text = client.get("/metrics").text
+    assert "inference_batch_size_bucket" in text
+    assert "inference_queue_wait_ms_count" in text
+
+
+def test_metrics_exposes_request_and_stage_latency_histograms(client):
+    client.post("/predict", files={"file": ("pet.jpg", _jpeg_bytes(), "image/jpeg")})
+    text = client.get("/metrics").text
+    assert 'http_request_duration_ms_bucket{endpoint="/predict",status="200",model_version="' in text
+    for stage in ("upload_read", "decode", "resize", "tensor_build", "queue_wait", "forward", "serialization"):
+        assert f'request_stage_duration_ms_count{{endpoint="/predict",stage="{stage}",status="200",model_version=' in text
+
+
+def test_predict_returns_429_when_pipeline_saturated(client, monkeypatch):
+    import api.main as main
+    from src.inference import QueueFullError
+
+    async def saturated(contents, timings=None, **options):
+        raise QueueFullError("Inference pipeline saturated")
+
+    monkeypatch.setattr(main.get_pipeline(), "predict", saturated)
+    r = client.post("/predict", files={"file": ("pet.jpg", _jpeg_bytes(), "image/jpeg")})
+    assert r.status_code == 429
+    assert r.headers["retry-after"] == "1"
+    assert client.get("/health").status_code == 200
+
+
+def test_predict_batch_multipart_reports_per_item_errors(client):
+    files = [
+        ("files", ("a.jpg", _jpeg_bytes(color=(250, 250, 250)), "image/jpeg")),
+        ("files", ("broken.jpg", b"\xff\xd8 not really a jpeg", "image/jpeg")),
+        ("files", ("b.jpg", _jpeg_bytes(size=(300, 120)), "image/jpeg")),
+    ]
+    r = client.post("/predict/batch", files=files)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == 3 and body["errors"] == 1
+    assert [res["filename"] for res in body["results"]] == ["a.jpg", "broken.jpg", "b.jpg"]
+    assert "error" in body["results"][1]
+    assert body["results"][0]["label"] in ("cat", "dog")
+
+
+def test_predict_batch_accepts_zip_archive(client):
+    import zipfile
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for i in range(4):
+            zf.writestr(f"listing/{i}.jpg", _jpeg_bytes(color=(i * 60, 10, 10)))
+        zf.writestr("listing/README.txt", "ignored")
+    r = client.post("/predict/batch", files={"archive": ("photos.zip", buf.getvalue(), "application/zip")})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == 4 and body["errors"] == 0
+
+
+def test_predict_batch_caps_uncompressed_archive_size(client, monkeypatch):
+    import zipfile
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for i in range(3):
+            zf.writestr(f"{i}.png", b"\0" * 100_000)  # ~100 bytes each compressed
+    monkeypatch.setenv("MAX_REQUEST_BYTES", "250000")
+    r = client.post("/predict/batch", files={"archive": ("photos.zip", buf.getvalue(), "application/zip")})
+    assert r.status_code == 413 and "uncompressed" in r.json()["detail"]
+    assert 'upload_rejected_total{reason="archive_too_large"} 1' in client.get("/metrics").text
+
+
+def test_predict_batch_requires_images(client):
+    r = client.post("/predict/batch", data={})
+    assert r.status_code in (400, 422)
+
+
+def test_repeated_upload_is_served_from_cache(client):
+    data = _jpeg_bytes(color=(5, 6, 7))
+    first = client.post("/predict", files={"file": ("pet.jpg", data, "image/jpeg")}).json()
+    second = client.post("/predict", files={"file": ("again.jpg", data, "image/jpeg")}).json()
+    assert first == second
+    assert re.search(r'^prediction_cache_hits_total\{model_version="[^"]+"\} 1$', client.get("/metrics").text, re.M)
+
+
+def test_model_admin_requires_token(client, monkeypatch):
+    monkeypatch.delenv("MODEL_ADMIN_TOKEN", raising=False)
+    assert client.post("/models/v2/activate").status_code == 403
+    monkeypatch.setenv("MODEL_ADMIN_TOKEN", "secret")
+    assert client.post("/models/v2/activate", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+
+def test_model_admin_is_refused_under_several_workers(client, monkeypatch):
+    monkeypatch.setenv("MODEL_ADMIN_TOKEN", "secret")
+    monkeypatch.setenv("SERVING_WORKERS", "2")
+    active = client.get("/models").json()["active"]
+    r = client.post(f"/models/{active}/activate", headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 409 and "2 workers" in r.json()["detail"]
+    r = client.put("/models/routing", json={"traffic": {}}, headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 409
+    monkeypatch.setenv("SERVING_WORKERS", "1")
+    assert client.post(f"/models/{active}/activate", headers={"X-Admin-Token": "secret"}).status_code == 200
+
+
+def test_hot_loaded_version_serves_pinned_requests(client, tmp_path, monkeypatch):
+    import api.main as main
+
+    monkeypatch.setenv("MODEL_ADMIN_TOKEN", "secret")
+    active = client.get("/models").json()["active"]
+    v2_path = tmp_path / "v2.pt"
+    torch.save(get_model(num_classes=2).state_dict(), v2_path)
+    r = client.post("/models/v2/load", json={"path": str(v2_path)}, headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 202
+    main._registry._loader.submit(lambda: None).result(timeout=60)  # wait for the background load
+    assert {v["version"] for v in client.get("/models").json()["versions"]} == {active, "v2"}
+
+    image = ("pet.jpg", _jpeg_bytes(), "image/jpeg")
+    assert client.post("/predict", files={"file": image}).json()["model_version"] == active
+    pinned = client.post("/predict", files={"file": image}, headers={"X-Model-Version": "v2"})
+    assert pinned.json()["model_version"] == "v2" and pinned.headers["x-model-version"] == "v2"
+    assert client.post("/predict", files={"file": image}, headers={"X-Model-Version": "nope"}).status_code == 404
+    assert 'http_request_duration_ms_count{endpoint="/predict",status="200",model_version="v2"} 1' in (
+        client.get("/metrics").text
+    )
+
+
+def test_shadow_gets_a_spooled_copy_of_the_upload(client, tmp_path, monkeypatch):
+    import api.main as main
+
+    monkeypatch.setenv("MODEL_ADMIN_TOKEN", "secret")
+    v2_path = tmp_path / "v2.pt"
+    torch.save(get_model(num_classes=2).state_dict(), v2_path)
+    client.post("/models/v2/load", json={"path": str(v2_path)}, headers={"X-Admin-Token": "secret"})
+    main._registry._loader.submit(lambda: None).result(timeout=60)
+    assert client.put("/models/routing", json={"shadow": "v2"}, headers={"X-Admin-Token": "secret"}).status_code == 200
+    mirrored = []
+    shadow_predict = main._registry.shadow_predict
+
+    async def spy(contents, served, **kwargs):
+        mirrored.append(contents)
+        await shadow_predict(contents, served, **kwargs)
+
+    monkeypatch.setattr(main._registry, "shadow_predict", spy)
+    assert client.post("/predict", files={"file": ("pet.jpg", _jpeg_bytes(), "image/jpeg")}).status_code == 200
+    deadline = time.monotonic() + 10
+    while not (mirrored and mirrored[0].closed):  # the copy is closed once the shadow prediction is done
+        assert time.monotonic() < deadline, "shadow prediction did not complete"
+        time.sleep(0.05)
+    assert len(mirrored) == 1 and not isinstance(mirrored[0], bytes)  # never read whole into memory
+    assert 'shadow_predictions_total{model_version="v2"} 1' in client.get("/metrics").text
+
+
+def test_ready_reports_warmed_model_and_startup_profile(client):
+    r = client.get("/ready")
+    assert r.status_code == 200
+    assert r.json()["status"] == "ready" and r.json()["model_version"]
+    text = client.get("/metrics").text
+    for phase in ("import:api.main", "import:torch", "model_load", "warmup"):
+        assert f'startup_phase_duration_ms{{phase="{phase}"}}' in text
+    # warm-up batches are not counted as served traffic
+    assert re.search(r'^inference_batch_size_count\{model_version="[^"]+"\} 0$', text, re.M)
+
+
+def test_ready_is_503_until_model_is_warm(monkeypatch):
+    import api.main as main
+
+    monkeypatch.setattr(main, "_ready", False)
+    assert main.ready().status_code == 503
+
+
+def test_existing_model_file_must_match_configured_sha256(tmp_path, monkeypatch):
+    import api.main as main
+    from src.artifacts import ChecksumMismatchError
+
+    model_path = tmp_path / "model.pt"
+    model_path.write_bytes(b"truncated download")
+    monkeypatch.setenv("MODEL_PATH", str(model_path))
+    monkeypatch.setenv("MODEL_SHA256", "0" * 64)
+    monkeypatch.delenv("MODEL_URL", raising=False)
+    monkeypatch.setattr(main, "_model_file", None)
+    with pytest.raises(ChecksumMismatchError):
+        main._ensure_model_file()
+
+
+def test_predict_with_tta_reports_mode_and_latency_label(client):
+    files = {"file": ("pet.jpg", _jpeg_bytes((320, 200)), "image/jpeg")}
+    r = client.post("/predict", params={"tta": "ten_crop", "tta_aggregation": "geometric"}, files=files)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["tta"] == "ten_crop" and abs(sum(body["probabilities"].values()) - 1.0) < 1e-3
+    r = client.post("/predict/batch", params={"tta": "flip"}, files=[("files", ("a.jpg", _jpeg_bytes(), "image/jpeg"))] * 2)
+    assert r.status_code == 200 and r.json()["tta"] == "flip" and r.json()["count"] == 2
+    assert client.post("/predict", params={"tta": "rotate"}, files=files).status_code == 400
+    text = client.get("/metrics").text
+    assert 'tta_request_duration_ms_count{endpoint="/predict",mode="ten_crop"} 1' in text
+    assert 'tta_request_duration_ms_count{endpoint="/predict/batch",mode="flip"} 1' in text
+
+
+def test_job_is_idempotent_and_streams_results(client):
+    files = [("files", (f"{i}.jpg", _jpeg_bytes(color=(i * 40, 80, 40)), "image/jpeg")) for i in range(5)]
+    files.append(("files", ("bad.jpg", b"not an image", "image/jpeg")))
+    r = client.post("/jobs", files=files)
+    assert r.status_code == 202
+    job_id = r.json()["job_id"]
+    assert r.headers["location"] == f"/jobs/{job_id}"
+    lines = client.get(f"/jobs/{job_id}/results").text.splitlines()  # follows the job until it is done
+    results = [json.loads(line) for line in lines]
+    assert [x["index"] for x in results] == list(range(6))
+    assert results[5]["filename"] == "bad.jpg" and "error" in results[5]
+    assert all(x["label"] in ("cat", "dog") for x in results[:5])
+    job = client.get(f"/jobs/{job_id}").json()
+    assert job["status"] == "done" and job["done"] == 6 and job["errors"] == 1
+    again = client.post("/jobs", files=files)
+    assert again.status_code == 200 and again.json()["job_id"] == job_id
+    assert client.post("/jobs", params={"tta": "flip"}, files=files).json()["job_id"] != job_id
+    assert client.get("/jobs/nope").status_code == 404
+    assert 'prediction_jobs{status="done"}' in client.get("/metrics").text
+
+
+def _noisy_png(size) -> bytes:
+    buf = io.BytesIO()
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def _png_bomb(width=9000, height=8000) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\0" * 64)) + chunk(b"IEND", b"")
+
+
+def test_uploads_are_limited_and_sniffed_before_decoding(client, monkeypatch):
+    big = client.post("/predict", files={"file": ("big.png", _noisy_png((900, 700)), "image/png")})
+    assert big.status_code == 200  # > 1 MiB: spooled to disk and decoded from there
+    bomb = client.post("/predict", files={"file": ("bomb.png", _png_bomb(), "image/png")})
+    assert bomb.status_code == 413 and "9000x8000" in bomb.json()["detail"]
+    fake = client.post("/predict", files={"file": ("fake.jpg", b"<html>not an image</html>", "image/jpeg")})
+    assert fake.status_code == 400
+    files = [("files", ("a.jpg", _jpeg_bytes(), "image/jpeg")), ("files", ("bomb.png", _png_bomb(), "image/png"))]
+    results = client.post("/predict/batch", files=files).json()["results"]
+    assert "label" in results[0] and "9000x8000" in results[1]["error"]
+
+    monkeypatch.setenv("MAX_UPLOAD_BYTES", "4096")
+    r = client.post("/predict", files={"file": ("pet.png", _noisy_png((60, 60)), "image/png")})
+    assert r.status_code == 413 and "limit 4096" in r.json()["detail"]  # small body, file over the limit
+    r = client.post("/predict", files={"file": ("big.png", _noisy_png((300, 300)), "image/png")})
+    assert r.status_code == 413  # Content-Length over the limit: refused before the body is read
+    # No Content-Length: the body is cut off once it crosses the limit
+    r = client.post(
+        "/predict",
+        content=iter([b"x" * 50_000] * 4),
+        headers={"Content-Type": "multipart/form-data; boundary=abc"},
+    )
+    assert r.status_code == 413
+
+    text = client.get("/metrics").text
+    assert 'upload_rejected_total{reason="body_too_large"} 2' in text
+    for reason in ("file_too_large", "too_many_pixels", "not_an_image"):
+        assert f'upload_rejected_total{{reason="{reason}"}} 1' in text
+    assert re.search(r"^upload_inflight_bytes 0$", text, re.M) and re.search(r"^upload_inflight_requests 0$", text, re.M)
+    assert 'http_request_duration_ms_count{endpoint="/predict",status="413",model_version=""} 4' in text
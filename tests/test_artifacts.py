@@ -0,0 +1,93 @@
+"""Tests for the resumable, checksummed artifact fetcher against a local HTTP server."""
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.artifacts import ChecksumMismatchError, fetch_artifact
+
+PAYLOAD = bytes(range(256)) * 4096  # 1 MiB
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves PAYLOAD with Range support; drops the connection once after cut_after bytes if set."""
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get("Range"))
+        start = 0
+        if self.headers.get("Range"):
+            start = int(self.headers["Range"].split("=")[1].split("-")[0])
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:]
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.cut_after is not None:
+            cut, server.cut_after = server.cut_after, None
+            self.wfile.write(body[:cut])
+            self.wfile.flush()
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.requests, srv.cut_after = [], None
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _url(srv):
+    return f"http://127.0.0.1:{srv.server_address[1]}/model.pt"
+
+
+SHA = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+def test_fetch_verifies_and_populates_content_addressed_cache(server, tmp_path):
+    dest = tmp_path / "models" / "model.pt"
+    out = fetch_artifact(_url(server), sha256=SHA, dest=dest, cache_dir=tmp_path / "cache")
+    assert out == dest and dest.read_bytes() == PAYLOAD
+    assert (tmp_path / "cache" / "sha256" / SHA).exists()
+    assert not list((tmp_path / "cache" / "partial").iterdir())
+    # A second fetch (e.g. another pod on the node) is served from the cache without the network
+    fetch_artifact(_url(server), sha256=SHA, dest=tmp_path / "other.pt", cache_dir=tmp_path / "cache")
+    assert len(server.requests) == 1
+
+
+def test_interrupted_download_resumes_with_range_request(server, tmp_path):
+    server.cut_after = 300_000
+    dest = tmp_path / "model.pt"
+    fetch_artifact(_url(server), sha256=SHA, dest=dest, cache_dir=tmp_path / "cache", backoff_s=0)
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests[0] is None and server.requests[1] == "bytes=300000-"
+
+
+def test_checksum_mismatch_leaves_no_artifact(server, tmp_path):
+    dest = tmp_path / "model.pt"
+    with pytest.raises(ChecksumMismatchError):
+        fetch_artifact(_url(server), sha256="0" * 64, dest=dest, cache_dir=tmp_path / "cache")
+    assert not dest.exists()
+    assert not (tmp_path / "cache" / "sha256").exists()
+    assert not list((tmp_path / "cache" / "partial").iterdir())
+
+
+def test_partial_file_from_previous_run_is_resumed(server, tmp_path):
+    part = tmp_path / "cache" / "partial" / f"{SHA}.part"
+    part.parent.mkdir(parents=True)
+    part.write_bytes(PAYLOAD[:123_456])
+    fetch_artifact(_url(server), sha256=SHA, cache_dir=tmp_path / "cache")
+    assert server.requests == ["bytes=123456-"]
+    assert (tmp_path / "cache" / "sha256" / SHA).read_bytes() == PAYLOAD
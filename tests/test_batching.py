@@ -0,0 +1,220 @@
+"""Unit tests for the inference micro-batcher."""
+import threading
+
+import numpy as np
+import pytest
+import torch
+
+from src.inference import (
+    InferencePipeline,
+    MicroBatcher,
+    QueueFullError,
+    predict_proba,
+    predict_proba_batch,
+)
+from src.model import get_model
+from src.monitoring import Histogram
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    m = get_model(num_classes=2)
+    m.eval()
+    return m
+
+
+def test_predict_proba_batch_matches_single(model):
+    x = np.random.rand(3, 3, 224, 224).astype(np.float32)
+    batch = predict_proba_batch(model, x)
+    assert batch.shape == (3, 2)
+    for i in range(3):
+        np.testing.assert_allclose(batch[i], predict_proba(model, x[i : i + 1]), atol=1e-5)
+
+
+def test_micro_batcher_returns_each_callers_result(model):
+    x = np.random.rand(4, 3, 224, 224).astype(np.float32)
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=200).start()
+    try:
+        futures = [batcher.submit(x[i]) for i in range(4)]
+        results = [f.result(timeout=10) for f in futures]
+    finally:
+        batcher.stop()
+    expected = predict_proba_batch(model, x)
+    np.testing.assert_allclose(np.array(results), expected, atol=1e-5)
+
+
+def test_micro_batcher_coalesces_concurrent_requests(model):
+    batcher = MicroBatcher(model, max_batch_size=8, max_wait_ms=500).start()
+    x = np.random.rand(3, 224, 224).astype(np.float32)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(batcher.submit(x).result(timeout=10))) for _ in range(8)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        batcher.stop()
+    assert len(results) == 8
+    # 8 requests within the wait window must be served by fewer forward passes
+    assert batcher.batch_size_hist.count < 8
+    assert batcher.queue_wait_hist.count == 8
+
+
+def test_micro_batcher_rejects_multi_image_submit(model):
+    batcher = MicroBatcher(model)
+    with pytest.raises(ValueError):
+        batcher.submit(np.zeros((2, 3, 224, 224), dtype=np.float32))
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("demo_ms", "Demo histogram", [1, 10])
+    for v in (0.5, 5, 50):
+        h.observe(v)
+    text = h.render()
+    assert 'demo_ms_bucket{le="1"} 1' in text
+    assert 'demo_ms_bucket{le="10"} 2' in text
+    assert 'demo_ms_bucket{le="+Inf"} 3' in text
+    assert "demo_ms_count 3" in text
+
+
+def test_micro_batcher_bounded_queue_raises_when_full(model):
+    # Not started, so nothing drains the queue
+    batcher = MicroBatcher(model, max_queue_size=2)
+    x = np.zeros((3, 224, 224), dtype=np.float32)
+    batcher.submit(x)
+    batcher.submit(x)
+    with pytest.raises(QueueFullError):
+        batcher.submit(x)
+
+
+def test_pipeline_predict_decodes_off_loop_and_rejects_when_saturated(model):
+    import asyncio
+    import io
+
+    from PIL import Image
+
+    buf = io.BytesIO()
+    Image.new("RGB", (80, 60), color=(10, 200, 30)).save(buf, format="PNG")
+    pipeline = InferencePipeline(model, decode_workers=1, num_threads=1, max_pending=1, max_wait_ms=1).start()
+
+    async def run():
+        probs = await pipeline.predict(buf.getvalue())
+        assert len(probs) == 2
+        first = asyncio.ensure_future(pipeline.predict(buf.getvalue()))
+        await asyncio.sleep(0)  # let the first request take the only slot
+        with pytest.raises(QueueFullError):
+            await pipeline.predict(buf.getvalue())
+        await first
+        with pytest.raises(ValueError):
+            await pipeline.predict(b"not an image")
+
+    try:
+        asyncio.run(run())
+    finally:
+        pipeline.stop()
+    assert pipeline.pending == 0
+
+
+def test_pipeline_hashes_cache_keys_in_decode_pool(model, monkeypatch):
+    import asyncio
+    import io
+
+    from PIL import Image
+
+    from src.inference import PredictionCache
+
+    buf = io.BytesIO()
+    Image.new("RGB", (80, 60), color=(10, 200, 30)).save(buf, format="PNG")
+    cache = PredictionCache(max_entries=8)
+    hashed_on = []
+    key = cache.key
+    monkeypatch.setattr(cache, "key", lambda contents: hashed_on.append(threading.current_thread().name) or key(contents))
+    pipeline = InferencePipeline(model, num_threads=1, max_wait_ms=1, cache=cache).start()
+
+    async def run():
+        first = await pipeline.predict(buf.getvalue())
+        assert await pipeline.predict(buf.getvalue()) == first
+        many = await pipeline.predict_many([buf.getvalue(), b"not an image"])
+        assert many[0] == first and isinstance(many[1], ValueError)
+
+    try:
+        asyncio.run(run())
+    finally:
+        pipeline.stop()
+    assert len(hashed_on) == 4 and all(name.startswith("decode") for name in hashed_on)
+    assert cache.hits == 2
+
+
+def test_submit_many_runs_chunked_forward_passes(model):
+    x = np.random.rand(5, 3, 224, 224).astype(np.float32)
+    batcher = MicroBatcher(model, max_batch_size=4, chunk_size=2, max_wait_ms=1).start()
+    try:
+        probs = batcher.submit_many(x).result(timeout=10)
+    finally:
+        batcher.stop()
+    assert probs.shape == (5, 2)
+    np.testing.assert_allclose(probs, predict_proba_batch(model, x), atol=1e-5)
+    assert batcher.batch_size_hist.count == 3  # chunks of 2, 2, 1
+
+
+def test_read_image_archive_tar_skips_non_images():
+    import io
+    import tarfile
+
+    from src.inference import read_image_archive
+
+    buf = io.BytesIO()
+    with tarfile.open(fileobj=buf, mode="w:gz") as tf:
+        for name, data in [("a.jpg", b"jpg-bytes"), ("notes.txt", b"x"), ("._b.jpg", b"resource fork")]:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+    assert read_image_archive(buf.getvalue(), max_files=10) == [("a.jpg", b"jpg-bytes")]
+    with pytest.raises(ValueError):
+        read_image_archive(b"definitely not an archive", max_files=10)
+
+
+def test_read_image_archive_caps_member_size_before_extracting():
+    import io
+    import zipfile
+
+    from src.inference import ArchiveTooLargeError, read_image_archive
+
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("small.jpg", b"x" * 100)
+        zf.writestr("bomb.png", b"\0" * 1_000_000)  # compresses to ~1 KB
+    assert read_image_archive(buf, max_files=10, max_member_bytes=10**6)[1] == ("bomb.png", b"\0" * 1_000_000)
+    with pytest.raises(ValueError, match="bomb.png"):
+        read_image_archive(buf, max_files=10, max_member_bytes=1000)
+    with pytest.raises(ArchiveTooLargeError, match="uncompressed"):
+        read_image_archive(buf, max_files=10, max_total_bytes=500_000)  # checked before bomb.png is extracted
+    with pytest.raises(ArchiveTooLargeError, match="more than 1 images"):
+        read_image_archive(buf, max_files=1)
+    spooled = read_image_archive(buf, max_files=10, spool_max_size=1024)
+    assert [name for name, _ in spooled] == ["small.jpg", "bomb.png"]
+    assert spooled[1][1].read() == b"\0" * 1_000_000 and spooled[1][1]._rolled  # past 1 KiB: on disk
+
+
+def test_pipeline_warm_up_runs_batches_and_resets_metrics(model):
+    pipeline = InferencePipeline(model, num_threads=1, max_batch_size=4).start()
+    try:
+        assert pipeline.warm_up((1, 3)) > 0
+        assert pipeline.batcher.batch_size_hist.count == 0
+        assert pipeline.batcher.queue_wait_hist.count == 0
+    finally:
+        pipeline.stop()
+
+
+def test_cancelled_request_is_skipped_and_worker_survives(model):
+    x = np.random.rand(2, 3, 224, 224).astype(np.float32)
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=200).start()
+    try:
+        cancelled = batcher.submit(x[0])
+        assert cancelled.cancel()
+        assert len(batcher.submit(x[1]).result(timeout=10)) == 2
+        assert len(batcher.submit(x[1]).result(timeout=10)) == 2  # worker thread still alive
+    finally:
+        batcher.stop()
@@ -0,0 +1,58 @@
+"""Unit tests for the content-hash prediction cache."""
+import time
+
+import torch
+
+from src.inference import PredictionCache, model_fingerprint
+from src.model import get_model
+
+
+def test_cache_hit_and_miss_counters():
+    cache = PredictionCache(max_entries=10)
+    cache.set_model_fingerprint("m1")
+    key = cache.key(b"image-bytes")
+    assert cache.get(key) is None
+    cache.put(key, [0.3, 0.7])
+    assert cache.get(key) == [0.3, 0.7]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert "prediction_cache_hits_total 1" in cache.render_metrics()
+
+
+def test_cache_evicts_least_recently_used():
+    cache = PredictionCache(max_entries=2)
+    a, b, c = (cache.key(x) for x in (b"a", b"b", b"c"))
+    cache.put(a, [1.0, 0.0])
+    cache.put(b, [0.0, 1.0])
+    cache.get(a)  # a is now most recent
+    cache.put(c, [0.5, 0.5])
+    assert cache.get(b) is None
+    assert cache.get(a) is not None and cache.get(c) is not None
+    assert cache.evictions == 1
+
+
+def test_cache_ttl_expires_entries(monkeypatch):
+    cache = PredictionCache(max_entries=10, ttl_seconds=10)
+    key = cache.key(b"x")
+    cache.put(key, [0.5, 0.5])
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 11)
+    assert cache.get(key) is None
+
+
+def test_cache_invalidated_when_model_fingerprint_changes(tmp_path):
+    p1, p2 = tmp_path / "a.pt", tmp_path / "b.pt"
+    torch.manual_seed(0)
+    torch.save(get_model().state_dict(), p1)
+    torch.manual_seed(1)
+    torch.save(get_model().state_dict(), p2)
+    cache = PredictionCache()
+    cache.set_model_fingerprint(model_fingerprint(p1))
+    stale_key = cache.key(b"img")
+    cache.put(stale_key, [0.1, 0.9])
+    cache.set_model_fingerprint(model_fingerprint(p1))
+    assert len(cache) == 1
+    cache.set_model_fingerprint(model_fingerprint(p2))
+    assert len(cache) == 0
+    # a result computed by the old model is not stored under the new fingerprint
+    cache.put(stale_key, [0.1, 0.9])
+    assert len(cache) == 0
@@ -0,0 +1,69 @@
+"""Unit tests for resumable training checkpoints and early stopping."""
+import random
+
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from src.training import EarlyStopping, load_checkpoint, save_checkpoint
+
+
+def _setup(seed=0):
+    torch.manual_seed(seed)
+    model = nn.Sequential(nn.Linear(4, 8), nn.Dropout(0.5), nn.Linear(8, 2))
+    opt = torch.optim.Adam(model.parameters(), lr=0.01)
+    sched = torch.optim.lr_scheduler.ReduceLROnPlateau(opt, patience=0)
+    return model, opt, sched
+
+
+def _step(model, opt, sched):
+    x, y = torch.randn(16, 4), torch.randint(0, 2, (16,))
+    loss = nn.functional.cross_entropy(model(x), y)
+    opt.zero_grad()
+    loss.backward()
+    opt.step()
+    sched.step(loss.item())
+    return loss.item()
+
+
+def test_resume_continues_exactly(tmp_path):
+    model, opt, sched = _setup()
+    for _ in range(3):
+        _step(model, opt, sched)
+    save_checkpoint(tmp_path / "last.pt", model, opt, sched, epoch=3, history={"loss": [1.0]})
+    expected = [_step(model, opt, sched) for _ in range(3)] + [random.random(), float(np.random.rand())]
+
+    resumed, opt2, sched2 = _setup(seed=123)
+    ckpt = load_checkpoint(tmp_path / "last.pt", resumed, opt2, sched2)
+    assert ckpt["epoch"] == 3 and ckpt["history"] == {"loss": [1.0]}
+    got = [_step(resumed, opt2, sched2) for _ in range(3)] + [random.random(), float(np.random.rand())]
+    assert got == expected
+    assert sched2.state_dict() == sched.state_dict()
+
+
+def test_save_checkpoint_leaves_no_temporary_files(tmp_path):
+    model, opt, sched = _setup()
+    save_checkpoint(tmp_path / "ckpt" / "best.pt", model, opt, None, epoch=1, val_acc=0.5)
+    assert [p.name for p in (tmp_path / "ckpt").iterdir()] == ["best.pt"]
+    ckpt = load_checkpoint(tmp_path / "ckpt" / "best.pt", model, restore_rng=False)
+    assert ckpt["val_acc"] == 0.5 and ckpt["scheduler"] is None
+
+
+def test_early_stopping_on_accuracy():
+    stopper = EarlyStopping(patience=2, mode="max", min_delta=0.01)
+    assert not stopper.step(0.70, 0)
+    assert not stopper.step(0.705, 1)  # within min_delta: not an improvement
+    assert stopper.step(0.69, 2)
+    assert stopper.best == 0.70 and stopper.best_epoch == 0
+
+    restored = EarlyStopping(patience=2)
+    restored.load_state_dict(stopper.state_dict())
+    assert restored.bad_epochs == 2 and not restored.step(0.8, 3)
+
+
+def test_early_stopping_disabled_and_invalid_mode():
+    stopper = EarlyStopping(patience=0, mode="min")
+    assert not any(stopper.step(1.0, e) for e in range(10))
+    with pytest.raises(ValueError):
+        EarlyStopping(mode="best")
@@ -0,0 +1,79 @@
+"""Two-process gloo tests for data-parallel training (run locally with torch.multiprocessing)."""
+import os
+import socket
+
+import pytest
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.utils.data import DataLoader, DistributedSampler, TensorDataset
+
+from src.training import ShardSampler, evaluate, prepare_model, reduce_epoch_stats, train_epoch
+
+pytestmark = pytest.mark.skipif(not dist.is_available(), reason="torch.distributed unavailable")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _data(n=23):
+    g = torch.Generator().manual_seed(0)
+    return TensorDataset(torch.rand(n, 3, 8, 8, generator=g), torch.randint(0, 2, (n,), generator=g))
+
+
+def _model():
+    torch.manual_seed(0)
+    return nn.Sequential(nn.Flatten(), nn.Linear(3 * 8 * 8, 16), nn.ReLU(), nn.Linear(16, 2))
+
+
+def _worker(rank, world_size, port, out_dir):
+    os.environ.update(MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port), RANK=str(rank), WORLD_SIZE=str(world_size))
+    dist.init_process_group("gloo", init_method="env://")
+    torch.set_num_threads(1)
+    try:
+        ds = _data()
+        model = _model()
+        ddp = prepare_model(model, ddp=True)
+        opt = torch.optim.SGD(model.parameters(), lr=0.1)
+        sampler = DistributedSampler(ds, shuffle=True, seed=0)
+        sampler.set_epoch(0)
+        loader = DataLoader(ds, batch_size=4, sampler=sampler)
+        stats = reduce_epoch_stats(
+            train_epoch(ddp, loader, nn.CrossEntropyLoss(), opt, torch.device("cpu"), accumulation_steps=2)
+        )
+        val = DataLoader(ds, batch_size=5, sampler=ShardSampler(ds))
+        loss, acc, metrics = evaluate(model, val, torch.device("cpu"), distributed=True)
+        torch.save(
+            {"params": [p.detach() for p in model.parameters()], "stats": stats, "acc": acc, "n": metrics.count},
+            os.path.join(out_dir, f"rank{rank}.pt"),
+        )
+    finally:
+        dist.destroy_process_group()
+
+
+def test_two_process_ddp_keeps_replicas_in_sync_and_reduces_metrics(tmp_path):
+    mp.spawn(_worker, args=(2, _free_port(), str(tmp_path)), nprocs=2, join=True)
+    r0, r1 = (torch.load(tmp_path / f"rank{r}.pt", weights_only=False) for r in (0, 1))
+    for a, b in zip(r0["params"], r1["params"]):
+        assert torch.equal(a, b)
+    assert not torch.equal(r0["params"][0], next(_model().parameters()))  # trained
+    # DistributedSampler pads 23 images to 2 x 12; every rank reports the global figures
+    assert r0["stats"]["images"] == r1["stats"]["images"] == 24
+    # Evaluation shards are unpadded and gathered: each image counted once, same result on both ranks
+    assert r0["n"] == r1["n"] == 23 and r0["acc"] == r1["acc"]
+
+    model = _model()
+    model.load_state_dict(dict(zip(model.state_dict(), r0["params"])))
+    _, acc, _ = evaluate(model, DataLoader(_data(), batch_size=5), torch.device("cpu"))
+    assert acc == pytest.approx(r0["acc"])
+
+
+def test_shard_sampler_partitions_without_padding():
+    ds = list(range(7))
+    shards = [list(ShardSampler(ds, rank=r, world_size=3)) for r in range(3)]
+    assert sorted(i for s in shards for i in s) == ds
+    assert [len(ShardSampler(ds, rank=r, world_size=3)) for r in range(3)] == [3, 2, 2]
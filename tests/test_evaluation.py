@@ -0,0 +1,72 @@
+"""Unit tests for streaming evaluation metrics."""
+import json
+
+import numpy as np
+import pytest
+import torch
+from sklearn.metrics import confusion_matrix, f1_score, precision_score, recall_score, roc_auc_score
+
+from src.evaluation import MetricsAccumulator
+
+
+def _data(n=500, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    targets = torch.randint(0, 2, (n,), generator=g)
+    logits = torch.randn(n, 2, generator=g) + torch.stack([1 - targets, targets], dim=1) * 0.8
+    return targets, logits
+
+
+def _accumulate(targets, logits, batch_size=64):
+    acc = MetricsAccumulator(2)
+    for start in range(0, len(targets), batch_size):
+        acc.update(targets[start : start + batch_size], logits=logits[start : start + batch_size])
+    return acc
+
+
+def test_matches_sklearn_on_full_arrays():
+    targets, logits = _data()
+    probs = torch.softmax(logits, dim=1).numpy()
+    preds = probs.argmax(axis=1)
+    y = targets.numpy()
+    report = _accumulate(targets, logits).compute(["cat", "dog"])
+    assert report["count"] == 500
+    assert report["accuracy"] == pytest.approx((preds == y).mean())
+    assert report["confusion_matrix"] == confusion_matrix(y, preds).tolist()
+    for i, name in enumerate(["cat", "dog"]):
+        assert report["per_class"][name]["precision"] == pytest.approx(precision_score(y, preds, pos_label=i))
+        assert report["per_class"][name]["recall"] == pytest.approx(recall_score(y, preds, pos_label=i))
+        assert report["per_class"][name]["f1"] == pytest.approx(f1_score(y, preds, pos_label=i))
+    # Exact up to the score bin width
+    assert report["roc_auc"] == pytest.approx(roc_auc_score(y, probs[:, 1]), abs=1e-3)
+
+
+def test_expected_calibration_error():
+    targets = torch.tensor([1, 1, 0, 0])
+    probs = torch.tensor([[0.1, 0.9], [0.1, 0.9], [0.1, 0.9], [0.9, 0.1]], dtype=torch.float64)
+    acc = MetricsAccumulator(2, calibration_bins=10)
+    acc.update(targets, probs=probs)
+    # One bin at confidence 0.9: 4 samples, 3 hits -> |0.75 - 0.9|
+    assert acc.expected_calibration_error() == pytest.approx(0.15)
+
+
+def test_loss_is_weighted_per_sample():
+    acc = MetricsAccumulator(2)
+    acc.update(torch.tensor([0, 1, 1]), probs=torch.tensor([[0.6, 0.4]] * 3), loss=1.0)
+    acc.update(torch.tensor([0]), probs=torch.tensor([[0.6, 0.4]]), loss=3.0)
+    assert acc.loss == pytest.approx(1.5)
+
+
+def test_auc_undefined_with_a_single_class():
+    acc = MetricsAccumulator(2)
+    acc.update(torch.tensor([1, 1]), probs=torch.tensor([[0.3, 0.7], [0.6, 0.4]]))
+    assert acc.roc_auc() is None and acc.compute()["roc_auc"] is None
+
+
+def test_merge_equals_single_pass_and_state_round_trips():
+    targets, logits = _data()
+    whole = _accumulate(targets, logits)
+    merged = _accumulate(targets[:200], logits[:200]).merge(_accumulate(targets[200:], logits[200:]))
+    assert merged.compute() == whole.compute()
+    restored = MetricsAccumulator.from_state_dict(json.loads(json.dumps(whole.state_dict())))
+    assert restored.compute() == whole.compute()
+    assert np.array_equal(restored.score_hist.numpy(), whole.score_hist.numpy())
@@ -0,0 +1,64 @@
+"""Unit tests for exported/quantized inference backends."""
+import numpy as np
+import pytest
+import torch
+
+from src.inference import load_model, predict_proba
+from src.inference.export import (
+    compare_to_reference,
+    fold_batchnorm,
+    quantize_dynamic_int8,
+    quantize_static_int8,
+    to_torchscript,
+)
+from src.model import get_model
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(0)
+    m = get_model(num_classes=2)
+    # non-trivial BatchNorm statistics so folding is actually exercised
+    m.train()
+    with torch.no_grad():
+        m(torch.rand(8, 3, 64, 64))
+    return m.eval()
+
+
+def test_fold_batchnorm_removes_bn_and_preserves_outputs(model):
+    folded = fold_batchnorm(model)
+    assert not any(isinstance(mod, torch.nn.BatchNorm2d) for mod in folded.modules())
+    x = torch.rand(2, 3, 224, 224)
+    with torch.no_grad():
+        assert torch.allclose(folded(x), model(x), atol=1e-4)
+
+
+def test_torchscript_export_round_trips_through_load_model(model, tmp_path):
+    path = tmp_path / "model.ts.pt"
+    torch.jit.save(to_torchscript(model), str(path))
+    loaded = load_model(path, backend="auto")
+    assert isinstance(loaded, torch.jit.ScriptModule)
+    x = np.random.rand(1, 3, 224, 224).astype(np.float32)
+    np.testing.assert_allclose(predict_proba(loaded, x), predict_proba(model, x), atol=1e-4)
+
+
+def test_int8_variants_stay_close_to_float(model):
+    batches = (x for x in [(torch.rand(4, 3, 224, 224), torch.tensor([0, 1, 0, 1]))])  # read once
+    report = compare_to_reference(
+        model,
+        {
+            "int8-dynamic": quantize_dynamic_int8(model),
+            "int8-static": quantize_static_int8(model, [torch.rand(4, 3, 224, 224) for _ in range(2)]),
+        },
+        batches,
+    )
+    assert set(report) == {"float32", "int8-dynamic", "int8-static"}
+    for name in ("int8-dynamic", "int8-static"):
+        assert report[name]["max_prob_delta"] < 0.05
+
+
+def test_load_model_rejects_unknown_backend(model, tmp_path):
+    path = tmp_path / "model.pt"
+    torch.save(model.state_dict(), path)
+    with pytest.raises(ValueError):
+        load_model(path, backend="tensorrt")
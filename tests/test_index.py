@@ -0,0 +1,78 @@
+"""Unit tests for the incremental SQLite dataset index and hash-based splits."""
+import os
+
+import pytest
+
+from src.data import DatasetIndex, scan_images, split_for
+
+
+def _write(path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+@pytest.fixture
+def raw(tmp_path):
+    root = tmp_path / "raw"
+    for i in range(20):
+        _write(root / "train" / "cats" / f"cat{i}.jpg", b"cat-%d" % i)
+        _write(root / "train" / "dogs" / f"dog{i}.PNG", b"dog-%d" % i)
+    _write(root / "train" / "dogs" / "notes.txt", b"not an image")
+    return root
+
+
+def test_scan_images_finds_both_classes(raw):
+    found = scan_images(raw, workers=4)
+    assert len(found) == 40
+    assert {label for _, label in found} == {0, 1}
+    assert all(p.suffix.lower() in (".jpg", ".png") for p, _ in found)
+
+
+def test_update_only_hashes_new_and_changed_files(raw, tmp_path):
+    with DatasetIndex(tmp_path / "index.sqlite", raw) as index:
+        assert index.update(workers=2) == {"added": 40, "changed": 0, "removed": 0, "unchanged": 0}
+        assert index.update(workers=2) == {"added": 0, "changed": 0, "removed": 0, "unchanged": 40}
+
+        changed = raw / "train" / "cats" / "cat0.jpg"
+        changed.write_bytes(b"re-encoded")
+        st = changed.stat()
+        os.utime(changed, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        (raw / "train" / "dogs" / "dog0.PNG").unlink()
+        _write(raw / "train" / "cats" / "new.jpeg", b"brand new")
+        assert index.update(workers=2) == {"added": 1, "changed": 1, "removed": 1, "unchanged": 38}
+        assert len(index) == 40
+
+
+def test_index_persists_between_runs(raw, tmp_path):
+    with DatasetIndex(tmp_path / "index.sqlite", raw) as index:
+        index.update()
+    with DatasetIndex(tmp_path / "index.sqlite", raw) as index:
+        assert index.update()["unchanged"] == 40
+
+
+def test_splits_are_stable_when_images_are_added(raw, tmp_path):
+    with DatasetIndex(tmp_path / "index.sqlite", raw) as index:
+        index.update()
+        before = index.splits(seed=7)
+        for i in range(30):
+            _write(raw / "train" / "dogs" / f"extra{i}.jpg", b"extra-%d" % i)
+        index.update()
+        after = index.splits(seed=7)
+    for old, new in zip(before, after):
+        assert set(old) <= set(new)
+    assert sum(len(s) for s in after) == 70
+
+
+def test_split_for_is_deterministic_and_follows_ratios():
+    digests = [f"{i:064x}" for i in range(2000)]
+    assigned = [split_for(d, 0.8, 0.1, seed=42) for d in digests]
+    assert assigned == [split_for(d, 0.8, 0.1, seed=42) for d in digests]
+    assert 0.75 < assigned.count("train") / 2000 < 0.85
+    assert assigned != [split_for(d, 0.8, 0.1, seed=1) for d in digests]
+
+
+def test_splits_ratios_must_sum_to_one(raw, tmp_path):
+    with DatasetIndex(tmp_path / "index.sqlite", raw) as index:
+        with pytest.raises(ValueError):
+            index.splits(0.5, 0.5, 0.1)
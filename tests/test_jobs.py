@@ -0,0 +1,165 @@
+"""Unit tests for the SQLite-backed asynchronous prediction job queue."""
+import asyncio
+import tempfile
+import time
+
+import pytest
+
+from src.inference import JobQueue, JobStore, LeaseLostError, QueueFullError
+
+ITEMS = [(f"{i}.jpg", bytes([i]) * 10) for i in range(7)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(tmp_path / "jobs.sqlite")
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_same_content_and_options_give_the_same_job(store):
+    job, created = store.submit(ITEMS, {"tta": "none"})
+    assert created and job["status"] == "queued" and job["total"] == 7
+    again, created = store.submit([("renamed.jpg", data) for _, data in ITEMS], {"tta": "none"})
+    assert not created and again["job_id"] == job["job_id"]
+    other, created = store.submit(ITEMS, {"tta": "flip"})
+    assert created and other["job_id"] != job["job_id"]
+
+
+def test_spooled_files_are_stored_like_bytes(store):
+    spooled = []
+    for name, data in ITEMS:
+        f = tempfile.SpooledTemporaryFile(max_size=4)  # rolled to disk
+        f.write(data)
+        spooled.append((name, f))  # left at EOF: submit reads from the start
+    job, created = store.submit(spooled, {})
+    assert created and store.submit(ITEMS, {})[0]["job_id"] == job["job_id"]
+    assert store.pending_items(job["job_id"], 100) == [(i, data) for i, (_, data) in enumerate(ITEMS)]
+
+
+def test_expired_lease_is_claimed_again(store):
+    job, _ = store.submit(ITEMS, {})
+    assert store.claim(lease_s=60)["job_id"] == job["job_id"]
+    assert store.claim(lease_s=60) is None  # leased
+    store.record(job["job_id"], [(0, {"label": "cat"})], lease_s=-1)  # lease already expired: worker died
+    reclaimed = store.claim(lease_s=60)
+    assert reclaimed["job_id"] == job["job_id"] and reclaimed["done"] == 1
+    assert [idx for idx, _ in store.pending_items(job["job_id"], 100)] == list(range(1, 7))
+
+
+def test_only_the_current_lease_holder_writes_results(store):
+    job, _ = store.submit(ITEMS, {})
+    stale = store.claim(lease_s=-1)["lease"]  # expires at once: the worker stalled
+    current = store.claim(lease_s=60)["lease"]
+    assert not store.renew(job["job_id"], stale) and store.renew(job["job_id"], current)
+    with pytest.raises(LeaseLostError):
+        store.record(job["job_id"], [(0, {"label": "stale"})], lease=stale)
+    store.finish(job["job_id"], lease=stale)
+    assert store.get(job["job_id"])["status"] == "running" and store.results(job["job_id"]) == []
+    store.record(job["job_id"], [(0, {"label": "cat"})], lease=current)
+    assert store.results(job["job_id"])[0]["label"] == "cat"
+
+
+def test_lease_is_renewed_while_waiting_for_pipeline_capacity(store):
+    busy_until = time.monotonic() + 0.6
+
+    async def process(payloads, options):
+        if time.monotonic() < busy_until:
+            raise QueueFullError("busy")
+        return [{"label": "dog"} for _ in payloads]
+
+    async def main():
+        queue = JobQueue(store, process, lease_s=0.3, poll_interval_s=0.05).start()
+        job, _ = await queue.submit(ITEMS, {})
+        await asyncio.sleep(0.45)  # past the lease taken at claim
+        stolen = await asyncio.to_thread(store.claim, 60)
+        results = [r async for r in queue.stream(job["job_id"])]
+        await queue.stop()
+        return job["job_id"], stolen, results
+
+    job_id, stolen, results = _run(main())
+    assert stolen is None and len(results) == 7
+    assert store.get(job_id)["status"] == "done"
+
+
+def test_results_stop_at_first_gap(store):
+    job, _ = store.submit(ITEMS, {})
+    store.record(job["job_id"], [(0, {"label": "cat"}), (1, {"error": "x"}), (3, {"label": "dog"})])
+    results = store.results(job["job_id"])
+    assert [r["index"] for r in results] == [0, 1] and results[1]["filename"] == "1.jpg"
+    assert store.get(job["job_id"])["errors"] == 1
+
+
+def test_queue_runs_jobs_in_chunks_and_retries_when_saturated(store):
+    calls = []
+
+    async def process(payloads, options):
+        calls.append(len(payloads))
+        if len(calls) == 2:
+            raise QueueFullError("busy")
+        return [{"label": "dog", "size": len(p)} for p in payloads]
+
+    async def main():
+        queue = JobQueue(store, process, workers=2, chunk_size=3, poll_interval_s=0.05).start()
+        job, created = await queue.submit(ITEMS, {"tta": "none"})
+        results = [r async for r in queue.stream(job["job_id"])]
+        await queue.stop()
+        return job, results
+
+    job, results = _run(main())
+    assert [r["index"] for r in results] == list(range(7))
+    assert calls == [3, 3, 3, 1]  # the rejected chunk was retried
+    done = store.get(job["job_id"])
+    assert done["status"] == "done" and done["done"] == 7
+    assert store.pending_items(job["job_id"], 100) == []  # uploads dropped once scored
+
+
+def test_failed_job_resumes_after_recorded_results_on_resubmit(store):
+    fail = {"on": True}
+
+    async def process(payloads, options):
+        if fail["on"] and len(payloads) < 3:
+            raise RuntimeError("model went away")
+        return [{"label": "cat"} for _ in payloads]
+
+    async def run_once():
+        queue = JobQueue(store, process, chunk_size=3, poll_interval_s=0.05).start()
+        job, created = await queue.submit(ITEMS, {})
+        while (await queue.get(job["job_id"]))["status"] not in ("done", "failed"):
+            await asyncio.sleep(0.02)
+        await queue.stop()
+        return job["job_id"], created
+
+    job_id, _ = _run(run_once())
+    failed = store.get(job_id)
+    assert failed["status"] == "failed" and "model went away" in failed["error"] and failed["done"] == 6
+    fail["on"] = False
+    job_id2, created = _run(run_once())
+    assert job_id2 == job_id and created
+    assert store.get(job_id)["status"] == "done" and len(store.results(job_id)) == 7
+
+
+def test_stop_releases_running_jobs_and_purge_removes_old_ones(store):
+    started = None
+
+    async def process(payloads, options):
+        started.set()
+        await asyncio.sleep(10)
+
+    async def main():
+        nonlocal started
+        started = asyncio.Event()
+        queue = JobQueue(store, process, poll_interval_s=0.05).start()
+        job, _ = await queue.submit(ITEMS, {})
+        await started.wait()
+        await queue.stop()
+        return job["job_id"]
+
+    job_id = _run(main())
+    assert store.get(job_id)["status"] == "queued"
+    store.finish(job_id)
+    assert store.purge(older_than_s=3600) == 0
+    time.sleep(0.01)
+    assert store.purge(older_than_s=0) == 1 and store.get(job_id) is None
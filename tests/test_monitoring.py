@@ -0,0 +1,81 @@
+"""Unit tests for the Prometheus metric primitives, multi-worker aggregation and structured logging."""
+import json
+import logging
+import time
+
+import pytest
+
+from src.monitoring import (
+    Histogram,
+    MetricsSnapshotWriter,
+    get_structured_logger,
+    merge_metrics,
+    read_worker_metrics,
+)
+from src.monitoring.logs import JsonFormatter
+
+
+def test_labelled_histogram_renders_one_series_per_label_set():
+    h = Histogram("req_ms", "Demo", [10, 100], labelnames=("endpoint", "status"))
+    h.observe(5, endpoint="/predict", status="200")
+    h.observe(50, endpoint="/predict", status="200")
+    h.observe(500, endpoint="/health", status="200")
+    text = h.render()
+    assert 'req_ms_bucket{endpoint="/predict",status="200",le="10"} 1' in text
+    assert 'req_ms_bucket{endpoint="/predict",status="200",le="+Inf"} 2' in text
+    assert 'req_ms_bucket{endpoint="/health",status="200",le="100"} 0' in text
+    assert 'req_ms_count{endpoint="/health",status="200"} 1' in text
+    assert h.count == 3 and h.sum == 555
+
+
+def test_histogram_rejects_mismatched_labels():
+    h = Histogram("req_ms", "Demo", [10], labelnames=("endpoint",))
+    with pytest.raises(ValueError):
+        h.observe(1, status="200")
+
+
+def test_json_formatter_includes_fields():
+    record = logging.LogRecord("api", logging.INFO, __file__, 1, "request", None, None)
+    record.fields = {"status": 200, "latency_ms": 1.5}
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["event"] == "request" and entry["level"] == "info"
+    assert entry["status"] == 200 and entry["latency_ms"] == 1.5
+
+
+def test_structured_logger_writes_json_lines_from_background_thread(capsys):
+    logger = get_structured_logger("test_monitoring.structured")
+    logger.info("request", extra={"fields": {"path": "/predict"}})
+    out = ""
+    deadline = time.monotonic() + 2
+    while not out and time.monotonic() < deadline:
+        time.sleep(0.01)
+        out += capsys.readouterr().out
+    assert json.loads(out.splitlines()[0])["path"] == "/predict"
+
+
+def test_merge_metrics_sums_counters_and_histograms_and_keeps_gauge_policy():
+    def worker(requests, uptime, hist):
+        h = Histogram("req_ms", "Demo", [10], labelnames=("endpoint",))
+        for v in hist:
+            h.observe(v, endpoint="/predict")
+        return (
+            "# HELP requests_total Requests\n# TYPE requests_total counter\n"
+            f"requests_total {requests}\n\n"
+            "# HELP uptime_seconds Uptime\n# TYPE uptime_seconds gauge\n"
+            f"uptime_seconds {uptime}\n\n" + h.render()
+        )
+
+    merged = merge_metrics([worker(3, 5.0, [1, 20]), worker(4, 9.0, [2])], gauge_agg={"uptime_seconds": "max"})
+    assert "requests_total 7" in merged
+    assert "uptime_seconds 9" in merged
+    assert 'req_ms_bucket{endpoint="/predict",le="10"} 2' in merged
+    assert 'req_ms_count{endpoint="/predict"} 3' in merged
+    assert merged.count("# TYPE req_ms histogram") == 1
+
+
+def test_snapshot_writer_files_are_read_back_excluding_self(tmp_path):
+    for worker_id in (0, 1):
+        writer = MetricsSnapshotWriter(tmp_path, worker_id, lambda w=worker_id: f"requests_total {w + 1}\n")
+        writer.start()
+        writer.stop()
+    assert read_worker_metrics(tmp_path, exclude=0) == ["requests_total 2\n"]
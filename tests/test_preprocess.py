@@ -1,12 +1,25 @@
 """Unit tests for data preprocessing functions."""
+import io
+import struct
 import tempfile
+import zlib
 from pathlib import Path
 
 import numpy as np
 import pytest
 from PIL import Image
 
-from src.data import load_and_resize_image, get_train_val_test_splits, normalize_for_model
+from src.data import (
+    ImageTooLargeError,
+    decode_image,
+    decode_resized,
+    get_train_val_test_splits,
+    load_and_resize_image,
+    normalize_for_model,
+    probe_image,
+    to_chw_float32,
+)
+from src.data.decode import decoded_bytes
 
 
 def test_load_and_resize_image_returns_correct_shape():
@@ -49,3 +62,95 @@ def test_normalize_for_model_preserves_float32():
     out = normalize_for_model(x)
     assert out.dtype == np.float32
     np.testing.assert_array_almost_equal(x, out)
+
+
+def test_decode_resized_uses_draft_mode_for_large_jpeg(tmp_path):
+    """A large JPEG is decoded at reduced DCT scale, then resized to exactly the target size."""
+    path = tmp_path / "big.jpg"
+    Image.new("RGB", (2000, 1600), color=(200, 100, 50)).save(path)
+    img = Image.open(path)
+    img.draft("RGB", (224, 224))
+    assert img.size == (500, 400)  # 1/4 scale: smallest reduced-DCT size still >= 224x224
+    out = decode_resized(path, (224, 224))
+    assert out.size == (224, 224) and out.mode == "RGB"
+
+
+def test_decode_image_writes_into_preallocated_buffer(tmp_path):
+    path = tmp_path / "small.png"
+    Image.new("RGB", (60, 40), color=(255, 0, 51)).save(path)
+    batch = np.zeros((2, 3, 224, 224), dtype=np.float32)
+    result = decode_image(path, (224, 224), out=batch[1])
+    assert np.shares_memory(result, batch)
+    np.testing.assert_allclose(batch[1, :, 0, 0], [1.0, 0.0, 0.2], atol=1e-6)
+    assert not batch[0].any()
+
+
+def test_decode_image_accepts_bytes_and_rejects_bad_buffer():
+    buf = io.BytesIO()
+    Image.new("L", (30, 30), color=128).save(buf, format="JPEG")
+    arr = decode_image(buf.getvalue(), (224, 224))
+    assert arr.shape == (3, 224, 224) and arr.dtype == np.float32
+    with pytest.raises(ValueError):
+        to_chw_float32(np.zeros((224, 224, 3), dtype=np.uint8), out=np.empty((3, 100, 100), dtype=np.float32))
+
+
+def test_api_cli_and_training_preprocessing_are_bit_identical(tmp_path):
+    """API upload bytes, predict()/collect_predictions path and the training dataset share one preprocessing path."""
+    from src.data import ImagePathDataset
+    from src.inference import preprocess_bytes, preprocess_image
+
+    rng = np.random.default_rng(0)
+    path = tmp_path / "pet.jpg"
+    Image.fromarray(rng.integers(0, 255, (900, 1200, 3), dtype=np.uint8)).save(path, quality=85)
+
+    api_x = preprocess_bytes(path.read_bytes())[0]
+    cli_x = preprocess_image(path)[0]
+    train_x = ImagePathDataset([{"path": str(path), "label": 1}], (224, 224))[0][0].numpy()
+
+    for x in (api_x, cli_x, train_x):
+        assert x.shape == (3, 224, 224) and x.dtype == np.float32 and x.flags["C_CONTIGUOUS"]
+    assert np.array_equal(api_x, cli_x)
+    assert np.array_equal(api_x, train_x)
+
+
+def test_to_chw_float32_vectorizes_over_batches():
+    batch = np.random.default_rng(1).integers(0, 256, (4, 8, 6, 3), dtype=np.uint8)
+    out = to_chw_float32(batch)
+    assert out.shape == (4, 3, 8, 6)
+    assert np.array_equal(out[2], to_chw_float32(batch[2]))
+
+
+def _png_header(width: int, height: int) -> bytes:
+    """A PNG whose header declares width x height over a few bytes of pixel data (a decompression bomb's shape)."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", ihdr) + chunk(b"IDAT", zlib.compress(b"\0" * 64)) + chunk(b"IEND", b"")
+
+
+def test_oversized_headers_are_rejected_before_decoding():
+    with pytest.raises(ImageTooLargeError, match="9000x8000"):
+        probe_image(_png_header(9000, 8000))  # over MAX_IMAGE_PIXELS
+    with pytest.raises(ImageTooLargeError):
+        probe_image(_png_header(20000, 20000))  # over PIL's own decompression bomb limit
+    with pytest.raises(ImageTooLargeError, match="MiB"):
+        decode_image(_png_header(8000, 4000))  # within the pixel limit, but ~122 MiB to decode
+    assert probe_image(_png_header(600, 400)) == ("PNG", (600, 400), 600 * 400 * 4)
+
+
+def test_probe_sniffs_format_and_rewinds_file(tmp_path):
+    path = tmp_path / "big.jpg"
+    Image.new("RGB", (2000, 1600)).save(path)
+    with open(path, "rb") as f:
+        f.seek(0)
+        assert probe_image(f) == ("JPEG", (2000, 1600), 500 * 400 * 4)  # counted at draft-mode scale
+        assert f.tell() == 0 and not f.closed
+        assert decode_resized(f).size == (224, 224)
+    with Image.open(path) as img:
+        assert decoded_bytes(img) == 2000 * 1600 * 4
+    tiff = io.BytesIO()
+    Image.new("RGB", (10, 10)).save(tiff, format="TIFF")
+    for data in (b"GIF89a? not really", b"hello", tiff.getvalue()):
+        with pytest.raises(ValueError):
+            probe_image(data)
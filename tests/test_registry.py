@@ -0,0 +1,112 @@
+"""Unit tests for the hot-reloadable multi-version model registry."""
+import asyncio
+import io
+import time
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from src.inference import InferencePipeline, ModelRegistry
+from src.model import get_model
+
+
+def _checkpoint(path, seed):
+    torch.manual_seed(seed)
+    torch.save(get_model(num_classes=2).state_dict(), path)
+    return path
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (90, 60, 30)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def registry():
+    reg = ModelRegistry(lambda model, fp: InferencePipeline(model, num_threads=1), max_versions=2)
+    yield reg
+    reg.stop()
+
+
+def test_load_warms_up_and_first_version_becomes_active(registry, tmp_path):
+    v1 = registry.load("v1", _checkpoint(tmp_path / "a.pt", 0), activate=False)
+    assert registry.active is v1
+    assert v1.warmup_ms > 0 and v1.pipeline is not None
+    v2 = registry.load("v2", _checkpoint(tmp_path / "b.pt", 1), activate=False)
+    assert registry.active is v1 and registry.get("v2") is v2
+
+
+def test_activate_swaps_and_select_honours_requested_version(registry, tmp_path):
+    registry.load("v1", _checkpoint(tmp_path / "a.pt", 0))
+    registry.load("v2", _checkpoint(tmp_path / "b.pt", 1), activate=False)
+    registry.activate("v2")
+    assert registry.select().name == "v2"
+    assert registry.select("v1").name == "v1"
+    assert registry.swaps == 1
+    with pytest.raises(KeyError):
+        registry.select("v9")
+
+
+def test_traffic_split_routes_by_weight(registry, tmp_path):
+    registry.load("v1", _checkpoint(tmp_path / "a.pt", 0))
+    registry.load("v2", _checkpoint(tmp_path / "b.pt", 1), activate=False)
+    registry.set_traffic({"v1": 0, "v2": 1})
+    assert {registry.select().name for _ in range(20)} == {"v2"}
+    with pytest.raises(ValueError):
+        registry.set_traffic({"v1": 0})
+
+
+def test_oldest_standby_version_is_evicted_and_in_use_versions_are_protected(registry, tmp_path):
+    registry.load("v1", _checkpoint(tmp_path / "a.pt", 0))
+    registry.load("v2", _checkpoint(tmp_path / "b.pt", 1), activate=False)
+    registry.load("v3", _checkpoint(tmp_path / "c.pt", 2), activate=False)
+    assert [v["version"] for v in registry.describe()["versions"]] == ["v1", "v3"]
+    registry.set_shadow("v3")
+    with pytest.raises(ValueError):
+        registry.load("v4", _checkpoint(tmp_path / "d.pt", 3))
+
+
+def test_load_async_keeps_serving_and_records_errors(registry, tmp_path):
+    registry.load("v1", _checkpoint(tmp_path / "a.pt", 0))
+    registry.load_async("v2", _checkpoint(tmp_path / "b.pt", 1)).result(timeout=60)
+    assert registry.active.name == "v2"
+    with pytest.raises(FileNotFoundError):
+        registry.load_async("bad", tmp_path / "missing.pt").result(timeout=60)
+    assert "bad" in registry.describe()["load_errors"]
+
+
+def test_shadow_predictions_are_compared_and_reported(registry, tmp_path):
+    registry.load("v1", _checkpoint(tmp_path / "a.pt", 0))
+    registry.load("v2", _checkpoint(tmp_path / "b.pt", 1), activate=False)
+    registry.set_shadow("v2")
+    data = _jpeg()
+    served = asyncio.run(registry.active.pipeline.predict(data))
+    asyncio.run(registry.shadow_predict(data, served))
+    text = registry.render_metrics()
+    assert 'shadow_predictions_total{model_version="v2"} 1' in text
+    assert 'model_version_info{model_version="v2",' in text and 'role="shadow"' in text
+    assert 'inference_batch_size_count{model_version="v1"}' in text
+    assert np.isclose(sum(served), 1.0)
+
+
+def test_replaced_version_keeps_serving_requests_routed_to_it_before_the_swap(registry, tmp_path):
+    registry.load("v1", _checkpoint(tmp_path / "a.pt", 0))
+    data = _jpeg()
+    with registry.use() as old:
+        registry.load("v1", _checkpoint(tmp_path / "b.pt", 1))
+        assert registry.active is not old and old.in_flight == 1
+        time.sleep(0.3)  # the retired pipeline waits for this request instead of a fixed grace period
+        assert np.isclose(sum(asyncio.run(old.pipeline.predict(data))), 1.0)
+    assert old.in_flight == 0
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(old.pipeline.predict(data))
+        except (RuntimeError, ValueError):  # decode pool shut down
+            break
+        time.sleep(0.05)
+    else:
+        pytest.fail("retired pipeline was not stopped after its last request")
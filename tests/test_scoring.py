@@ -0,0 +1,114 @@
+"""Unit tests for streaming offline batch scoring."""
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.inference import iter_directory_items, iter_split_items, score_items
+from src.model import get_model
+
+
+@pytest.fixture
+def images(tmp_path):
+    rng = np.random.default_rng(0)
+    root = tmp_path / "imgs"
+    for cls in ("cats", "dogs", "unlabelled"):
+        (root / cls).mkdir(parents=True)
+        for i in range(5):
+            Image.fromarray(rng.integers(0, 256, (40, 50, 3), dtype=np.uint8)).save(root / cls / f"{i}.jpg")
+    (root / "cats" / "broken.jpg").write_bytes(b"not a jpeg")
+    return root
+
+
+@pytest.fixture(scope="module")
+def model():
+    return get_model().eval()
+
+
+def _read_jsonl(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_directory_items_are_sorted_and_labelled_by_folder(images):
+    items = list(iter_directory_items(images))
+    assert len(items) == 16
+    assert items == sorted(items, key=lambda it: it[0])
+    assert {label for p, label in items if "/cats/" in p} == {0}
+    assert {label for p, label in items if "/unlabelled/" in p} == {None}
+
+
+def test_split_items_stream_selected_splits(tmp_path):
+    splits = tmp_path / "splits.json"
+    splits.write_text(json.dumps({"val": [{"path": "a", "label": 1}], "test": [{"path": "b", "label": 0}]}))
+    assert list(iter_split_items(splits, ["test", "val"])) == [("b", 0), ("a", 1)]
+
+
+def test_score_jsonl_with_streaming_metrics(images, tmp_path, model):
+    out = tmp_path / "scores.jsonl"
+    summary = score_items(model, iter_directory_items(images), out, batch_size=4, workers=2)
+    rows = _read_jsonl(out)
+    assert len(rows) == summary["rows"] == 16
+    broken = [r for r in rows if r["path"].endswith("broken.jpg")][0]
+    assert broken["error"] and broken["pred_label"] is None
+    assert summary["errors"] == 1 and summary["labelled"] == 10
+    assert np.array(summary["confusion_matrix"]).sum() == 10
+    correct = sum(r["pred_label"] == r["true_label"] for r in rows if r["true_label"] and not r["error"])
+    assert summary["correct"] == correct
+    assert summary["metrics"]["count"] == 10 and summary["metrics"]["confusion_matrix"] == summary["confusion_matrix"]
+    ok = [r for r in rows if not r["error"]]
+    assert all(abs(r["prob_cat"] + r["prob_dog"] - 1) < 1e-5 for r in ok)
+
+
+def test_resume_continues_without_duplicates(images, tmp_path, model):
+    full = tmp_path / "full.jsonl"
+    score_items(model, iter_directory_items(images), full, batch_size=4, workers=1)
+    out = tmp_path / "part.jsonl"
+    score_items(model, iter_directory_items(images), out, batch_size=4, workers=1, limit=6)
+    with open(out, "a") as f:
+        f.write('{"path": "half-written')  # crash after writing rows the state file never recorded
+    summary = score_items(model, iter_directory_items(images), out, batch_size=4, workers=1, resume=True)
+    assert summary["rows"] == 16
+    assert [r["path"] for r in _read_jsonl(out)] == [r["path"] for r in _read_jsonl(full)]
+    full_state = json.loads((tmp_path / "full.jsonl.state.json").read_text())
+    assert json.loads((tmp_path / "part.jsonl.state.json").read_text())["metrics"] == full_state["metrics"]
+
+
+def test_new_run_discards_previous_state_and_resume_checks_the_output(images, tmp_path, model):
+    out = tmp_path / "scores.jsonl"
+    score_items(model, iter_directory_items(images), out, batch_size=4, workers=1, limit=8)
+
+    def crash():
+        raise RuntimeError("killed before the first batch")
+        yield
+
+    with pytest.raises(RuntimeError):
+        score_items(model, crash(), out, batch_size=4, workers=1)
+    assert not (tmp_path / "scores.jsonl.state.json").exists()
+    summary = score_items(model, iter_directory_items(images), out, batch_size=4, workers=1, limit=4, resume=True)
+    assert summary["rows"] == 4 and len(_read_jsonl(out)) == 4
+    out.write_text("")  # output replaced behind the state file's back
+    with pytest.raises(ValueError, match="state file"):
+        score_items(model, iter_directory_items(images), out, batch_size=4, workers=1, resume=True)
+
+
+def test_score_parquet_parts(images, tmp_path, model):
+    pd = pytest.importorskip("pandas")
+    pytest.importorskip("pyarrow")
+    out = tmp_path / "scores.parquet"
+    score_items(model, iter_directory_items(images), out, batch_size=5, workers=1, limit=7)
+    summary = score_items(model, iter_directory_items(images), out, batch_size=5, workers=1, resume=True)
+    df = pd.read_parquet(out)
+    assert len(df) == summary["rows"] == 16 and df["path"].is_unique
+    assert df["error"].notna().sum() == 1
+
+
+def test_score_with_tta_aggregates_views(images, tmp_path, model):
+    plain = score_items(model, iter_directory_items(images), tmp_path / "plain.jsonl", batch_size=4, workers=1)
+    out = tmp_path / "tta.jsonl"
+    summary = score_items(model, iter_directory_items(images), out, batch_size=4, workers=1, tta="flip")
+    rows = _read_jsonl(out)
+    assert summary["rows"] == plain["rows"] == 16 and summary["tta"] == "flip"
+    assert summary["labelled"] == 10
+    ok = [r for r in rows if not r["error"]]
+    assert all(abs(r["prob_cat"] + r["prob_dog"] - 1) < 1e-5 for r in ok)
@@ -0,0 +1,92 @@
+"""End-to-end test of the pre-fork multi-worker server (api/serve.py)."""
+import io
+import json
+import os
+import re
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import pytest
+import torch
+from PIL import Image
+
+from src.model import get_model
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_workers(tmp_path, stdout=subprocess.DEVNULL):
+    """Run api/serve.py with two workers; returns (process, base URL) once both have started."""
+    model_path = tmp_path / "model.pt"
+    torch.save(get_model(num_classes=2).state_dict(), model_path)
+    port = _free_port()
+    env = dict(os.environ, PYTHONPATH=str(ROOT), MODEL_PATH=str(model_path),
+               METRICS_MULTIPROC_DIR=str(tmp_path / "metrics"), METRICS_SNAPSHOT_INTERVAL_S="0.1",
+               PREDICTION_CACHE_SIZE="0", JOB_DB_PATH=str(tmp_path / "jobs.sqlite"))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "api.serve", "--workers", "2", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=stdout, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while len(list((tmp_path / "metrics").glob("worker-*.prom"))) < 2:
+        if proc.poll() is not None or time.monotonic() >= deadline:
+            proc.kill()
+            pytest.fail("workers did not start")
+        time.sleep(0.2)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (10, 20, 30)).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="api/serve.py forks workers")
+def test_two_workers_serve_and_aggregate_metrics(tmp_path):
+    proc, base = _start_workers(tmp_path)
+    try:
+        for _ in range(6):
+            r = httpx.post(f"{base}/predict", files={"file": ("pet.jpg", _jpeg(), "image/jpeg")}, timeout=30)
+            assert r.status_code == 200
+        time.sleep(0.5)  # let both workers publish a snapshot
+        text = httpx.get(f"{base}/metrics", timeout=30).text
+        assert "predictions_total 6" in text
+        assert re.search(r'^http_request_duration_ms_count\{endpoint="/predict",status="200",model_version="[^"]+"\} 6$',
+                         text, re.M)
+        assert "model_loaded 1" in text
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="api/serve.py forks workers")
+def test_forked_workers_write_structured_logs(tmp_path):
+    log_path = tmp_path / "stdout.log"
+    with open(log_path, "wb") as stdout:
+        proc, base = _start_workers(tmp_path, stdout)
+        try:
+            for _ in range(4):
+                r = httpx.post(f"{base}/predict", files={"file": ("pet.jpg", _jpeg(), "image/jpeg")}, timeout=30)
+                assert r.status_code == 200
+            deadline = time.monotonic() + 5
+            while log_path.read_text().count('"event": "request"') < 4 and time.monotonic() < deadline:
+                time.sleep(0.1)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+    entries = [json.loads(line) for line in log_path.read_text().splitlines() if line.startswith("{")]
+    assert sum(e["event"] == "startup" for e in entries) == 2  # one per worker
+    assert [e["path"] for e in entries if e["event"] == "request" and e["path"] == "/predict"] == ["/predict"] * 4
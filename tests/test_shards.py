@@ -0,0 +1,44 @@
+"""Unit tests for the memory-mapped uint8 shard cache."""
+import numpy as np
+import torch
+from PIL import Image
+
+from src.data import ImagePathDataset, ShardDataset, write_shards
+
+
+def _make_items(tmp_path, n=5):
+    rng = np.random.default_rng(0)
+    items = []
+    for i in range(n):
+        p = tmp_path / f"img{i}.png"
+        Image.fromarray(rng.integers(0, 256, (40 + i, 50, 3), dtype=np.uint8)).save(p)
+        items.append({"path": str(p), "label": i % 2})
+    return items
+
+
+def test_shard_dataset_matches_decoding_from_paths(tmp_path):
+    items = _make_items(tmp_path)
+    write_shards({"train": items}, tmp_path / "shards", (32, 32), shard_size=2, workers=2)
+    shard_ds = ShardDataset(tmp_path / "shards", "train")
+    path_ds = ImagePathDataset(items, (32, 32))
+    assert len(shard_ds) == 5
+    for i in range(5):
+        x_s, y_s = shard_ds[i]
+        x_p, y_p = path_ds[i]
+        assert x_s.dtype == torch.float32 and x_s.shape == (3, 32, 32)
+        assert torch.equal(x_s, x_p) and y_s == y_p
+
+
+def test_shards_are_memory_mapped_and_skip_undecodable(tmp_path):
+    items = _make_items(tmp_path, n=3)
+    bad = tmp_path / "bad.jpg"
+    bad.write_bytes(b"")
+    items.insert(1, {"path": str(bad), "label": 1})
+    index = write_shards({"val": items}, tmp_path / "shards", (16, 16), shard_size=10, workers=1)
+    assert index["splits"]["val"]["failed"] == 1
+    ds = ShardDataset(tmp_path / "shards", "val")
+    assert len(ds) == 3
+    ds[0]
+    assert isinstance(ds._shards[0], np.memmap)
+    # pickling for DataLoader workers does not carry the mapped pixels
+    assert ds.__getstate__()["_shards"] is None
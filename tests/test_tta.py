@@ -0,0 +1,79 @@
+"""Unit tests for test-time augmentation views and aggregation."""
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.data import decode_image
+from src.inference import (
+    TTA_MODES,
+    aggregate_views,
+    decode_views,
+    num_views,
+    predict_proba_batch,
+    predict_tta,
+    tta_views,
+)
+from src.model import get_model
+
+
+def _image_bytes(fmt="JPEG", size=(900, 480)):
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    buf = io.BytesIO()
+    Image.fromarray(pixels).save(buf, fmt)
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize("fmt", ["JPEG", "PNG"])
+@pytest.mark.parametrize("mode", TTA_MODES)
+def test_views_have_model_size(mode, fmt):
+    views = decode_views(_image_bytes(fmt), mode)
+    assert views.shape == (num_views(mode), 3, 224, 224) and views.dtype == np.float32
+
+
+def test_none_matches_single_view_preprocessing():
+    data = _image_bytes()
+    assert np.array_equal(decode_views(data, "none")[0], decode_image(data, (224, 224)))
+
+
+def test_flip_and_crop_geometry():
+    data = _image_bytes("PNG", size=(512, 256))
+    flip = tta_views(data, "flip")
+    assert np.array_equal(flip[1], flip[0][:, ::-1])
+    # Shorter side 256 already: crops are cut from the original pixels
+    pixels = np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+    crops = tta_views(data, "five_crop")
+    assert np.array_equal(crops[1], pixels[:224, :224])
+    assert np.array_equal(crops[4], pixels[-224:, -224:])
+    ten = tta_views(data, "ten_crop")
+    assert np.array_equal(ten[:5], crops) and np.array_equal(ten[5], crops[0][:, ::-1])
+
+
+def test_views_are_written_into_batch_rows():
+    buf = np.zeros((12, 3, 224, 224), dtype=np.float32)
+    decode_views(_image_bytes(), "five_crop", out=buf[5:10])
+    assert buf[5:10].any() and not buf[:5].any() and not buf[10:].any()
+
+
+def test_aggregations():
+    probs = np.array([[0.9, 0.1], [0.5, 0.5], [0.2, 0.8], [0.4, 0.6]], dtype=np.float32)
+    np.testing.assert_allclose(aggregate_views(probs, 2, "mean"), [[0.7, 0.3], [0.3, 0.7]], rtol=1e-6)
+    np.testing.assert_allclose(aggregate_views(probs, 2, "max"), [[0.9 / 1.4, 0.5 / 1.4], [0.4 / 1.2, 0.8 / 1.2]], rtol=1e-6)
+    geometric = aggregate_views(probs, 2, "geometric")
+    np.testing.assert_allclose(geometric.sum(axis=1), 1, rtol=1e-6)
+    assert geometric[0, 0] == pytest.approx(0.75, abs=1e-6)  # sqrt(.45) / (sqrt(.45) + sqrt(.05))
+    with pytest.raises(ValueError):
+        aggregate_views(probs, 2, "median")
+    with pytest.raises(ValueError):
+        num_views("rotate")
+
+
+def test_predict_tta_runs_views_in_one_batch(tmp_path):
+    model = get_model().eval()
+    path = tmp_path / "pet.jpg"
+    path.write_bytes(_image_bytes())
+    out = predict_tta(model, path, "ten_crop")
+    expected = predict_proba_batch(model, decode_views(path, "ten_crop")).mean(axis=0)
+    assert out["probabilities"]["dog"] == pytest.approx(float(expected[1]), abs=1e-5)
+    assert out["label"] in ("cat", "dog") and out["tta"] == "ten_crop"
@@ -0,0 +1,85 @@
+"""Unit tests for the corrupt / duplicate image validation pass."""
+import json
+
+import numpy as np
+from PIL import Image
+
+from src.data import DatasetIndex, check_image, dhash, get_train_val_test_splits, near_duplicate_pairs, validate_index
+
+
+def _photo(seed: int, size=(96, 64)) -> Image.Image:
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.Resampling.BICUBIC)
+
+
+def _dataset(root):
+    cats, dogs = root / "train" / "cats", root / "train" / "dogs"
+    cats.mkdir(parents=True)
+    dogs.mkdir(parents=True)
+    for i in range(4):
+        _photo(i).save(cats / f"cat{i}.jpg", quality=95)
+        _photo(100 + i).save(dogs / f"dog{i}.png")
+    (cats / "copy_of_cat0.jpg").write_bytes((cats / "cat0.jpg").read_bytes())
+    _photo(1, size=(192, 128)).save(dogs / "resized_cat1.jpg", quality=70)
+    (cats / "empty.jpg").write_bytes(b"")
+    (dogs / "truncated.jpg").write_bytes((cats / "cat2.jpg").read_bytes()[:300])
+    return root
+
+
+def test_check_image_reports_corrupt_files(tmp_path):
+    good = tmp_path / "good.png"
+    _photo(0).save(good)
+    ok, error, h = check_image(good)
+    assert ok and error is None and len(h) == 16
+    (tmp_path / "bad.jpg").write_bytes(b"")
+    ok, error, h = check_image(tmp_path / "bad.jpg")
+    assert not ok and error and h is None
+
+
+def test_dhash_is_robust_to_resizing_and_recompression():
+    a, b, c = dhash(_photo(5)), dhash(_photo(5, size=(300, 200))), dhash(_photo(6))
+    assert bin(a ^ b).count("1") <= 4
+    assert bin(a ^ c).count("1") > 10
+
+
+def test_near_duplicate_pairs_matches_brute_force():
+    rng = np.random.default_rng(0)
+    base = [int(x) for x in rng.integers(0, 2**63, 50, dtype=np.int64)]
+    hashes = {f"k{i}": h for i, h in enumerate(base)}
+    for i in range(10):  # flip up to 3 bits of some hashes
+        hashes[f"n{i}"] = base[i] ^ sum(1 << int(b) for b in rng.choice(64, i % 4, replace=False))
+    keys = sorted(hashes)
+    brute = sorted(
+        (a, b) for i, a in enumerate(keys) for b in keys[i + 1 :] if bin(hashes[a] ^ hashes[b]).count("1") <= 3
+    )
+    assert near_duplicate_pairs(hashes, 3) == brute
+    assert len(brute) >= 10
+
+
+def test_validate_index_quarantines_corrupt_and_duplicates(tmp_path):
+    raw = _dataset(tmp_path / "raw")
+    with DatasetIndex(tmp_path / "index.sqlite", raw) as index:
+        index.update()
+        report = validate_index(index, workers=2)
+        reasons = {e["path"].rsplit("/", 1)[-1]: e["reason"] for e in report["quarantine"]}
+        assert report["corrupt"] == 2 and report["exact_duplicates"] == 1 and report["near_duplicates"] == 1
+        assert reasons["empty.jpg"].startswith("corrupt") and reasons["truncated.jpg"].startswith("corrupt")
+        assert reasons["copy_of_cat0.jpg"].startswith("duplicate of") and reasons["copy_of_cat0.jpg"].endswith("cat0.jpg")
+        assert reasons["resized_cat1.jpg"].startswith("near-duplicate of")
+        # results are cached per content digest: nothing is decoded again
+        assert validate_index(index, workers=2)["checked"] == 0
+
+        excluded = [e["path"] for e in report["quarantine"]]
+        kept = [p for split in index.splits(exclude=excluded) for p, _ in split]
+        assert len(kept) == 8 and not set(kept) & set(excluded)
+
+
+def test_get_train_val_test_splits_honours_quarantine_file(tmp_path):
+    raw = _dataset(tmp_path / "raw")
+    qfile = tmp_path / "quarantine.json"
+    qfile.write_text(json.dumps({"files": [{"path": str(raw / "train" / "cats" / "empty.jpg"), "reason": "corrupt"}]}))
+    everything = sum(get_train_val_test_splits(raw), [])
+    filtered = sum(get_train_val_test_splits(raw, quarantine=qfile), [])
+    assert len(filtered) == len(everything) - 1
+    assert all(not p.endswith("empty.jpg") for p, _ in filtered)